@@ -18,7 +18,8 @@ from app.api.v1.endpoints import (
     admin,
     guidelines,
     ai_analysis,
-    realtime
+    realtime,
+    terminology
 )
 
 api_router = APIRouter()
@@ -42,3 +43,4 @@ api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
 api_router.include_router(guidelines.router, prefix="/guidelines", tags=["guidelines"])
 api_router.include_router(ai_analysis.router, prefix="/ai", tags=["ai-analysis"])
 api_router.include_router(realtime.router, prefix="/realtime", tags=["realtime"])
+api_router.include_router(terminology.router, prefix="/terminology", tags=["terminology"])
@@ -1,4 +1,7 @@
 from fastapi import APIRouter, HTTPException, status
+from typing import Optional
+
+from app.services.terminology import terminology_service
 
 router = APIRouter()
 
@@ -16,3 +19,17 @@ async def get_system_health():
 async def perform_maintenance():
     """TODO: Implement system maintenance operations"""
     raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED)
+
+@router.get("/cache/terminology")
+async def get_terminology_cache_stats():
+    """Per-namespace size, hit, miss and eviction counters for the terminology cache"""
+    # Drop expired entries first so sizes count live entries only
+    terminology_service.cache.purge_expired()
+    return terminology_service.cache.stats()
+
+@router.delete("/cache/terminology")
+async def flush_terminology_cache(namespace: Optional[str] = None):
+    """Flush one terminology cache namespace, or all of them, on every worker"""
+    if namespace is not None and namespace not in terminology_service.cache.namespaces:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown cache namespace: {namespace}")
+    return {"flushed": await terminology_service.cache.invalidate(namespace)}
@@ -1,13 +1,47 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+
+from app.services.deidentification import deidentification_service
 
 router = APIRouter()
 
+_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
 @router.get("/logs")
 async def get_audit_logs():
     """TODO: Implement audit logs retrieval"""
     raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED)
 
 @router.get("/export")
-async def export_audit_data():
-    """TODO: Implement audit data export"""
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED)
+async def export_audit_data(
+    start_date: datetime,
+    end_date: datetime,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False
+):
+    """
+    Stream an audit compliance bundle.
+    
+    Entries are written as they are read from the audit store, followed by a
+    trailer record with the entry count and a SHA-256 checksum.
+    """
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date"
+        )
+    
+    filename = f"audit_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{format}" + (".gz" if gzip else "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    
+    # A gzip bundle is served as a .gz file, not with Content-Encoding,
+    # which clients would undo before saving it under the .gz name
+    return StreamingResponse(
+        deidentification_service.iter_audit_bundle(start_date, end_date, format, compress=gzip),
+        media_type="application/gzip" if gzip else _MEDIA_TYPES[format],
+        headers=headers
+    )
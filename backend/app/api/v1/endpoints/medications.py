@@ -1,4 +1,8 @@
 from fastapi import APIRouter, HTTPException, status
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+from app.services.terminology import terminology_service
 
 router = APIRouter()
 
@@ -11,3 +15,78 @@ async def get_medications():
 async def prescribe_medication():
     """TODO: Implement medication prescription"""
     raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED)
+
+class InteractionCheckRequest(BaseModel):
+    drug_codes: List[str] = Field(..., max_length=500)
+
+class PatientMedications(BaseModel):
+    patient_id: str
+    drug_codes: List[str] = Field(..., max_length=500)
+
+class InteractionScreenRequest(BaseModel):
+    patients: List[PatientMedications] = Field(..., max_length=5000)
+
+@router.post("/interactions")
+async def check_drug_interactions(request: InteractionCheckRequest):
+    """Check one medication list for drug interactions"""
+    interactions = await terminology_service.get_drug_interactions(request.drug_codes)
+    return {"interactions": interactions}
+
+@router.post("/interactions/screen")
+async def screen_drug_interactions(request: InteractionScreenRequest):
+    """Screen the medication lists of many patients (e.g. a whole ward) in one call"""
+    results = await terminology_service.get_drug_interactions_many(
+        [patient.drug_codes for patient in request.patients]
+    )
+    return {
+        "results": [
+            {"patient_id": patient.patient_id, "interactions": interactions}
+            for patient, interactions in zip(request.patients, results)
+        ]
+    }
+
+class PatientConditions(BaseModel):
+    patient_id: str
+    conditions: List[str] = Field(..., max_length=2000)
+
+class ContraindicationCheckRequest(BaseModel):
+    drug_codes: List[str] = Field(..., max_length=500)
+    patients: List[PatientConditions] = Field(..., max_length=10000)
+
+@router.post("/contraindications")
+async def check_contraindications(request: ContraindicationCheckRequest):
+    """Check drugs against patients' problem lists, including descendant conditions"""
+    results = await terminology_service.get_contraindications_many(
+        request.drug_codes,
+        [patient.conditions for patient in request.patients]
+    )
+    return {
+        "results": [
+            {"patient_id": patient.patient_id, "contraindications": contraindications}
+            for patient, contraindications in zip(request.patients, results)
+        ]
+    }
+
+class PatientMeasurements(BaseModel):
+    patient_id: str
+    age_years: float = Field(..., ge=0, le=25)
+    weight_kg: float = Field(..., gt=0, le=250)
+    egfr: Optional[float] = Field(None, ge=0)
+
+class PediatricDosingRequest(BaseModel):
+    drug_codes: List[str] = Field(..., max_length=200)
+    patients: List[PatientMeasurements] = Field(..., max_length=5000)
+
+@router.post("/pediatric-dosing")
+async def calculate_pediatric_dosing(request: PediatricDosingRequest):
+    """Weight-based doses for every patient and drug; null where no age band applies"""
+    results = await terminology_service.get_pediatric_dosing_many(
+        request.drug_codes,
+        [patient.model_dump() for patient in request.patients]
+    )
+    return {
+        "results": [
+            {"patient_id": patient.patient_id, "dosing": dict(zip(request.drug_codes, dosing))}
+            for patient, dosing in zip(request.patients, results)
+        ]
+    }
@@ -0,0 +1,78 @@
+from fastapi import APIRouter
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+from app.services.terminology import TerminologySystem, terminology_service
+
+router = APIRouter()
+
+class Coding(BaseModel):
+    code: str
+    system: TerminologySystem
+
+class ValidateCodesRequest(BaseModel):
+    codings: List[Coding] = Field(..., max_length=10000)
+    value_set_id: Optional[str] = None
+
+class ConceptsRequest(BaseModel):
+    concepts: List[Coding] = Field(..., max_length=10000)
+
+class CodedDiagnosis(BaseModel):
+    code: str
+    system: str = Field(..., description="Coding system (ICD-10-CM, SNOMED-CT)")
+
+class EncounterDiagnoses(BaseModel):
+    encounter_id: Optional[str] = None
+    age_years: Optional[float] = Field(None, ge=0)
+    gender: Optional[str] = None
+    diagnosis: List[CodedDiagnosis] = Field(..., max_length=500)
+
+class CrosswalkRequest(BaseModel):
+    encounters: List[EncounterDiagnoses] = Field(..., max_length=5000)
+
+class SearchQuery(BaseModel):
+    query: str
+    system: TerminologySystem
+
+class SearchManyRequest(BaseModel):
+    queries: List[SearchQuery] = Field(..., max_length=1000)
+    limit: int = Field(10, ge=1, le=100)
+
+@router.post("/validate")
+async def validate_codes(request: ValidateCodesRequest):
+    """Validate a batch of codes; results are returned in request order"""
+    results = await terminology_service.validate_codes(
+        [(coding.code, coding.system) for coding in request.codings],
+        request.value_set_id
+    )
+    return {"results": results}
+
+@router.post("/concepts")
+async def get_concepts(request: ConceptsRequest):
+    """Look up a batch of concepts; unknown codes come back as null"""
+    results = await terminology_service.get_concepts_details(
+        [(coding.code, coding.system) for coding in request.concepts]
+    )
+    return {"results": results}
+
+@router.post("/search")
+async def search_concepts(request: SearchManyRequest):
+    """Run a batch of concept searches; one result list per query"""
+    results = await terminology_service.search_concepts_many(
+        [(query.query, query.system) for query in request.queries],
+        request.limit
+    )
+    return {"results": results}
+
+@router.post("/crosswalk")
+async def map_encounter_diagnoses(request: CrosswalkRequest):
+    """Map every encounter diagnosis between SNOMED CT and ICD-10-CM in one call"""
+    results = await terminology_service.map_encounters(
+        [encounter.model_dump() for encounter in request.encounters]
+    )
+    return {
+        "results": [
+            {"encounter_id": encounter.encounter_id, "diagnosis": diagnoses}
+            for encounter, diagnoses in zip(request.encounters, results)
+        ]
+    }
@@ -1,18 +1,124 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import asyncio
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.domain import AIAnalysisResult
+from app.services.waveform_analysis import waveform_analyzer
+from app.services.waveform_store import waveform_store
 
 router = APIRouter()
 
+class AnalyzeWaveformRequest(BaseModel):
+    leads: Optional[List[str]] = Field(None, description="Leads to analyze (all leads if omitted)")
+    start: float = Field(0.0, ge=0, description="Start in seconds from the start of the record")
+    end: Optional[float] = Field(None, gt=0, description="End in seconds (end of record if omitted)")
+
+# Window returned when no end is given
+DEFAULT_WINDOW_SECONDS = 10.0
+# Widest render; a few 4K displays side by side
+MAX_RENDER_PIXELS = 8192
+
+def _samples(values: np.ndarray) -> list:
+    """Signal samples as JSON numbers; missing samples become null"""
+    rounded = np.round(values.astype(np.float64), 4)
+    if np.isnan(rounded).any():
+        return [None if np.isnan(value) else value for value in rounded.tolist()]
+    return rounded.tolist()
+
 @router.get("/")
 async def get_waveforms():
-    """TODO: Implement waveforms listing"""
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED)
+    """List stored waveform records"""
+    return {"waveforms": await asyncio.to_thread(waveform_store.list)}
 
 @router.get("/{waveform_id}")
-async def get_waveform(waveform_id: str):
-    """TODO: Implement waveform retrieval"""
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED)
-
-@router.post("/{waveform_id}/analyze")
-async def analyze_waveform(waveform_id: str):
-    """TODO: Implement AI waveform analysis"""
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED)
+async def get_waveform(
+    waveform_id: str,
+    start: float = Query(0.0, ge=0, description="Window start, seconds from the start of the record"),
+    end: Optional[float] = Query(None, gt=0, description="Window end in seconds (start + 10 s if omitted)"),
+    leads: Optional[str] = Query(None, description="Comma-separated lead names (all leads if omitted)")
+):
+    """Waveform metadata and the samples of one time window"""
+    record = waveform_store.get(waveform_id)
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Waveform not found")
+
+    end = min(record.duration, start + DEFAULT_WINDOW_SECONDS) if end is None else end
+    if end <= start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end must be after start")
+    if end - start > settings.WAVEFORM_MAX_WINDOW_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Window exceeds {settings.WAVEFORM_MAX_WINDOW_SECONDS:g} seconds"
+        )
+    lead_names = [lead.strip() for lead in leads.split(",") if lead.strip()] if leads else None
+
+    try:
+        window = await asyncio.to_thread(record.read, start, end, lead_names)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return {
+        **record.describe(),
+        "window": {"start": window["start"], "end": window["end"], "start_sample": window["start_sample"]},
+        "signals": [
+            {"lead": lead, "units": units, "samples": _samples(samples)}
+            for lead, units, samples in zip(window["leads"], window["units"], window["signals"])
+        ]
+    }
+
+@router.get("/{waveform_id}/render")
+async def render_waveform(
+    waveform_id: str,
+    start: float = Query(0.0, ge=0, description="Window start, seconds from the start of the record"),
+    end: Optional[float] = Query(None, gt=0, description="Window end in seconds (end of record if omitted)"),
+    pixels: int = Query(..., ge=1, le=MAX_RENDER_PIXELS, description="Columns to draw"),
+    leads: Optional[str] = Query(None, description="Comma-separated lead names (all leads if omitted)")
+):
+    """Min/max envelope of a window with one value pair per pixel column, for any window length"""
+    record = waveform_store.get(waveform_id)
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Waveform not found")
+
+    end = record.duration if end is None else end
+    if end <= start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end must be after start")
+    lead_names = [lead.strip() for lead in leads.split(",") if lead.strip()] if leads else None
+
+    try:
+        envelope = await asyncio.to_thread(record.render, start, end, pixels, lead_names)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return {
+        "id": record.id,
+        "fs": record.fs,
+        "start": envelope["start"],
+        "end": envelope["end"],
+        "pixels": pixels,
+        "seconds_per_pixel": (envelope["end"] - envelope["start"]) / pixels,
+        "samples_per_bucket": envelope["bucket"],
+        "signals": [
+            {"lead": lead, "units": units, "min": _samples(mins), "max": _samples(maxs)}
+            for lead, units, mins, maxs in zip(envelope["leads"], envelope["units"], envelope["mins"], envelope["maxs"])
+        ]
+    }
+
+@router.post("/{waveform_id}/analyze", response_model=AIAnalysisResult)
+async def analyze_waveform(waveform_id: str, request: Optional[AnalyzeWaveformRequest] = None):
+    """QRS detection, heart rate, HRV and arrhythmia flags over a whole record or a time range"""
+    record = waveform_store.get(waveform_id)
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Waveform not found")
+
+    request = request or AnalyzeWaveformRequest()
+    if request.end is not None and request.end <= request.start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end must be after start")
+
+    try:
+        return await asyncio.to_thread(waveform_analyzer.analyze, record, request.leads, request.start, request.end)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
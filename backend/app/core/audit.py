@@ -0,0 +1,269 @@
+"""
+Background audit sink
+
+Audit events are enqueued on the request path and written in batches by a
+background task, either when a batch fills up or when the flush interval
+elapses.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+from datetime import datetime
+import asyncio
+import inspect
+import logging
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+AuditWriter = Callable[[List[Dict[str, Any]]], Union[None, Awaitable[None]]]
+
+# Queued by stop(); the flush task writes what it holds and exits when it sees it
+_STOP = object()
+
+class AuditSink:
+    """Bounded asyncio queue that flushes audit events to registered writers"""
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        stop_timeout: float = 10.0
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.stop_timeout = stop_timeout
+        self.writers: List[AuditWriter] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Queue slots reserved by worker threads whose records are still in
+        # flight to the event loop
+        self._reserved = 0
+        self._reserve_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "rejected": 0,
+            "flushed": 0,
+            "failed": 0,
+            "batches": 0,
+            "max_depth": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def add_writer(self, writer: AuditWriter) -> None:
+        """
+        Register a sync or async callable that receives each batch
+
+        Registering a writer that is already registered does nothing, so a
+        lifespan that runs again does not write every event twice.
+        """
+        if writer not in self.writers:
+            self.writers.append(writer)
+
+    def enqueue(self, record: Dict[str, Any]) -> bool:
+        """
+        Queue an audit record without blocking
+
+        Args:
+            record: Audit record
+
+        Returns:
+            False if the sink is not running or the queue is full, in which
+            case the caller is responsible for recording the event itself
+        """
+        if not self.running:
+            return False
+        with self._reserve_lock:
+            if self._queue.qsize() + self._reserved >= self.max_queue:
+                self._stats["rejected"] += 1
+                return False
+            if threading.get_ident() == self._loop_thread:
+                self._put(record)
+                return True
+            # Called from a worker thread; hold a slot until the loop queues it
+            self._reserved += 1
+        self._loop.call_soon_threadsafe(self._put_reserved, record)
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth and throughput counters"""
+        return {
+            **self._stats,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "capacity": self.max_queue,
+            "running": self.running,
+        }
+
+    async def start(self) -> None:
+        """Start the background flush task on the running loop"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        # Capacity is enforced by enqueue(), which also counts reserved slots
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop accepting events and flush everything still queued
+
+        The flush task writes its current batch and the rest of the queue
+        before it exits; it is only cancelled if that takes longer than
+        `stop_timeout`.
+        """
+        if self._task is None:
+            return
+        task = self._task
+        self._stopping = True
+        self._queue.put_nowait(_STOP)
+        try:
+            await asyncio.wait_for(asyncio.shield(task), self.stop_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Audit sink did not drain within {self.stop_timeout:g}s; cancelling the flush task")
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+        # Records handed off by worker threads just before stop() still land
+        while self._reserved:
+            await asyncio.sleep(0)
+        records = [record for record in self._drain() if record is not _STOP]
+        if records:
+            try:
+                await asyncio.wait_for(self._flush_all(records), self.stop_timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Audit sink stopped with {len(records)} events not written")
+
+    def _drain(self) -> List[Any]:
+        records = []
+        while not self._queue.empty():
+            records.append(self._queue.get_nowait())
+        return records
+
+    async def _flush_all(self, records: List[Dict[str, Any]]) -> None:
+        for offset in range(0, len(records), self.batch_size):
+            await self._flush(records[offset:offset + self.batch_size])
+
+    def _put(self, record: Dict[str, Any]) -> None:
+        self._queue.put_nowait(record)
+        self._stats["enqueued"] += 1
+        depth = self._queue.qsize()
+        if depth > self._stats["max_depth"]:
+            self._stats["max_depth"] = depth
+
+    def _put_reserved(self, record: Dict[str, Any]) -> None:
+        with self._reserve_lock:
+            self._reserved -= 1
+            self._put(record)
+
+    async def _run(self) -> None:
+        queue = self._queue
+        stopping = False
+        while not stopping:
+            record = await queue.get()
+            if record is _STOP:
+                break
+            batch = [record]
+            deadline = self._loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if not queue.empty():
+                    record = queue.get_nowait()
+                else:
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+        # Anything queued behind the stop marker
+        await self._flush_all(self._drain())
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        for writer in self.writers:
+            try:
+                result = writer(batch)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                self._stats["failed"] += len(batch)
+                logger.error(f"Audit writer {getattr(writer, '__name__', writer)} failed: {e}")
+        self._stats["flushed"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["last_flush_ms"] = (time.perf_counter() - started) * 1000
+
+def _as_uuid(value: Any) -> Optional[uuid.UUID]:
+    if value is None:
+        return None
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+def audit_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an audit event onto the audit_logs table columns"""
+    event_type = record.get("event_type", "unknown")
+    timestamp = record.get("timestamp")
+    return {
+        "user_id": _as_uuid(record.get("user_id")),
+        "action": event_type[:100],
+        "resource_type": record.get("resource_type") or event_type.split("_", 1)[0][:50],
+        "resource_id": _as_uuid(record.get("resource_id") or record.get("patient_id")),
+        "details": record,
+        "ip_address": record.get("ip_address"),
+        "user_agent": record.get("user_agent"),
+        "created_at": (datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else datetime.now()).astimezone(),
+    }
+
+async def write_audit_rows(batch: List[Dict[str, Any]]) -> None:
+    """Insert a batch into audit_logs as one multi-row INSERT"""
+    from sqlalchemy import column, insert, table
+    from sqlalchemy.dialects.postgresql import INET, JSONB, UUID
+    from sqlalchemy.types import DateTime, String, Text
+
+    from app.core.database import engine
+
+    audit_logs = table(
+        "audit_logs",
+        column("user_id", UUID(as_uuid=True)),
+        column("action", String),
+        column("resource_type", String),
+        column("resource_id", UUID(as_uuid=True)),
+        column("details", JSONB),
+        column("ip_address", INET),
+        column("user_agent", Text),
+        column("created_at", DateTime(timezone=True)),
+    )
+    async with engine.begin() as conn:
+        await conn.execute(insert(audit_logs).values([audit_row(record) for record in batch]))
+
+# Global instance
+audit_sink = AuditSink(
+    batch_size=settings.AUDIT_SINK_BATCH_SIZE,
+    flush_interval=settings.AUDIT_SINK_FLUSH_INTERVAL,
+    max_queue=settings.AUDIT_SINK_MAX_QUEUE,
+    stop_timeout=settings.AUDIT_SINK_STOP_TIMEOUT
+)
@@ -53,6 +53,28 @@ class Settings(BaseSettings):
     # Medical Specific
     FHIR_BASE_URL: str = "http://localhost:8080/fhir"
     DICOM_STORE_URL: str = "http://localhost:8042"
+    TERMINOLOGY_INDEX_DIR: Optional[str] = "data/terminology"
+    TERMINOLOGY_CACHE_TTL: int = 86400  # seconds
+    TERMINOLOGY_CACHE_SEARCH_SIZE: int = 10000
+    TERMINOLOGY_CACHE_CONCEPT_SIZE: int = 50000
+    TERMINOLOGY_CACHE_VALUESET_SIZE: int = 1000
+    TERMINOLOGY_CACHE_BACKEND: str = "local"  # local, memory or redis (shared through REDIS_URL)
+    TERMINOLOGY_SNAPSHOT_PATH: Optional[str] = "data/terminology/terminology.snapshot"
+    TERMINOLOGY_SNAPSHOT_CACHE_ENTRIES: int = 1000  # hottest entries kept per cache namespace
+    WAVEFORM_STORE_DIR: Optional[str] = "data/waveforms"
+    WAVEFORM_CHUNK_SECONDS: float = 10.0  # samples per stored chunk, in seconds
+    WAVEFORM_MAX_WINDOW_SECONDS: float = 60.0
+    
+    # De-identification
+    PHI_GAZETTEER_PRELOAD: bool = False
+    PHI_TOKEN_KEY: Optional[str] = None
+    PHI_TOKEN_VAULT_PATH: str = "data/phi_token_vault.db"
+    PHI_TOKEN_CACHE_SIZE: int = 100000
+    AUDIT_LOG_DIR: Optional[str] = "data/audit"
+    AUDIT_SINK_BATCH_SIZE: int = 500
+    AUDIT_SINK_FLUSH_INTERVAL: float = 1.0
+    AUDIT_SINK_MAX_QUEUE: int = 10000
+    AUDIT_SINK_STOP_TIMEOUT: float = 10.0
     
     # Feature Flags
     ENABLE_AI_ANALYSIS: bool = True
@@ -2,6 +2,9 @@ import logging
 import structlog
 from typing import Any, Dict
 import sys
+from datetime import datetime
+
+from app.core.audit import audit_sink
 
 def setup_logging() -> None:
     """Configure structured logging for the application."""
@@ -51,6 +54,18 @@ def log_patient_access(logger: structlog.BoundLogger, patient_id: str, user_id:
         action=action,
         event_type="patient_access"
     )
+    record = {
+        "event_type": "patient_access",
+        "timestamp": datetime.now().isoformat(),
+        "resource_type": "patient",
+        "patient_id": patient_id,
+        "user_id": user_id,
+        "action": action
+    }
+    if not audit_sink.enqueue(record):
+        # Sink stopped or full: write straight to the local audit store
+        from app.services.deidentification import deidentification_service
+        deidentification_service.audit_log.append(record)
 
 def log_ai_analysis(logger: structlog.BoundLogger, analysis_type: str, input_data: Dict[str, Any], result: Dict[str, Any]) -> None:
     """Log AI analysis for audit and monitoring."""
@@ -154,7 +154,7 @@ class Location(BaseModel):
     address: Address
 
 # Core Domain Models
-class Patient(BaseModel, TimestampedModel):
+class Patient(TimestampedModel):
     """Patient information"""
     id: UUID4 = Field(default_factory=uuid.uuid4)
     mrn: str = Field(..., min_length=1, max_length=50, description="Medical Record Number")
@@ -239,7 +239,7 @@ class Attachment(BaseModel):
     url: str = Field(..., max_length=500)
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
 
-class ClinicalNote(BaseModel, TimestampedModel):
+class ClinicalNote(TimestampedModel):
     """Clinical note"""
     id: UUID4 = Field(default_factory=uuid.uuid4)
     encounter_id: UUID4
@@ -311,7 +311,7 @@ class DICOMImage(BaseModel):
     thumbnail_url: str = Field(..., max_length=500)
     metadata: DICOMMetadata
 
-class ImagingStudy(BaseModel, TimestampedModel):
+class ImagingStudy(TimestampedModel):
     """Medical imaging study"""
     id: UUID4 = Field(default_factory=uuid.uuid4)
     encounter_id: UUID4
@@ -325,7 +325,7 @@ class ImagingStudy(BaseModel, TimestampedModel):
     images: List[DICOMImage] = Field(default_factory=list)
     report_url: Optional[str] = Field(None, max_length=500)
 
-class Encounter(BaseModel, TimestampedModel):
+class Encounter(TimestampedModel):
     """Patient encounter"""
     id: UUID4 = Field(default_factory=uuid.uuid4)
     patient_id: UUID4
@@ -379,7 +379,7 @@ class AIAnalysisResult(BaseModel):
     sources: List[Source] = Field(default_factory=list)
     warnings: Optional[List[str]] = Field(default_factory=list)
 
-class AIAnalysis(BaseModel, TimestampedModel):
+class AIAnalysis(TimestampedModel):
     """AI analysis record"""
     id: UUID4 = Field(default_factory=uuid.uuid4)
     patient_id: UUID4
@@ -414,7 +414,7 @@ class SharedResource(BaseModel):
     shared_by: Provider
     shared_at: datetime = Field(default_factory=datetime.utcnow)
 
-class Consultation(BaseModel, TimestampedModel):
+class Consultation(TimestampedModel):
     """Real-time consultation"""
     id: UUID4 = Field(default_factory=uuid.uuid4)
     patient_id: UUID4
@@ -426,7 +426,7 @@ class Consultation(BaseModel, TimestampedModel):
     shared_resources: List[SharedResource] = Field(default_factory=list)
 
 # User and Authentication Models
-class User(BaseModel, TimestampedModel):
+class User(TimestampedModel):
     """System user"""
     id: UUID4 = Field(default_factory=uuid.uuid4)
     email: str = Field(..., max_length=255)
@@ -483,7 +483,7 @@ class SearchFilters(BaseModel):
 class SortOptions(BaseModel):
     """Sorting options"""
     field: str = Field(..., max_length=50)
-    direction: str = Field(..., regex="^(asc|desc)$")
+    direction: str = Field(..., pattern="^(asc|desc)$")
 
 # Form Models
 class PatientCreate(BaseModel):
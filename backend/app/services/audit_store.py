@@ -0,0 +1,378 @@
+"""
+Audit Log Store
+Append-only, day-segmented audit log with time and attribute indexes
+"""
+
+from typing import Dict, List, Optional, Any, Iterator, Tuple
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+import heapq
+import io
+import json
+import os
+import re
+import threading
+
+_MS_PER_DAY = 86_400_000
+
+# Segment files are <YYYYMMDD>-<pid>.ndjson; anything else is ignored
+_SEGMENT_NAME = re.compile(r"^(\d{8})-\d+\.ndjson$")
+
+def _to_epoch_ms(value: Any) -> int:
+    """Convert a datetime or ISO timestamp string to epoch milliseconds"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp() * 1000)
+
+class _Segment:
+    """
+    One append-only NDJSON segment holding a single day of events
+
+    The index keeps epoch-ms timestamps and byte offsets in compact arrays and
+    maps event_type and patient_id to ordinal lists. Timestamps are appended
+    in order, so time ranges resolve with a binary search.
+    """
+
+    def __init__(self, day: int, path: Optional[str] = None):
+        self.day = day
+        self.path = path
+        self.buffer: Optional[io.BytesIO] = None if path else io.BytesIO()
+        self.timestamps = array('q')
+        self.offsets = array('Q')
+        self.by_event: Dict[str, array] = {}
+        self.by_patient: Dict[str, array] = {}
+        self.indexed_size = 0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _index(self, timestamp: int, offset: int, entry: Dict[str, Any]) -> None:
+        if self.timestamps and timestamp < self.timestamps[-1]:
+            # Keep the index sorted if the wall clock steps backwards
+            timestamp = self.timestamps[-1]
+        ordinal = len(self.timestamps)
+        self.timestamps.append(timestamp)
+        self.offsets.append(offset)
+        event_type = entry.get("event_type")
+        if event_type is not None:
+            self.by_event.setdefault(event_type, array('I')).append(ordinal)
+        patient_id = entry.get("patient_id")
+        if patient_id is not None:
+            self.by_patient.setdefault(str(patient_id), array('I')).append(ordinal)
+
+    def write(self, timestamp: int, line: bytes, entry: Dict[str, Any], handle: Any) -> None:
+        """Append an encoded entry and index it"""
+        offset = self.indexed_size
+        handle.write(line)
+        self.indexed_size += len(line)
+        self._index(timestamp, offset, entry)
+
+    def catch_up(self) -> None:
+        """Index entries appended to the segment since it was last indexed"""
+        if self.buffer is not None:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size <= self.indexed_size:
+            return
+
+        with open(self.path, "rb") as handle:
+            handle.seek(self.indexed_size)
+            offset = self.indexed_size
+            for line in handle:
+                if not line.endswith(b"\n"):
+                    # Partially written tail; pick it up on the next query
+                    break
+                entry = json.loads(line)
+                self._index(entry["_ts"], offset, entry)
+                offset += len(line)
+            self.indexed_size = offset
+
+    def select(
+        self,
+        start_ms: Optional[int],
+        end_ms: Optional[int],
+        event_type: Optional[str],
+        patient_id: Optional[str]
+    ) -> List[int]:
+        """Return matching ordinals in time order"""
+        low = 0 if start_ms is None else bisect_left(self.timestamps, start_ms)
+        high = len(self.timestamps) if end_ms is None else bisect_right(self.timestamps, end_ms)
+        if low >= high:
+            return []
+
+        candidates: Optional[List[int]] = None
+        for index, key in ((self.by_event, event_type), (self.by_patient, patient_id)):
+            if key is None:
+                continue
+            ordinals = index.get(key)
+            if not ordinals:
+                return []
+            in_range = ordinals[bisect_left(ordinals, low):bisect_left(ordinals, high)]
+            if candidates is None:
+                candidates = list(in_range)
+            else:
+                keep = set(in_range)
+                candidates = [ordinal for ordinal in candidates if ordinal in keep]
+
+        return list(range(low, high)) if candidates is None else candidates
+
+    def locate(self, ordinals: List[int]) -> Tuple[array, array, array]:
+        """
+        Snapshot the timestamps and byte ranges of ordinals
+
+        Entries are never rewritten, so the ranges stay valid once the store
+        lock is released and read() can run without it.
+        """
+        offsets, count = self.offsets, len(self.offsets)
+        timestamps = array('q', (self.timestamps[ordinal] for ordinal in ordinals))
+        starts = array('Q', (offsets[ordinal] for ordinal in ordinals))
+        ends = array('Q', (
+            offsets[ordinal + 1] if ordinal + 1 < count else self.indexed_size for ordinal in ordinals
+        ))
+        return timestamps, starts, ends
+
+    def read(self, located: Tuple[array, array, array], lock: Any) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (timestamp, entry) pairs for byte ranges returned by locate()"""
+        timestamps, starts, ends = located
+        if self.buffer is not None:
+            for timestamp, start, end in zip(timestamps, starts, ends):
+                # Appends to the buffer fail while a view of it is held
+                with lock, self.buffer.getbuffer() as data:
+                    line = bytes(data[start:end])
+                yield timestamp, _decode(line)
+            return
+        with open(self.path, "rb") as handle:
+            for timestamp, start, end in zip(timestamps, starts, ends):
+                handle.seek(start)
+                yield timestamp, _decode(handle.read(end - start))
+
+def _decode(line: bytes) -> Dict[str, Any]:
+    entry = json.loads(line)
+    entry.pop("_ts", None)
+    return entry
+
+class AuditLogStore:
+    """
+    Append-only audit log split into one segment per UTC day
+
+    With a `directory`, segments are NDJSON files named
+    `<YYYYMMDD>-<pid>.ndjson`, so every worker process appends to its own
+    files while queries read all of them. Indexes for segments are rebuilt
+    on demand and only `max_cached_segments` are kept in memory. Without a
+    directory, segments live in memory and only the newest `max_segments`
+    days are retained.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_cached_segments: int = 32,
+        max_segments: int = 7
+    ):
+        self.directory = directory
+        self.max_cached_segments = max_cached_segments
+        self.max_segments = max_segments
+        self._segments: "OrderedDict[str, _Segment]" = OrderedDict()
+        self._writer: Optional[_Segment] = None
+        self._writer_handle: Any = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of entries appended by this process"""
+        return self._count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.query())
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """
+        Append an audit entry; it is on disk when this returns
+
+        Args:
+            entry: Audit entry; its ISO `timestamp` is used for indexing
+        """
+        self.append_many([entry])
+
+    def append_many(self, entries: List[Dict[str, Any]]) -> None:
+        """Append a batch of audit entries with one flush and fsync"""
+        encoded = []
+        for entry in entries:
+            timestamp = _to_epoch_ms(entry["timestamp"]) if "timestamp" in entry else _to_epoch_ms(datetime.now())
+            line = (json.dumps({**entry, "_ts": timestamp}, default=str) + "\n").encode()
+            encoded.append((timestamp, line, entry))
+
+        with self._lock:
+            for timestamp, line, entry in encoded:
+                day = timestamp // _MS_PER_DAY
+                segment = self._writer
+                if segment is None or segment.day != day:
+                    segment = self._open_writer(day)
+                segment.write(timestamp, line, entry, self._writer_handle)
+                self._count += 1
+            self._sync()
+
+    def _sync(self) -> None:
+        """Push buffered writes of the active segment file to disk"""
+        if self._writer_handle is not None and self.directory:
+            self._writer_handle.flush()
+            os.fsync(self._writer_handle.fileno())
+
+    def query(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        event_type: Optional[str] = None,
+        patient_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get entries in time order with optional filtering
+
+        Args:
+            start_date: Inclusive lower bound
+            end_date: Inclusive upper bound
+            event_type: Type of event to filter
+            patient_id: Patient ID to filter
+
+        Returns:
+            Matching audit entries
+        """
+        return list(self.iter_query(start_date, end_date, event_type, patient_id))
+
+    def iter_query(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        event_type: Optional[str] = None,
+        patient_id: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield entries matching query()
+
+        Matching byte ranges of a day are located under the lock; the entries
+        are read and merged after releasing it, one at a time per segment.
+        """
+        start_ms = _to_epoch_ms(start_date) if start_date else None
+        end_ms = _to_epoch_ms(end_date) if end_date else None
+        patient_key = str(patient_id) if patient_id is not None else None
+
+        with self._lock:
+            days = self._segment_days()
+            low = 0 if start_ms is None else bisect_left(days, start_ms // _MS_PER_DAY)
+            high = len(days) if end_ms is None else bisect_right(days, end_ms // _MS_PER_DAY)
+            selected = days[low:high]
+
+        for day in selected:
+            with self._lock:
+                reads = []
+                for segment in self._segments_for_day(day):
+                    segment.catch_up()
+                    ordinals = segment.select(start_ms, end_ms, event_type, patient_key)
+                    if ordinals:
+                        reads.append(segment.read(segment.locate(ordinals), self._lock))
+            # Each worker's segment is time ordered; merge them per day
+            for _, entry in heapq.merge(*reads, key=lambda item: item[0]):
+                yield entry
+
+    def close(self) -> None:
+        """Flush and close the active segment"""
+        with self._lock:
+            if self._writer_handle is not None and self.directory:
+                self._writer_handle.close()
+            self._writer_handle = None
+            self._writer = None
+
+    def _open_writer(self, day: int) -> _Segment:
+        if self._writer_handle is not None and self.directory:
+            # Entries of the previous day may still be buffered
+            self._sync()
+            self._writer_handle.close()
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{self._day_label(day)}-{os.getpid()}.ndjson")
+            segment = self._segments.get(path) or _Segment(day, path)
+            segment.catch_up()
+            self._writer_handle = open(path, "ab")
+            self._segments[path] = segment
+        else:
+            key = self._day_label(day)
+            segment = self._segments.get(key) or _Segment(day)
+            self._writer_handle = segment.buffer
+            self._segments[key] = segment
+            while len(self._segments) > self.max_segments:
+                self._segments.popitem(last=False)
+
+        self._writer = segment
+        self._evict()
+        return segment
+
+    def _segment_days(self) -> List[int]:
+        if not self.directory:
+            return sorted(segment.day for segment in self._segments.values())
+        if not os.path.isdir(self.directory):
+            return []
+        days = set()
+        for name in os.listdir(self.directory):
+            day = self._segment_day(name)
+            if day is not None:
+                days.add(day)
+        return sorted(days)
+
+    def _segments_for_day(self, day: int) -> List[_Segment]:
+        label = self._day_label(day)
+        if not self.directory:
+            segment = self._segments.get(label)
+            return [segment] if segment is not None else []
+
+        segments = []
+        for name in sorted(os.listdir(self.directory)):
+            match = _SEGMENT_NAME.match(name)
+            if match is None or match.group(1) != label:
+                continue
+            path = os.path.join(self.directory, name)
+            segment = self._segments.get(path)
+            if segment is None:
+                segment = _Segment(day, path)
+                self._segments[path] = segment
+            self._segments.move_to_end(path)
+            segments.append(segment)
+        self._evict()
+        return segments
+
+    def _evict(self) -> None:
+        if not self.directory:
+            return
+        while len(self._segments) > self.max_cached_segments:
+            key, segment = next(iter(self._segments.items()))
+            if segment is self._writer:
+                self._segments.move_to_end(key)
+                if len(self._segments) == 1:
+                    break
+                continue
+            del self._segments[key]
+
+    @staticmethod
+    def _day_label(day: int) -> str:
+        return datetime.utcfromtimestamp(day * 86400).strftime("%Y%m%d")
+
+    @staticmethod
+    def _parse_day(label: str) -> int:
+        parsed = datetime.strptime(label, "%Y%m%d")
+        return (parsed - datetime(1970, 1, 1)).days
+
+    @classmethod
+    def _segment_day(cls, name: str) -> Optional[int]:
+        """Day of a segment file name, or None for files that are not segments"""
+        match = _SEGMENT_NAME.match(name)
+        if match is None:
+            return None
+        try:
+            return cls._parse_day(match.group(1))
+        except ValueError:
+            return None
@@ -0,0 +1,315 @@
+"""
+In-process Caching
+Size- and TTL-bounded LRU caches with hit/miss/eviction statistics
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import threading
+import time
+
+# Returned by get() on a miss so that None can be cached
+MISSING = object()
+
+class LRUCache:
+    """
+    LRU cache bounded by entry count, with per-entry expiry on a monotonic clock
+
+    Expired entries are dropped when looked up and, so that entries nobody
+    looks up again do not hold memory until LRU eviction, swept once every
+    `capacity` writes. The sweep costs O(capacity), so writes stay O(1)
+    amortized.
+    """
+
+    def __init__(self, capacity: int, ttl: float):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self._writes_since_purge = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Get a cached value
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value, or MISSING if absent or expired
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Cache a value, evicting the least recently used entries over capacity
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            ttl: Lifetime in seconds (cache default if None)
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._writes_since_purge += 1
+            if self._writes_since_purge >= self.capacity:
+                self._purge_expired()
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def keys(self) -> List[Hashable]:
+        """Current keys, least recently used first"""
+        with self._lock:
+            return list(self._data)
+
+    def clear(self) -> int:
+        """Drop every entry and return how many were dropped"""
+        with self._lock:
+            count = len(self._data)
+            self._data.clear()
+            return count
+
+    def purge_expired(self) -> int:
+        """Drop expired entries and return how many were dropped"""
+        with self._lock:
+            return self._purge_expired()
+
+    def _purge_expired(self) -> int:
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        self.expirations += len(expired)
+        self._writes_since_purge = 0
+        return len(expired)
+
+    def hottest(self, limit: int) -> List[Tuple[Hashable, Any, float]]:
+        """
+        Most recently used live entries
+
+        Args:
+            limit: Maximum number of entries
+
+        Returns:
+            (key, value, remaining ttl) tuples, most recently used first
+        """
+        now = time.monotonic()
+        entries = []
+        with self._lock:
+            for key in reversed(self._data):
+                if len(entries) >= limit:
+                    break
+                expires_at, value = self._data[key]
+                if expires_at > now:
+                    entries.append((key, value, expires_at - now))
+        return entries
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "capacity": self.capacity,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self.coalesced,
+        }
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls for the same key into one execution
+
+    The first caller starts the work as a task; callers arriving while it is
+    in flight await the same task. Each waiter awaits through a shield, so a
+    cancelled waiter never cancels the shared call. The key is released when
+    the call finishes, so errors and cancellations are delivered to the
+    current waiters but never remembered for later callers.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run factory() for key unless a call for it is already in flight
+
+        Args:
+            key: Coalescing key
+            factory: Zero-argument coroutine function doing the work
+
+        Returns:
+            Result of the shared call
+        """
+        task = self._calls.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda done, key=key: self._release(key, done))
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved when every waiter was cancelled
+            task.exception()
+
+class NamespacedCache:
+    """A set of independently bounded LRU caches keyed by namespace"""
+
+    def __init__(self, capacities: Dict[str, int], ttl: float):
+        self.namespaces: Dict[str, LRUCache] = {
+            namespace: LRUCache(capacity, ttl) for namespace, capacity in capacities.items()
+        }
+        self.flights = SingleFlight()
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        return self.namespaces[namespace].get(key)
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self.namespaces[namespace].set(key, value, ttl)
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        cache_if: Callable[[Any], bool] = lambda value: True
+    ) -> Any:
+        """
+        Return a cached value, loading it at most once across concurrent misses
+
+        Args:
+            namespace: Cache namespace
+            key: Cache key within the namespace
+            loader: Coroutine function producing the value on a miss
+            cache_if: Predicate deciding whether a loaded value is cached
+
+        Returns:
+            Cached or freshly loaded value
+        """
+        cache = self.namespaces[namespace]
+        value = cache.get(key)
+        if value is not MISSING:
+            return value
+
+        flight_key = (namespace, key)
+        if self.flights.in_flight(flight_key):
+            cache.coalesced += 1
+
+        async def load() -> Any:
+            loaded = await loader()
+            if cache_if(loaded):
+                cache.set(key, loaded)
+            return loaded
+
+        return await self.flights.do(flight_key, load)
+
+    async def get_many(self, namespace: str, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Look up many keys at once
+
+        Args:
+            namespace: Cache namespace
+            keys: Cache keys within the namespace
+
+        Returns:
+            Cached values by key; misses are left out
+        """
+        cache = self.namespaces[namespace]
+        found = {}
+        for key in keys:
+            value = cache.get(key)
+            if value is not MISSING:
+                found[key] = value
+        return found
+
+    async def set_many(self, namespace: str, items: List[Tuple[Hashable, Any]]) -> None:
+        cache = self.namespaces[namespace]
+        for key, value in items:
+            cache.set(key, value)
+
+    async def invalidate(self, namespace: Optional[str] = None, keys: Optional[List[Hashable]] = None) -> Dict[str, int]:
+        """
+        Drop entries: the given keys of a namespace, a whole namespace, or everything
+
+        Args:
+            namespace: Namespace to invalidate (all if None)
+            keys: Keys to drop within the namespace (whole namespace if None)
+
+        Returns:
+            Number of entries dropped per namespace
+        """
+        if namespace is not None and keys is not None:
+            cache = self.namespaces[namespace]
+            return {namespace: sum(cache.delete(key) for key in keys)}
+        return self.clear(namespace)
+
+    async def start(self) -> None:
+        """Connect to shared tiers; nothing to do for a purely local cache"""
+
+    async def stop(self) -> None:
+        """Release shared tier connections; nothing to do for a purely local cache"""
+
+    def clear(self, namespace: Optional[str] = None) -> Dict[str, int]:
+        """
+        Flush one namespace or all of them
+
+        Args:
+            namespace: Namespace to flush (all if None)
+
+        Returns:
+            Number of entries dropped per namespace
+        """
+        if namespace is not None:
+            return {namespace: self.namespaces[namespace].clear()}
+        return {name: cache.clear() for name, cache in self.namespaces.items()}
+
+    def purge_expired(self) -> Dict[str, int]:
+        """Drop expired entries of every namespace and return how many were dropped per namespace"""
+        return {name: cache.purge_expired() for name, cache in self.namespaces.items()}
+
+    def hottest(self, limit: int) -> Dict[str, List[Tuple[Hashable, Any, float]]]:
+        """Most recently used live entries of every namespace, up to `limit` each"""
+        return {name: cache.hottest(limit) for name, cache in self.namespaces.items()}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: cache.stats() for name, cache in self.namespaces.items()}
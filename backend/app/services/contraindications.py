@@ -0,0 +1,208 @@
+"""
+Contraindication Index
+Ingredient to condition rules matched against problem lists through subsumption
+"""
+
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+import csv
+import os
+
+import numpy as np
+
+from app.services.drug_interactions import INGREDIENTS_FILE, SEVERITY_RANK, iter_product_ingredients, map_products
+
+CONTRAINDICATIONS_FILE = "contraindications.csv"
+
+# Upper bound on (rule, problem) pairs tested per vectorised step
+_MAX_PAIRS = 1 << 20
+
+RuleRecord = Tuple[str, str, Dict[str, Any]]
+
+class ContraindicationIndex:
+    """
+    Precompiled contraindication rules keyed by RxNorm ingredient
+
+    Each rule names a condition concept and matches that concept and all of
+    its descendants. With a SNOMED CT index and closure the rule's condition
+    becomes its closure intervals; every interval of every rule is stored in
+    one sorted key array (rule * span + start), so any number of
+    (rule, problem) pairs resolve with a single searchsorted. Without a
+    closure, rules match their exact condition code only.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[RuleRecord],
+        product_ingredients: Iterable[Tuple[str, str]] = (),
+        index: Any = None,
+        closure: Any = None
+    ):
+        self.ingredient_ids: Dict[str, int] = {}
+        grouped: Dict[int, List[Tuple[str, Dict[str, Any]]]] = {}
+        for ingredient, condition, record in rules:
+            ingredient_id = self.ingredient_ids.setdefault(ingredient, len(self.ingredient_ids))
+            grouped.setdefault(ingredient_id, []).append((condition, record))
+        self.ingredient_codes = list(self.ingredient_ids)
+        self.products = map_products(product_ingredients, self.ingredient_ids)
+
+        # Rules sorted by ingredient so each ingredient owns a contiguous run
+        self.rule_conditions: List[str] = []
+        self.rule_ingredients: List[int] = []
+        self.records: List[Dict[str, Any]] = []
+        self.ingredient_offsets = np.zeros(len(self.ingredient_ids) + 1, dtype=np.int64)
+        for ingredient_id in range(len(self.ingredient_ids)):
+            for condition, record in grouped.get(ingredient_id, ()):
+                self.rule_conditions.append(condition)
+                self.rule_ingredients.append(ingredient_id)
+                self.records.append(record)
+            self.ingredient_offsets[ingredient_id + 1] = len(self.records)
+
+        self.index = index if closure is not None else None
+        self.closure = closure
+        self._labels: Dict[str, int] = {}
+        if self.closure is not None:
+            self.span = len(closure) + 1
+        else:
+            # Exact matching: each distinct rule condition is its own label
+            for condition in self.rule_conditions:
+                self._labels.setdefault(condition, len(self._labels))
+            self.span = len(self._labels) + 1
+
+        keys: List[np.ndarray] = []
+        ends: List[np.ndarray] = []
+        self.rule_offsets = np.zeros(len(self.records) + 1, dtype=np.int64)
+        for rule, condition in enumerate(self.rule_conditions):
+            starts, finishes = self._condition_intervals(condition)
+            keys.append(rule * self.span + starts.astype(np.int64))
+            ends.append(finishes.astype(np.int64))
+            self.rule_offsets[rule + 1] = self.rule_offsets[rule] + len(starts)
+        self.keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+        self.ends = np.concatenate(ends) if ends else np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _condition_intervals(self, condition: str) -> Tuple[np.ndarray, np.ndarray]:
+        if self.closure is None:
+            label = np.asarray([self._labels[condition]])
+            return label, label
+        position = self.index.find(condition)
+        if position < 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return self.closure.intervals(position)
+
+    def label(self, code: str) -> int:
+        """Hierarchy label of a condition code, or -1 if unknown"""
+        if self.closure is None:
+            return self._labels.get(code, -1)
+        label = self._labels.get(code)
+        if label is None:
+            # Memoised; bounded by the size of the release
+            position = self.index.find(code)
+            label = int(self.closure.pre[position]) if position >= 0 else -1
+            self._labels[code] = label
+        return label
+
+    def ingredients_of(self, drug_code: str) -> Tuple[int, ...]:
+        """Ingredient ids for a product or ingredient code"""
+        ingredient_id = self.ingredient_ids.get(drug_code)
+        if ingredient_id is not None:
+            return (ingredient_id,)
+        return self.products.get(drug_code, ())
+
+    def check(self, drug_codes: List[str], problem_lists: List[List[str]]) -> List[List[Dict[str, Any]]]:
+        """
+        Check every drug against every patient's problem list
+
+        Suited to one drug against many patients, or many drugs against one
+        patient; work grows with (rules for the drugs) x (total problems).
+
+        Args:
+            drug_codes: RxNorm product or ingredient codes
+            problem_lists: One list of SNOMED CT condition codes per patient
+
+        Returns:
+            Contraindications per patient, in input order, most severe first
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in problem_lists]
+
+        rule_drugs: Dict[int, List[str]] = {}
+        for code in dict.fromkeys(drug_codes):
+            for ingredient_id in self.ingredients_of(code):
+                first, last = self.ingredient_offsets[ingredient_id:ingredient_id + 2].tolist()
+                for rule in range(first, last):
+                    rule_drugs.setdefault(rule, []).append(code)
+        if not rule_drugs or not len(self.keys):
+            return results
+
+        problem_codes: List[str] = []
+        problem_patients: List[int] = []
+        for patient, conditions in enumerate(problem_lists):
+            unique = list(dict.fromkeys(conditions))
+            problem_codes.extend(unique)
+            problem_patients.extend([patient] * len(unique))
+        if not problem_codes:
+            return results
+
+        labels = np.fromiter((self.label(code) for code in problem_codes), dtype=np.int64, count=len(problem_codes))
+        known = np.flatnonzero(labels >= 0)
+        labels = labels[known]
+        rules = np.fromiter(rule_drugs, dtype=np.int64, count=len(rule_drugs))
+
+        chunk = max(1, _MAX_PAIRS // len(rules))
+        for low in range(0, len(labels), chunk):
+            chunk_labels = labels[low:low + chunk]
+            pair_rules = np.repeat(rules, len(chunk_labels))
+            pair_labels = np.tile(chunk_labels, len(rules))
+            slots = np.searchsorted(self.keys, pair_rules * self.span + pair_labels, side="right") - 1
+            matched = (slots >= self.rule_offsets[pair_rules]) & (self.ends[np.maximum(slots, 0)] >= pair_labels)
+
+            for pair in np.flatnonzero(matched).tolist():
+                rule = int(pair_rules[pair])
+                problem = int(known[low + pair % len(chunk_labels)])
+                patient = problem_patients[problem]
+                for drug in rule_drugs[rule]:
+                    results[patient].append({
+                        "drug": drug,
+                        "ingredient": self.ingredient_codes[self.rule_ingredients[rule]],
+                        "condition": problem_codes[problem],
+                        "rule_condition": self.rule_conditions[rule],
+                        **self.records[rule]
+                    })
+
+        for contraindications in results:
+            contraindications.sort(key=lambda item: -SEVERITY_RANK.get(item.get("severity"), 0))
+        return results
+
+    @classmethod
+    def from_directory(
+        cls,
+        directory: Optional[str],
+        index: Any = None,
+        closure: Any = None
+    ) -> Optional["ContraindicationIndex"]:
+        """Load `contraindications.csv` and `rxnorm_ingredients.tsv` if present"""
+        if not directory:
+            return None
+        rules_path = os.path.join(directory, CONTRAINDICATIONS_FILE)
+        if not os.path.exists(rules_path):
+            return None
+        ingredients_path = os.path.join(directory, INGREDIENTS_FILE)
+        product_ingredients = iter_product_ingredients(ingredients_path) if os.path.exists(ingredients_path) else ()
+        return cls(iter_contraindications_csv(rules_path), product_ingredients, index, closure)
+
+def iter_contraindications_csv(path: str) -> Iterator[RuleRecord]:
+    """
+    Read contraindication rules
+
+    Columns: ingredient (RxNorm), condition (SNOMED CT; descendants match
+    too), severity, description and recommendation.
+    """
+    with open(path, encoding="utf-8", newline="") as handle:
+        for row in csv.DictReader(handle):
+            yield row["ingredient"], row["condition"], {
+                "severity": row.get("severity") or "unknown",
+                "description": row.get("description", ""),
+                "recommendation": row.get("recommendation", ""),
+            }
@@ -0,0 +1,260 @@
+"""
+ICD-10-CM Crosswalk
+Rule-based SNOMED CT to ICD-10-CM map in sorted parallel arrays
+"""
+
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+import csv
+import glob
+import os
+import re
+
+import numpy as np
+
+CROSSWALK_FILE = "snomed_icd10cm_map.tsv"
+# SNOMED CT to ICD-10-CM extended map reference set (US edition)
+ICD10CM_MAP_REFSET = "6011000124106"
+
+MALE_CONCEPT = 248153007
+FEMALE_CONCEPT = 248152002
+AGE_AT_ONSET_CONCEPT = 445518008
+
+_GENDER_CODES = {MALE_CONCEPT: 1, FEMALE_CONCEPT: 2}
+_GENDERS = {"male": 1, "female": 2}
+_AGE_UNITS = {"years": 1.0, "months": 1 / 12, "weeks": 7 / 365.25, "days": 1 / 365.25}
+_CLAUSE = re.compile(r"IFA\s+(\d+)\s*\|[^|]*\|\s*(?:(<=|>=|<|>)\s*([\d.]+)\s*(\w+))?")
+
+MapRow = Dict[str, Any]
+
+def parse_map_rule(rule: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse a mapRule into gender, age bounds and a co-morbidity concept
+
+    Args:
+        rule: e.g. "TRUE", "OTHERWISE TRUE", "IFA 248152002 | Female (finding) |"
+            or "IFA 445518008 | Age at onset of clinical finding (observable entity) | < 15.0 years",
+            optionally joined with AND
+
+    Returns:
+        Rule fields, or None for rules this map cannot evaluate
+    """
+    parsed = {"gender": 0, "age_low": -np.inf, "age_high": np.inf, "context": 0}
+    rule = rule.strip()
+    if rule in ("", "TRUE", "OTHERWISE TRUE"):
+        return parsed
+
+    for clause in rule.split(" AND "):
+        match = _CLAUSE.fullmatch(clause.strip())
+        if match is None:
+            return None
+        concept = int(match.group(1))
+        operator, value, unit = match.group(2), match.group(3), match.group(4)
+        if concept == AGE_AT_ONSET_CONCEPT and operator:
+            if unit not in _AGE_UNITS:
+                return None
+            age = float(value) * _AGE_UNITS[unit]
+            if operator == ">=":
+                parsed["age_low"] = age
+            elif operator == ">":
+                parsed["age_low"] = float(np.nextafter(age, np.inf))
+            elif operator == "<":
+                parsed["age_high"] = age
+            else:
+                parsed["age_high"] = float(np.nextafter(age, np.inf))
+        elif concept in _GENDER_CODES and not operator:
+            parsed["gender"] = _GENDER_CODES[concept]
+        elif not operator and not parsed["context"]:
+            parsed["context"] = concept
+        else:
+            return None
+    return parsed
+
+class ICD10CMCrosswalk:
+    """
+    Bidirectional SNOMED CT / ICD-10-CM map
+
+    Forward rows are sorted by (concept, map group, priority) in parallel
+    arrays, so a concept's rules are one searchsorted range and each group
+    yields the target of its first rule that holds for the patient context.
+    The reverse direction keeps ICD-10-CM targets sorted alongside the
+    concepts that map to them.
+    """
+
+    def __init__(self, rows: Iterable[MapRow]):
+        records = []
+        for row in rows:
+            rule = parse_map_rule(row.get("rule", ""))
+            records.append((
+                int(row["concept"]), int(row.get("group", 1)), int(row.get("priority", 1)),
+                row.get("target", ""), row.get("rule", ""), row.get("advice", ""), rule
+            ))
+        records.sort(key=lambda record: record[:3])
+
+        self.concepts = np.asarray([record[0] for record in records], dtype=np.int64)
+        self.groups = np.asarray([record[1] for record in records], dtype=np.int16)
+        self.targets = np.asarray([record[3] for record in records], dtype=str)
+        self.rules = [record[4] for record in records]
+        self.advice = [record[5] for record in records]
+        # Unevaluable rules never match, so the group falls through to OTHERWISE TRUE
+        self.evaluable = np.asarray([record[6] is not None for record in records], dtype=bool)
+        parsed = [record[6] or {"gender": 0, "age_low": -np.inf, "age_high": np.inf, "context": 0} for record in records]
+        self.genders = np.asarray([rule["gender"] for rule in parsed], dtype=np.int8)
+        self.age_low = np.asarray([rule["age_low"] for rule in parsed], dtype=np.float64)
+        self.age_high = np.asarray([rule["age_high"] for rule in parsed], dtype=np.float64)
+        self.contexts = np.asarray([rule["context"] for rule in parsed], dtype=np.int64)
+
+        mapped = np.flatnonzero(self.targets != "") if len(records) else np.zeros(0, dtype=np.int64)
+        order = mapped[np.lexsort((self.concepts[mapped], self.targets[mapped]))]
+        self.reverse_targets = self.targets[order]
+        self.reverse_concepts = self.concepts[order]
+
+    def __len__(self) -> int:
+        return len(self.concepts)
+
+    def _resolve(
+        self,
+        forward: List[int],
+        lows: np.ndarray,
+        counts: np.ndarray,
+        ages: List[Optional[float]],
+        genders: List[Optional[str]],
+        contexts: List[Iterable[str]]
+    ) -> List[Tuple[int, int]]:
+        """
+        Evaluate every candidate rule at once and keep the first that holds
+        in each map group
+
+        Returns:
+            (item position, row) pairs for groups that resolve to a target
+        """
+        total = int(counts.sum())
+        if not total:
+            return []
+        item = np.repeat(np.arange(len(forward)), counts)
+        rows = np.repeat(lows, counts) + (np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts))
+
+        age = np.asarray([np.nan if ages[position] is None else ages[position] for position in forward], dtype=np.float64)[item]
+        gender = np.asarray([_GENDERS.get((genders[position] or "").lower(), 0) for position in forward], dtype=np.int8)[item]
+        bounded = (self.age_low[rows] > -np.inf) | (self.age_high[rows] < np.inf)
+        holds = (
+            self.evaluable[rows]
+            & ((self.genders[rows] == 0) | (self.genders[rows] == gender))
+            & (~bounded | ((self.age_low[rows] <= age) & (age < self.age_high[rows])))
+        )
+
+        # Co-morbidity rules are rare; check them against each item's context
+        for candidate in np.flatnonzero(holds & (self.contexts[rows] != 0)).tolist():
+            context = contexts[forward[item[candidate]]]
+            holds[candidate] = str(self.contexts[rows[candidate]]) in {str(code) for code in context}
+
+        # Rows are ordered by (item, group, priority): the first holding row per key wins
+        holding = np.flatnonzero(holds)
+        group_keys = item[holding].astype(np.int64) * 65536 + self.groups[rows[holding]]
+        _, first = np.unique(group_keys, return_index=True)
+        chosen = holding[first]
+        chosen = chosen[self.targets[rows[chosen]] != ""]
+        return [(forward[position], row) for position, row in zip(item[chosen].tolist(), rows[chosen].tolist())]
+
+    def to_icd10cm(
+        self,
+        concept_id: str,
+        age_years: Optional[float] = None,
+        gender: Optional[str] = None,
+        context: Iterable[str] = ()
+    ) -> List[Dict[str, Any]]:
+        """
+        Map a SNOMED CT concept to ICD-10-CM codes
+
+        Args:
+            concept_id: SNOMED CT concept id
+            age_years: Age at onset, for age rules
+            gender: "male" or "female", for gender rules
+            context: Other SNOMED CT concepts on record, for co-morbidity rules
+
+        Returns:
+            One target per map group whose rules hold
+        """
+        return self.map_many([(concept_id, True)], [age_years], [gender], [context])[0]
+
+    def to_snomed(self, icd_code: str) -> List[str]:
+        """SNOMED CT concepts that map to an ICD-10-CM code"""
+        low = np.searchsorted(self.reverse_targets, icd_code, side="left")
+        high = np.searchsorted(self.reverse_targets, icd_code, side="right")
+        return [str(concept) for concept in dict.fromkeys(self.reverse_concepts[low:high].tolist())]
+
+    def map_many(
+        self,
+        items: List[Tuple[str, bool]],
+        ages: List[Optional[float]],
+        genders: List[Optional[str]],
+        contexts: List[Iterable[str]]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Map many codes in either direction with one binary search pass
+
+        Args:
+            items: (code, is_snomed) pairs; SNOMED CT codes map to ICD-10-CM
+                and ICD-10-CM codes map back to SNOMED CT
+            ages: Age at onset per item
+            genders: Gender per item
+            contexts: SNOMED CT concepts on record per item
+
+        Returns:
+            Mappings per item, in input order
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in items]
+        forward = [position for position, (code, is_snomed) in enumerate(items) if is_snomed and code.isdigit()]
+        reverse = [position for position, (_, is_snomed) in enumerate(items) if not is_snomed]
+
+        if forward and len(self.concepts):
+            keys = np.asarray([int(items[position][0]) for position in forward], dtype=np.int64)
+            lows = np.searchsorted(self.concepts, keys, side="left")
+            counts = np.searchsorted(self.concepts, keys, side="right") - lows
+            for position, row in self._resolve(forward, lows, counts, ages, genders, contexts):
+                results[position].append({
+                    "code": str(self.targets[row]),
+                    "map_group": int(self.groups[row]),
+                    "rule": self.rules[row],
+                    "advice": self.advice[row]
+                })
+
+        if reverse and len(self.reverse_targets):
+            keys = np.asarray([items[position][0] for position in reverse], dtype=str)
+            lows = np.searchsorted(self.reverse_targets, keys, side="left").tolist()
+            highs = np.searchsorted(self.reverse_targets, keys, side="right").tolist()
+            for position, low, high in zip(reverse, lows, highs):
+                results[position] = [
+                    {"code": str(concept)} for concept in dict.fromkeys(self.reverse_concepts[low:high].tolist())
+                ]
+
+        return results
+
+    @classmethod
+    def from_directory(cls, directory: Optional[str]) -> Optional["ICD10CMCrosswalk"]:
+        """Load `snomed_icd10cm_map.tsv` or an RF2 extended map snapshot if present"""
+        if not directory:
+            return None
+        path = os.path.join(directory, CROSSWALK_FILE)
+        if not os.path.exists(path):
+            snapshots = sorted(glob.glob(os.path.join(directory, "der2_*ExtendedMapSnapshot*.txt")))
+            if not snapshots:
+                return None
+            path = snapshots[-1]
+        return cls(iter_extended_map(path))
+
+def iter_extended_map(path: str) -> Iterator[MapRow]:
+    """Read active ICD-10-CM rows from an RF2 extended map snapshot"""
+    with open(path, encoding="utf-8") as handle:
+        reader = csv.reader(handle, delimiter="\t", quoting=csv.QUOTE_NONE)
+        next(reader)
+        for row in reader:
+            if row[2] != "1" or row[4] != ICD10CM_MAP_REFSET:
+                continue
+            yield {
+                "concept": row[5],
+                "group": row[6],
+                "priority": row[7],
+                "rule": row[8],
+                "advice": row[9],
+                "target": row[10],
+            }
@@ -3,13 +3,33 @@ De-identification and Privacy Service
 Handles PHI redaction, consent management, and tokenization
 """
 
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, Tuple, FrozenSet, Iterable, Iterator
 import re
 import hashlib
+import hmac
 import json
 import uuid
 from datetime import datetime, timedelta
 from enum import Enum
+from functools import lru_cache, partial
+from concurrent.futures import Executor, ProcessPoolExecutor
+from collections import deque
+from array import array
+import asyncio
+import csv
+import heapq
+import io
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+
+from app.core.audit import audit_sink
+from app.core.config import settings
+from app.services.audit_store import AuditLogStore
+from app.services.gazetteer import Gazetteer
+from app.services.token_vault import TokenVault
 
 class PHIType(str, Enum):
     NAME = "name"
@@ -33,20 +53,287 @@ class ConsentStatus(str, Enum):
     EXPIRED = "expired"
     WITHDRAWN = "withdrawn"
 
+# Regex patterns per PHI type. Declaration order of PHIType doubles as match
+# priority when two patterns claim the same span.
+PHI_PATTERNS: Dict[PHIType, List[str]] = {
+    PHIType.NAME: [
+        r'\bDr\. [A-Z][a-z]+ [A-Z][a-z]+\b',  # Dr. First Last
+        r'\b[A-Z][a-z]+ [A-Z][a-z]+\b',  # First Last
+    ],
+    PHIType.DATE: [
+        r'\b\d{1,2}/\d{1,2}/\d{4}\b',  # MM/DD/YYYY
+        r'\b\d{4}-\d{2}-\d{2}\b',  # YYYY-MM-DD
+        r'\b\d{1,2}-\d{1,2}-\d{4}\b',  # MM-DD-YYYY
+    ],
+    PHIType.PHONE: [
+        r'\b\d{3}-\d{3}-\d{4}\b',  # XXX-XXX-XXXX
+        r'\(\d{3}\) \d{3}-\d{4}\b',  # (XXX) XXX-XXXX
+        r'\b\d{10}\b',  # XXXXXXXXXX
+    ],
+    PHIType.EMAIL: [
+        r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+    ],
+    PHIType.SSN: [
+        r'\b\d{3}-\d{2}-\d{4}\b',  # XXX-XX-XXXX
+        r'\b\d{9}\b',  # XXXXXXXXX
+    ],
+    PHIType.MRN: [
+        r'\bMRN-\d{4}-\d{3}\b',  # MRN-YYYY-XXX
+        r'\b\d{8,10}\b',  # 8-10 digit numbers
+    ],
+    PHIType.ADDRESS: [
+        r'\b\d+\s+[A-Za-z\s]+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr)\b',
+    ],
+}
+
+# Types whose patterns rely on capitalisation and must not run under
+# IGNORECASE. They are scanned on their own for overlapping candidates, so a
+# capitalised word before a name ("Patient John Smith") cannot claim the
+# name's first word and hide the real name match
+_CASE_SENSITIVE_TYPES = {PHIType.NAME}
+
+_PHI_PRIORITY: Dict[PHIType, int] = {phi_type: rank for rank, phi_type in enumerate(PHIType)}
+
+Span = Tuple[int, int, PHIType]
+
+def resolve_overlaps(spans: List[Span]) -> List[Span]:
+    """
+    Merge candidate spans into a sorted, non-overlapping set
+    
+    Overlapping spans are combined into one span covering all of them, so
+    every character claimed by any matcher is redacted. A merged span takes
+    the highest-priority PHI type among its parts, so the result does not
+    depend on input order.
+    
+    Args:
+        spans: Candidate (start, end, phi_type) spans
+        
+    Returns:
+        Non-overlapping spans sorted by start offset
+    """
+    resolved: List[Span] = []
+    for start, end, phi_type in sorted(spans, key=lambda s: s[0]):
+        if resolved and start < resolved[-1][1]:
+            last_start, last_end, last_type = resolved[-1]
+            if _PHI_PRIORITY[phi_type] < _PHI_PRIORITY[last_type]:
+                last_type = phi_type
+            resolved[-1] = (last_start, max(last_end, end), last_type)
+        else:
+            resolved.append((start, end, phi_type))
+    return resolved
+
+class RedactionEngine:
+    """
+    Compiled single-pass PHI matcher for a fixed set of PHI types
+    
+    Regex matches are combined with known identifiers from the global
+    phi_gazetteer and overlapping spans are merged.
+    """
+    
+    def __init__(self, phi_types: FrozenSet[PHIType]):
+        self.phi_types = phi_types
+        alternatives = []
+        case_sensitive = []
+        for phi_type in PHIType:
+            if phi_type in phi_types and phi_type in PHI_PATTERNS:
+                group = f"(?P<{phi_type.value}>{'|'.join(PHI_PATTERNS[phi_type])})"
+                if phi_type in _CASE_SENSITIVE_TYPES:
+                    case_sensitive.append(group)
+                else:
+                    alternatives.append(group)
+        self.pattern = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+        # A lookahead consumes nothing, so a candidate is tried at every offset
+        self.overlapping_pattern = (
+            re.compile(f"(?=(?:{'|'.join(case_sensitive)}))") if case_sensitive else None
+        )
+    
+    def scan(self, text: str, pos: int = 0) -> List[Span]:
+        """
+        Find PHI spans in a single pass over the text
+        
+        Args:
+            text: Text content to scan
+            pos: Offset to start scanning from; characters before it still
+                count as context for word boundaries
+            
+        Returns:
+            Non-overlapping (start, end, phi_type) spans in original offsets
+        """
+        spans: List[Span] = []
+        if self.pattern is not None:
+            spans = [
+                (match.start(), match.end(), PHIType(match.lastgroup))
+                for match in self.pattern.finditer(text, pos)
+            ]
+        if self.overlapping_pattern is not None:
+            spans.extend(
+                (*match.span(match.lastgroup), PHIType(match.lastgroup))
+                for match in self.overlapping_pattern.finditer(text, pos)
+            )
+        if len(phi_gazetteer):
+            spans.extend(phi_gazetteer.scan(text, pos, self.phi_types))
+        return resolve_overlaps(spans)
+    
+    @staticmethod
+    def apply(text: str, spans: List[Span], replacement: str) -> str:
+        """
+        Build the redacted text from sorted, non-overlapping spans with one join
+        
+        Args:
+            text: Original text
+            spans: Spans returned by scan()
+            replacement: Replacement text for each span
+            
+        Returns:
+            Redacted text
+        """
+        if not spans:
+            return text
+        parts: List[str] = []
+        cursor = 0
+        for start, end, _ in spans:
+            parts.append(text[cursor:start])
+            parts.append(replacement)
+            cursor = end
+        parts.append(text[cursor:])
+        return ''.join(parts)
+
+# Known patient and provider identifiers, matched in linear time alongside the
+# regex patterns. redact_many() workers receive a copy when their pool starts.
+phi_gazetteer = Gazetteer()
+
+def _init_redaction_worker(gazetteer: Gazetteer) -> None:
+    """Process-pool initializer: install the parent's gazetteer in a worker"""
+    global phi_gazetteer
+    phi_gazetteer = gazetteer
+
+def _identifier_terms(
+    first_name: Optional[str] = None,
+    last_name: Optional[str] = None,
+    mrn: Optional[str] = None,
+    phone: Optional[str] = None
+) -> List[Tuple[str, PHIType]]:
+    """
+    Expand one person's identifiers into gazetteer terms
+    
+    Names are only registered in full: a bare first or last name is often
+    an ordinary word ("Will", "Hope", "Stroke") and matching it alone would
+    redact clinical text. Email addresses are left to the EMAIL pattern,
+    which already matches every address.
+    """
+    terms: List[Tuple[str, PHIType]] = []
+    if first_name and last_name:
+        terms.append((f"{first_name} {last_name}", PHIType.NAME))
+        terms.append((f"{last_name}, {first_name}", PHIType.NAME))
+    if mrn:
+        terms.append((mrn, PHIType.MRN))
+    if phone:
+        terms.append((phone, PHIType.PHONE))
+    return terms
+
+@lru_cache(maxsize=32)
+def _compiled_engine(phi_types: FrozenSet[PHIType]) -> RedactionEngine:
+    return RedactionEngine(phi_types)
+
+def get_redaction_engine(phi_types: Optional[List[PHIType]] = None) -> RedactionEngine:
+    """
+    Get the compiled redaction engine for a set of PHI types
+    
+    Args:
+        phi_types: Types of PHI to match (all if None)
+        
+    Returns:
+        Cached RedactionEngine instance
+    """
+    return _compiled_engine(frozenset(phi_types) if phi_types is not None else frozenset(PHIType))
+
+# Compile the default engine at import so the first request does not pay for it
+get_redaction_engine()
+
+# Stable small-integer codes for PHI types in compact redaction results
+PHI_TYPE_CODES: Tuple[PHIType, ...] = tuple(PHIType)
+_PHI_TYPE_CODE: Dict[PHIType, int] = {phi_type: code for code, phi_type in enumerate(PHI_TYPE_CODES)}
+
+def _redact_text(
+    text: str,
+    phi_types: Optional[List[PHIType]],
+    replacement: str,
+    compact: bool = False
+) -> Dict[str, Any]:
+    """Redact a single text without touching service state"""
+    engine = get_redaction_engine(phi_types)
+    spans = engine.scan(text)
+    timestamp = datetime.now().isoformat()
+    
+    if compact:
+        return {
+            "redacted_text": engine.apply(text, spans, replacement),
+            "starts": array('I', [span[0] for span in spans]),
+            "ends": array('I', [span[1] for span in spans]),
+            "types": array('B', [_PHI_TYPE_CODE[span[2]] for span in spans]),
+            "timestamp": timestamp
+        }
+    
+    return {
+        "redacted_text": engine.apply(text, spans, replacement),
+        "redactions": [
+            {
+                "type": phi_type.value,
+                "original": text[start:end],
+                "replacement": replacement,
+                "position": (start, end),
+                "timestamp": timestamp
+            }
+            for start, end, phi_type in spans
+        ],
+        "timestamp": timestamp
+    }
+
+def _redact_batch(
+    texts: List[str],
+    phi_types: Optional[List[PHIType]],
+    replacement: str,
+    compact: bool = False
+) -> List[Dict[str, Any]]:
+    """Process-pool worker: redact one dispatched chunk of texts"""
+    return [_redact_text(text, phi_types, replacement, compact) for text in texts]
+
+def _redaction_summary(result: Dict[str, Any]) -> Tuple[int, set]:
+    """Count and distinct type values of a full or compact redaction result"""
+    if "types" in result:
+        return len(result["types"]), {PHI_TYPE_CODES[code].value for code in set(result["types"])}
+    return len(result["redactions"]), {r["type"] for r in result["redactions"]}
+
 class DeidentificationService:
     """Service for PHI de-identification and privacy management"""
     
-    def __init__(self):
-        self.token_map: Dict[str, str] = {}
-        self.reverse_token_map: Dict[str, str] = {}
+    def __init__(
+        self,
+        token_vault: Optional[TokenVault] = None,
+        token_key: Optional[Union[str, bytes]] = None,
+        audit_store: Optional[AuditLogStore] = None
+    ):
+        self.token_vault = token_vault or TokenVault()
+        if isinstance(token_key, str):
+            token_key = token_key.encode()
+        self.token_key: bytes = token_key or os.urandom(32)
         self.consent_registry: Dict[str, Dict[str, Any]] = {}
-        self.audit_log: List[Dict[str, Any]] = []
+        # Granted consent ids per (patient_id, consent_type), insertion ordered
+        self._active_consents: Dict[Tuple[str, str], Dict[str, None]] = {}
+        self._consent_scopes: Dict[str, FrozenSet[str]] = {}
+        self._consent_expiry_heap: List[Tuple[float, str]] = []
+        self.audit_log = audit_store or AuditLogStore()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_key: Optional[Tuple[Optional[int], int]] = None
+        self._pool_lock = threading.Lock()
         
     def redact_phi(
         self, 
         text: str, 
         phi_types: Optional[List[PHIType]] = None,
-        replacement: str = "[REDACTED]"
+        replacement: str = "[REDACTED]",
+        compact: bool = False,
+        include_original: bool = True
     ) -> Dict[str, Any]:
         """
         Redact PHI from text content
@@ -55,79 +342,333 @@ class DeidentificationService:
             text: Text content to redact
             phi_types: Types of PHI to redact (all if None)
             replacement: Replacement text for redacted content
+            compact: Return parallel `starts`/`ends`/`types` arrays instead of
+                a dict per redaction; `types` holds indexes into PHI_TYPE_CODES
+                and the original PHI values are not echoed
+            include_original: Include `original_text` in the result
             
         Returns:
             Dictionary with redacted text and audit information
         """
-        if phi_types is None:
-            phi_types = list(PHIType)
-        
-        original_text = text
-        redacted_text = text
-        redactions = []
-        
-        # Patterns for different PHI types
-        patterns = {
-            PHIType.NAME: [
-                r'\b[A-Z][a-z]+ [A-Z][a-z]+\b',  # First Last
-                r'\bDr\. [A-Z][a-z]+ [A-Z][a-z]+\b',  # Dr. First Last
-            ],
-            PHIType.DATE: [
-                r'\b\d{1,2}/\d{1,2}/\d{4}\b',  # MM/DD/YYYY
-                r'\b\d{4}-\d{2}-\d{2}\b',  # YYYY-MM-DD
-                r'\b\d{1,2}-\d{1,2}-\d{4}\b',  # MM-DD-YYYY
-            ],
-            PHIType.PHONE: [
-                r'\b\d{3}-\d{3}-\d{4}\b',  # XXX-XXX-XXXX
-                r'\b\(\d{3}\) \d{3}-\d{4}\b',  # (XXX) XXX-XXXX
-                r'\b\d{10}\b',  # XXXXXXXXXX
-            ],
-            PHIType.EMAIL: [
-                r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-            ],
-            PHIType.SSN: [
-                r'\b\d{3}-\d{2}-\d{4}\b',  # XXX-XX-XXXX
-                r'\b\d{9}\b',  # XXXXXXXXX
-            ],
-            PHIType.MRN: [
-                r'\bMRN-\d{4}-\d{3}\b',  # MRN-YYYY-XXX
-                r'\b\d{8,10}\b',  # 8-10 digit numbers
-            ],
-            PHIType.ADDRESS: [
-                r'\b\d+\s+[A-Za-z\s]+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr)\b',
-            ],
-        }
-        
-        for phi_type in phi_types:
-            if phi_type in patterns:
-                for pattern in patterns[phi_type]:
-                    matches = re.finditer(pattern, redacted_text, re.IGNORECASE)
-                    for match in matches:
-                        original_value = match.group()
-                        redacted_text = redacted_text.replace(original_value, replacement)
-                        redactions.append({
-                            "type": phi_type.value,
-                            "original": original_value,
-                            "replacement": replacement,
-                            "position": match.span(),
-                            "timestamp": datetime.now().isoformat()
-                        })
+        result = _redact_text(text, phi_types, replacement, compact)
+        redaction_count, redaction_types = _redaction_summary(result)
         
         # Log the redaction
-        self._log_redaction(original_text, redacted_text, redactions)
+        self._log_redaction(
+            len(text),
+            len(result["redacted_text"]),
+            redaction_count,
+            redaction_types
+        )
         
-        return {
-            "original_text": original_text,
-            "redacted_text": redacted_text,
-            "redactions": redactions,
-            "timestamp": datetime.now().isoformat()
-        }
+        if include_original:
+            return {"original_text": text, **result}
+        return result
+    
+    def redact_many(
+        self,
+        texts: Iterable[str],
+        phi_types: Optional[List[PHIType]] = None,
+        replacement: str = "[REDACTED]",
+        max_workers: Optional[int] = None,
+        chunksize: int = 64,
+        executor: Optional[Executor] = None,
+        compact: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Redact PHI from many texts across a process pool
+        
+        Texts are dispatched to workers in chunks of `chunksize` with a
+        bounded number of chunks in flight, and results are returned in input
+        order. Results have the same shape as redact_phi() without the
+        `original_text` echo. A single audit entry is written for the batch.
+        
+        Args:
+            texts: Texts to redact
+            phi_types: Types of PHI to redact (all if None)
+            replacement: Replacement text for redacted content
+            max_workers: Worker processes of the shared redaction pool
+            chunksize: Number of texts sent to a worker per task
+            executor: Existing executor to use instead of the shared pool
+            compact: Return compact span-array results (see redact_phi)
+            
+        Returns:
+            List of redaction results in input order
+        """
+        if executor is None:
+            executor = self.redaction_pool(max_workers)
+        worker = partial(
+            _redact_batch,
+            phi_types=list(phi_types) if phi_types is not None else None,
+            replacement=replacement,
+            compact=compact
+        )
+        results: List[Dict[str, Any]] = []
+        stats = {"documents": 0, "original_length": 0}
+        
+        def chunks() -> Iterator[List[str]]:
+            batch: List[str] = []
+            for text in texts:
+                batch.append(text)
+                stats["documents"] += 1
+                stats["original_length"] += len(text)
+                if len(batch) >= chunksize:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        
+        def run(pool: Executor, in_flight_limit: int) -> None:
+            in_flight = deque()
+            for batch in chunks():
+                in_flight.append(pool.submit(worker, batch))
+                if len(in_flight) >= in_flight_limit:
+                    results.extend(in_flight.popleft().result())
+            while in_flight:
+                results.extend(in_flight.popleft().result())
+        
+        run(executor, 2 * (max_workers or os.cpu_count() or 1))
+        
+        self._log_batch_redaction(stats["documents"], stats["original_length"], results)
+        
+        return results
+    
+    async def redact_many_async(
+        self,
+        texts: List[str],
+        phi_types: Optional[List[PHIType]] = None,
+        replacement: str = "[REDACTED]",
+        max_workers: Optional[int] = None,
+        chunksize: int = 64,
+        executor: Optional[Executor] = None,
+        compact: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Run redact_many() off the event loop
+        
+        Args:
+            texts: Texts to redact
+            phi_types: Types of PHI to redact (all if None)
+            replacement: Replacement text for redacted content
+            max_workers: Worker processes of the shared redaction pool
+            chunksize: Number of texts sent to a worker per task
+            executor: Existing executor to use instead of the shared pool
+            compact: Return compact span-array results (see redact_phi)
+            
+        Returns:
+            List of redaction results in input order
+        """
+        if executor is None:
+            # Start the pool from the event loop thread, not an executor thread
+            executor = self.redaction_pool(max_workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            partial(
+                self.redact_many,
+                texts,
+                phi_types=phi_types,
+                replacement=replacement,
+                max_workers=max_workers,
+                chunksize=chunksize,
+                executor=executor,
+                compact=compact
+            )
+        )
+    
+    def redaction_pool(self, max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+        """
+        Get the shared process pool used by redact_many()
+        
+        Workers are spawned rather than forked, so the pool can be started
+        from a process with running threads, and an initializer ships them
+        the gazetteer; the regex engines are compiled when the module is
+        imported in each worker. The pool is reused across calls and
+        replaced when `max_workers` changes or terms were added to the
+        gazetteer since it started.
+        
+        Args:
+            max_workers: Worker processes (CPU count if None)
+            
+        Returns:
+            Running ProcessPoolExecutor
+        """
+        key = (max_workers, phi_gazetteer.version)
+        with self._pool_lock:
+            if self._pool is None or self._pool_key != key:
+                if self._pool is not None:
+                    # Tasks already submitted to the old pool still finish
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_redaction_worker,
+                    initargs=(phi_gazetteer,)
+                )
+                self._pool_key = key
+            return self._pool
+    
+    def shutdown_redaction_pool(self) -> None:
+        """Stop the shared redaction pool's workers"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+            self._pool = None
+            self._pool_key = None
+    
+    def redact_phi_stream(
+        self,
+        chunks: Iterable[str],
+        phi_types: Optional[List[PHIType]] = None,
+        replacement: str = "[REDACTED]",
+        overlap: int = 256
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Redact PHI from a stream of text chunks
+        
+        The last `overlap` characters of each buffer are held back until the
+        next chunk arrives so that PHI split across a chunk boundary is still
+        matched. Only the held-back window is kept between chunks, so memory
+        stays flat regardless of document size. Matches longer than `overlap`
+        that straddle a boundary are not guaranteed to be found.
+        
+        Args:
+            chunks: Iterable of text chunks in document order
+            phi_types: Types of PHI to redact (all if None)
+            replacement: Replacement text for redacted content
+            overlap: Number of trailing characters carried across chunks
+            
+        Yields:
+            Dictionaries with the redacted text piece, its offset in the
+            original stream and redactions with stream-global positions
+        """
+        engine = get_redaction_engine(phi_types)
+        buffer = ""
+        buffer_offset = 0  # Global offset of buffer[0]
+        scan_from = 0  # Index in buffer where unemitted text starts
+        original_length = 0
+        redacted_length = 0
+        redaction_count = 0
+        redaction_types = set()
+        
+        def emit(cut: int, spans: List[Span]) -> Dict[str, Any]:
+            nonlocal original_length, redacted_length, redaction_count
+            piece = buffer[scan_from:cut]
+            local = [(start - scan_from, end - scan_from, phi_type) for start, end, phi_type in spans]
+            redacted_piece = engine.apply(piece, local, replacement)
+            timestamp = datetime.now().isoformat()
+            global_start = buffer_offset + scan_from
+            
+            original_length += len(piece)
+            redacted_length += len(redacted_piece)
+            redaction_count += len(spans)
+            redaction_types.update(phi_type.value for _, _, phi_type in spans)
+            
+            return {
+                "redacted_text": redacted_piece,
+                "offset": global_start,
+                "redactions": [
+                    {
+                        "type": phi_type.value,
+                        "original": buffer[start:end],
+                        "replacement": replacement,
+                        "position": (buffer_offset + start, buffer_offset + end),
+                        "timestamp": timestamp
+                    }
+                    for start, end, phi_type in spans
+                ]
+            }
+        
+        for chunk in chunks:
+            if not chunk:
+                continue
+            buffer += chunk
+            cut = len(buffer) - overlap
+            if cut <= scan_from:
+                continue
+            
+            final_spans: List[Span] = []
+            for span in engine.scan(buffer, scan_from):
+                if span[0] >= cut:
+                    break
+                if span[1] > cut:
+                    # Never split a match; hold it back with the window
+                    cut = span[0]
+                    break
+                final_spans.append(span)
+            
+            if cut > scan_from:
+                yield emit(cut, final_spans)
+                # Keep one character before the cut as word-boundary context
+                keep = cut - 1
+                buffer = buffer[keep:]
+                buffer_offset += keep
+                scan_from = 1
+        
+        if len(buffer) > scan_from:
+            yield emit(len(buffer), engine.scan(buffer, scan_from))
+        
+        self._log_redaction(original_length, redacted_length, redaction_count, redaction_types)
+    
+    def add_known_identifiers(
+        self,
+        first_name: Optional[str] = None,
+        last_name: Optional[str] = None,
+        mrn: Optional[str] = None,
+        phone: Optional[str] = None
+    ) -> int:
+        """
+        Add a patient's or provider's identifiers to the redaction gazetteer
+        
+        Args:
+            first_name: Given name
+            last_name: Family name
+            mrn: Medical record number
+            phone: Phone number
+            
+        Returns:
+            Number of new gazetteer terms
+        """
+        return phi_gazetteer.add_terms(_identifier_terms(first_name, last_name, mrn, phone))
+    
+    async def load_known_identifiers(self, session: Any, batch_size: int = 10000) -> int:
+        """
+        Build the redaction gazetteer from the patients and users tables
+        
+        Args:
+            session: SQLAlchemy AsyncSession
+            batch_size: Rows fetched per round trip
+            
+        Returns:
+            Number of new gazetteer terms
+        """
+        from sqlalchemy import text as sql_text
+        
+        queries = [
+            sql_text(
+                "SELECT first_name, last_name, mrn, contact_info->>'phone' AS phone FROM patients"
+            ),
+            sql_text("SELECT first_name, last_name, NULL AS mrn, NULL AS phone FROM users"),
+        ]
+        
+        added = 0
+        for query in queries:
+            result = await session.stream(query.execution_options(yield_per=batch_size))
+            async for rows in result.partitions(batch_size):
+                terms: List[Tuple[str, PHIType]] = []
+                for row in rows:
+                    terms.extend(_identifier_terms(row.first_name, row.last_name, row.mrn, row.phone))
+                added += phi_gazetteer.add_terms(terms, merge=False)
+        
+        phi_gazetteer.rebuild()
+        return added
     
     def tokenize_phi(
         self, 
         phi_value: str, 
         phi_type: PHIType,
-        patient_id: Optional[str] = None
+        patient_id: Optional[str] = None,
+        deterministic: bool = True
     ) -> str:
         """
         Create a reversible token for PHI
@@ -136,22 +677,55 @@ class DeidentificationService:
             phi_value: Original PHI value
             phi_type: Type of PHI
             patient_id: Optional patient identifier for linking
+            deterministic: Derive the token from a keyed HMAC of the value so
+                the same value always maps to the same token
             
         Returns:
             Token string
         """
-        # Create a unique token
-        token = f"PHI_{phi_type.value.upper()}_{uuid.uuid4().hex[:8]}"
+        token = self._make_token(phi_value, phi_type, deterministic)
         
         # Store the mapping
-        self.token_map[token] = phi_value
-        self.reverse_token_map[phi_value] = token
+        self.token_vault.put(token, phi_type.value, phi_value)
         
         # Log the tokenization
         self._log_tokenization(phi_value, token, phi_type, patient_id)
         
         return token
     
+    def tokenize_many(
+        self,
+        values: List[Tuple[str, PHIType]],
+        patient_id: Optional[str] = None,
+        deterministic: bool = True
+    ) -> List[str]:
+        """
+        Tokenize many PHI values with a single vault write
+        
+        Args:
+            values: (phi_value, phi_type) pairs
+            patient_id: Optional patient identifier for linking
+            deterministic: Derive tokens from a keyed HMAC of each value
+            
+        Returns:
+            Tokens in input order
+        """
+        tokens = [self._make_token(value, phi_type, deterministic) for value, phi_type in values]
+        self.token_vault.put_many(
+            (token, phi_type.value, value)
+            for token, (value, phi_type) in zip(tokens, values)
+        )
+        
+        self._record_audit({
+            "event_type": "phi_batch_tokenization",
+            "timestamp": datetime.now().isoformat(),
+            "patient_id": patient_id,
+            "token_count": len(tokens),
+            "phi_types": list({phi_type.value for _, phi_type in values})
+        })
+        
+        return tokens
+    
     def detokenize_phi(self, token: str) -> Optional[str]:
         """
         Reverse tokenization to get original PHI
@@ -162,7 +736,31 @@ class DeidentificationService:
         Returns:
             Original PHI value or None if not found
         """
-        return self.token_map.get(token)
+        return self.token_vault.get(token)
+    
+    def detokenize_many(self, tokens: List[str]) -> List[Optional[str]]:
+        """
+        Reverse many tokens with a single vault query
+        
+        Args:
+            tokens: Tokens to reverse
+            
+        Returns:
+            Original PHI values in input order, None where not found
+        """
+        return self.token_vault.get_many(tokens)
+    
+    def _make_token(self, phi_value: str, phi_type: PHIType, deterministic: bool) -> str:
+        """Build a token with a 128-bit keyed-HMAC or random suffix"""
+        if deterministic:
+            digest = hmac.new(
+                self.token_key,
+                f"{phi_type.value}\x00{phi_value}".encode(),
+                hashlib.sha256
+            ).hexdigest()[:32]
+        else:
+            digest = uuid.uuid4().hex
+        return f"PHI_{phi_type.value.upper()}_{digest}"
     
     def register_consent(
         self,
@@ -202,6 +800,7 @@ class DeidentificationService:
         }
         
         self.consent_registry[consent_id] = consent_record
+        self._index_consent(consent_record, expires_at)
         
         # Log consent registration
         self._log_consent_registration(consent_record)
@@ -225,43 +824,49 @@ class DeidentificationService:
         Returns:
             Consent check result
         """
-        # Find active consents for this patient
-        active_consents = []
-        
-        for consent_id, consent in self.consent_registry.items():
-            if (consent["patient_id"] == patient_id and 
-                consent["consent_type"] == consent_type and
-                consent["status"] == ConsentStatus.GRANTED):
-                
-                # Check if consent has expired
-                if consent["expires_at"]:
-                    expires_at = datetime.fromisoformat(consent["expires_at"])
-                    if datetime.now() > expires_at:
-                        consent["status"] = ConsentStatus.EXPIRED
-                        continue
-                
-                active_consents.append(consent)
+        self._expire_consents()
+        result = self._evaluate_consent(patient_id, consent_type, data_types, datetime.now().isoformat())
         
-        # Check if all data types are covered
-        covered_types = set()
-        for consent in active_consents:
-            covered_types.update(consent["scope"])
+        # Log consent check
+        self._log_consent_check(patient_id, consent_type, data_types, result)
         
-        missing_types = set(data_types) - covered_types
-        has_consent = len(missing_types) == 0
+        return result
+    
+    def check_consent_many(
+        self,
+        patient_ids: List[str],
+        consent_type: str,
+        data_types: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Check consent for a cohort of patients in one pass
         
-        result = {
-            "has_consent": has_consent,
-            "consent_ids": [c["consent_id"] for c in active_consents],
-            "covered_types": list(covered_types),
-            "missing_types": list(missing_types),
-            "timestamp": datetime.now().isoformat()
+        Args:
+            patient_ids: Patient identifiers
+            consent_type: Type of consent to check
+            data_types: Data types being processed
+            
+        Returns:
+            Consent check result per patient id
+        """
+        self._expire_consents()
+        timestamp = datetime.now().isoformat()
+        required = frozenset(data_types)
+        results = {
+            patient_id: self._evaluate_consent(patient_id, consent_type, required, timestamp)
+            for patient_id in patient_ids
         }
         
-        # Log consent check
-        self._log_consent_check(patient_id, consent_type, data_types, result)
+        self._record_audit({
+            "event_type": "consent_batch_check",
+            "timestamp": timestamp,
+            "consent_type": consent_type,
+            "data_types": data_types,
+            "patient_count": len(results),
+            "consented_count": sum(1 for r in results.values() if r["has_consent"])
+        })
         
-        return result
+        return results
     
     def withdraw_consent(self, consent_id: str) -> bool:
         """
@@ -274,8 +879,10 @@ class DeidentificationService:
             True if consent was withdrawn, False if not found
         """
         if consent_id in self.consent_registry:
-            self.consent_registry[consent_id]["status"] = ConsentStatus.WITHDRAWN
-            self.consent_registry[consent_id]["withdrawn_at"] = datetime.now().isoformat()
+            consent = self.consent_registry[consent_id]
+            consent["status"] = ConsentStatus.WITHDRAWN
+            consent["withdrawn_at"] = datetime.now().isoformat()
+            self._deactivate_consent(consent)
             
             # Log consent withdrawal
             self._log_consent_withdrawal(consent_id)
@@ -284,6 +891,59 @@ class DeidentificationService:
         
         return False
     
+    def _evaluate_consent(
+        self,
+        patient_id: str,
+        consent_type: str,
+        data_types: Iterable[str],
+        timestamp: str
+    ) -> Dict[str, Any]:
+        """Answer a consent check from the index; expiry must already be applied"""
+        consent_ids = list(self._active_consents.get((patient_id, consent_type), ()))
+        
+        # Check if all data types are covered
+        covered_types = frozenset().union(*(self._consent_scopes[c] for c in consent_ids))
+        missing_types = set(data_types) - covered_types
+        
+        return {
+            "has_consent": not missing_types,
+            "consent_ids": consent_ids,
+            "covered_types": list(covered_types),
+            "missing_types": list(missing_types),
+            "timestamp": timestamp
+        }
+    
+    def _index_consent(self, consent: Dict[str, Any], expires_at: Optional[datetime]) -> None:
+        """Add a granted consent to the lookup index and expiry heap"""
+        consent_id = consent["consent_id"]
+        self._consent_scopes[consent_id] = frozenset(consent["scope"])
+        if consent["status"] != ConsentStatus.GRANTED:
+            return
+        key = (consent["patient_id"], consent["consent_type"])
+        self._active_consents.setdefault(key, {})[consent_id] = None
+        if expires_at is not None:
+            heapq.heappush(self._consent_expiry_heap, (expires_at.timestamp(), consent_id))
+    
+    def _deactivate_consent(self, consent: Dict[str, Any]) -> None:
+        """Remove a consent from the lookup index"""
+        key = (consent["patient_id"], consent["consent_type"])
+        bucket = self._active_consents.get(key)
+        if bucket is not None:
+            bucket.pop(consent["consent_id"], None)
+            if not bucket:
+                del self._active_consents[key]
+    
+    def _expire_consents(self) -> None:
+        """Flip consents whose expiry has passed to EXPIRED"""
+        heap = self._consent_expiry_heap
+        now = time.time()
+        while heap and heap[0][0] < now:
+            _, consent_id = heapq.heappop(heap)
+            consent = self.consent_registry.get(consent_id)
+            if consent is not None and consent["status"] == ConsentStatus.GRANTED:
+                consent["status"] = ConsentStatus.EXPIRED
+                self._deactivate_consent(consent)
+    
     def get_audit_log(
         self,
         start_date: Optional[datetime] = None,
@@ -303,33 +963,7 @@ class DeidentificationService:
         Returns:
             List of audit log entries
         """
-        filtered_log = self.audit_log
-        
-        if start_date:
-            filtered_log = [
-                entry for entry in filtered_log
-                if datetime.fromisoformat(entry["timestamp"]) >= start_date
-            ]
-        
-        if end_date:
-            filtered_log = [
-                entry for entry in filtered_log
-                if datetime.fromisoformat(entry["timestamp"]) <= end_date
-            ]
-        
-        if event_type:
-            filtered_log = [
-                entry for entry in filtered_log
-                if entry["event_type"] == event_type
-            ]
-        
-        if patient_id:
-            filtered_log = [
-                entry for entry in filtered_log
-                if entry.get("patient_id") == patient_id
-            ]
-        
-        return filtered_log
+        return self.audit_log.query(start_date, end_date, event_type, patient_id)
     
     def export_audit_bundle(
         self,
@@ -343,46 +977,171 @@ class DeidentificationService:
         Args:
             start_date: Start date for export
             end_date: End date for export
-            format: Export format ("json" or "csv")
+            format: Export format ("json", "ndjson" or "csv")
             
         Returns:
             Exported audit data
         """
-        audit_entries = self.get_audit_log(start_date, end_date)
-        
-        bundle = {
-            "export_info": {
-                "exported_at": datetime.now().isoformat(),
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat(),
-                "format": format,
-                "entry_count": len(audit_entries)
-            },
-            "audit_entries": audit_entries
-        }
-        
         if format.lower() == "json":
+            audit_entries = self.get_audit_log(start_date, end_date)
+            bundle = {
+                "export_info": {
+                    "exported_at": datetime.now().isoformat(),
+                    "start_date": start_date.isoformat(),
+                    "end_date": end_date.isoformat(),
+                    "format": format,
+                    "entry_count": len(audit_entries)
+                },
+                "audit_entries": audit_entries
+            }
             return json.dumps(bundle, indent=2)
-        elif format.lower() == "csv":
-            # TODO: Implement CSV export
-            return json.dumps(bundle, indent=2)  # Fallback to JSON
+        elif format.lower() in ("csv", "ndjson"):
+            return b"".join(self.iter_audit_bundle(start_date, end_date, format)).decode()
         else:
             raise ValueError(f"Unsupported format: {format}")
     
+    def iter_audit_bundle(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        format: str = "ndjson",
+        compress: bool = False,
+        chunk_size: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        """
+        Stream an audit compliance bundle in constant memory
+        
+        The first record describes the export and the last record is a
+        trailer with the entry count and a SHA-256 over the entry records, so
+        nothing has to be counted up front.
+        
+        Args:
+            start_date: Start date for export
+            end_date: End date for export
+            format: Export format ("ndjson" or "csv")
+            compress: Gzip the stream on the fly
+            chunk_size: Approximate size of yielded chunks before compression
+            
+        Yields:
+            Encoded bundle chunks
+        """
+        format = format.lower()
+        if format not in ("ndjson", "csv"):
+            raise ValueError(f"Unsupported format: {format}")
+        
+        export_info = {
+            "exported_at": datetime.now().isoformat(),
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "format": format
+        }
+        checksum = hashlib.sha256()
+        entry_count = 0
+        
+        if format == "ndjson":
+            def encode(record: Dict[str, Any]) -> bytes:
+                return (json.dumps(record, default=str) + "\n").encode()
+            header = encode({"export_info": export_info})
+            trailer = lambda: encode({"export_trailer": {"entry_count": entry_count, "sha256": checksum.hexdigest()}})
+        else:
+            columns = ["timestamp", "event_type", "patient_id", "details"]
+            row_buffer = io.StringIO()
+            row_writer = csv.writer(row_buffer)
+            
+            def encode_row(row: List[Any]) -> bytes:
+                row_writer.writerow(row)
+                line = row_buffer.getvalue()
+                row_buffer.seek(0)
+                row_buffer.truncate()
+                return line.encode()
+            
+            def encode(entry: Dict[str, Any]) -> bytes:
+                details = {k: v for k, v in entry.items() if k not in ("timestamp", "event_type", "patient_id")}
+                return encode_row([
+                    entry.get("timestamp", ""),
+                    entry.get("event_type", ""),
+                    entry.get("patient_id") or "",
+                    json.dumps(details, default=str)
+                ])
+            header = encode_row(columns) + encode_row(["", "export_info", "", json.dumps(export_info)])
+            trailer = lambda: encode_row([
+                "", "export_trailer", "",
+                json.dumps({"entry_count": entry_count, "sha256": checksum.hexdigest()})
+            ])
+        
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        
+        def emit(data: bytes) -> bytes:
+            return compressor.compress(data) if compressor else data
+        
+        pending = [header]
+        pending_size = len(header)
+        for entry in self.audit_log.iter_query(start_date, end_date):
+            record = encode(entry)
+            checksum.update(record)
+            entry_count += 1
+            pending.append(record)
+            pending_size += len(record)
+            if pending_size >= chunk_size:
+                out = emit(b"".join(pending))
+                if out:
+                    yield out
+                pending = []
+                pending_size = 0
+        
+        pending.append(trailer())
+        out = emit(b"".join(pending))
+        if compressor:
+            out += compressor.flush()
+        if out:
+            yield out
+    
+    def _record_audit(self, entry: Dict[str, Any]) -> None:
+        """Hand an audit entry to the background sink, or store it directly"""
+        if not audit_sink.enqueue(entry):
+            self.audit_log.append(entry)
+    
     def _log_redaction(
         self,
-        original_text: str,
-        redacted_text: str,
-        redactions: List[Dict[str, Any]]
+        original_length: int,
+        redacted_length: int,
+        redaction_count: int,
+        redaction_types: Iterable[str]
     ) -> None:
         """Log redaction activity"""
-        self.audit_log.append({
+        self._record_audit({
             "event_type": "phi_redaction",
             "timestamp": datetime.now().isoformat(),
-            "original_length": len(original_text),
-            "redacted_length": len(redacted_text),
-            "redaction_count": len(redactions),
-            "redaction_types": list(set(r["type"] for r in redactions))
+            "original_length": original_length,
+            "redacted_length": redacted_length,
+            "redaction_count": redaction_count,
+            "redaction_types": list(set(redaction_types))
+        })
+    
+    def _log_batch_redaction(
+        self,
+        document_count: int,
+        original_length: int,
+        results: List[Dict[str, Any]]
+    ) -> None:
+        """Log one aggregated entry for a batch redaction"""
+        redaction_types = set()
+        redaction_count = 0
+        redacted_length = 0
+        for result in results:
+            count, types = _redaction_summary(result)
+            redacted_length += len(result["redacted_text"])
+            redaction_count += count
+            redaction_types.update(types)
+        
+        self._record_audit({
+            "event_type": "phi_batch_redaction",
+            "timestamp": datetime.now().isoformat(),
+            "document_count": document_count,
+            "original_length": original_length,
+            "redacted_length": redacted_length,
+            "redaction_count": redaction_count,
+            "redaction_types": list(redaction_types)
         })
     
     def _log_tokenization(
@@ -393,7 +1152,7 @@ class DeidentificationService:
         patient_id: Optional[str]
     ) -> None:
         """Log tokenization activity"""
-        self.audit_log.append({
+        self._record_audit({
             "event_type": "phi_tokenization",
             "timestamp": datetime.now().isoformat(),
             "phi_type": phi_type.value,
@@ -404,7 +1163,7 @@ class DeidentificationService:
     
     def _log_consent_registration(self, consent_record: Dict[str, Any]) -> None:
         """Log consent registration"""
-        self.audit_log.append({
+        self._record_audit({
             "event_type": "consent_registration",
             "timestamp": datetime.now().isoformat(),
             "consent_id": consent_record["consent_id"],
@@ -421,7 +1180,7 @@ class DeidentificationService:
         result: Dict[str, Any]
     ) -> None:
         """Log consent check"""
-        self.audit_log.append({
+        self._record_audit({
             "event_type": "consent_check",
             "timestamp": datetime.now().isoformat(),
             "patient_id": patient_id,
@@ -433,11 +1192,19 @@ class DeidentificationService:
     
     def _log_consent_withdrawal(self, consent_id: str) -> None:
         """Log consent withdrawal"""
-        self.audit_log.append({
+        self._record_audit({
             "event_type": "consent_withdrawal",
             "timestamp": datetime.now().isoformat(),
             "consent_id": consent_id
         })
 
 # Global instance
-deidentification_service = DeidentificationService()
+deidentification_service = DeidentificationService(
+    token_vault=TokenVault(
+        settings.PHI_TOKEN_VAULT_PATH,
+        settings.PHI_TOKEN_CACHE_SIZE,
+        key=settings.PHI_TOKEN_KEY or settings.SECRET_KEY
+    ),
+    token_key=settings.PHI_TOKEN_KEY or settings.SECRET_KEY,
+    audit_store=AuditLogStore(settings.AUDIT_LOG_DIR)
+)
@@ -0,0 +1,241 @@
+"""
+Drug Interaction Index
+Sparse ingredient-level interaction graph for whole medication list screening
+"""
+
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+import argparse
+import csv
+import os
+
+import numpy as np
+
+# Ordered from least to most severe
+SEVERITY_RANK = {"minor": 1, "moderate": 2, "major": 3, "contraindicated": 4}
+
+INTERACTIONS_FILE = "drug_interactions.csv"
+INGREDIENTS_FILE = "rxnorm_ingredients.tsv"
+
+# RXNREL relations followed from a product towards its ingredients
+_INGREDIENT_RELATIONS = {"has_ingredient", "has_ingredients", "has_precise_ingredient", "consists_of", "tradename_of"}
+
+InteractionRecord = Tuple[str, str, Dict[str, Any]]
+
+def map_products(
+    product_ingredients: Iterable[Tuple[str, str]],
+    ingredient_ids: Dict[str, int]
+) -> Dict[str, Tuple[int, ...]]:
+    """Map product codes to the ids of their ingredients that appear in ingredient_ids"""
+    products: Dict[str, List[int]] = {}
+    for product, ingredient in product_ingredients:
+        ingredient_id = ingredient_ids.get(ingredient)
+        if ingredient_id is not None:
+            products.setdefault(product, []).append(ingredient_id)
+    return {product: tuple(sorted(set(ids))) for product, ids in products.items()}
+
+class DrugInteractionIndex:
+    """
+    Interaction pairs between RxNorm ingredients in CSR adjacency form
+
+    Product codes (clinical and branded drugs) are normalised to ingredient
+    ids first, so the table only holds ingredient pairs. Screening a
+    medication list expands each ingredient's neighbour row once and keeps
+    neighbours that are also on the list, rather than testing every pair.
+    """
+
+    def __init__(
+        self,
+        interactions: Iterable[InteractionRecord],
+        product_ingredients: Iterable[Tuple[str, str]] = ()
+    ):
+        self.ingredient_ids: Dict[str, int] = {}
+        self.records: List[Dict[str, Any]] = []
+        sources: List[int] = []
+        targets: List[int] = []
+        edge_records: List[int] = []
+        for first, second, record in interactions:
+            if first == second:
+                continue
+            a = self.ingredient_ids.setdefault(first, len(self.ingredient_ids))
+            b = self.ingredient_ids.setdefault(second, len(self.ingredient_ids))
+            record_id = len(self.records)
+            self.records.append(record)
+            sources.extend((a, b))
+            targets.extend((b, a))
+            edge_records.extend((record_id, record_id))
+        self.ingredient_codes = list(self.ingredient_ids)
+
+        size = len(self.ingredient_ids)
+        sources_array = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources_array, kind="stable")
+        self.offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources_array, minlength=size), out=self.offsets[1:])
+        self.neighbors = np.asarray(targets, dtype=np.int32)[order]
+        self.edge_records = np.asarray(edge_records, dtype=np.int32)[order]
+
+        # Only ingredients that take part in an interaction are kept
+        self.products = map_products(product_ingredients, self.ingredient_ids)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def ingredients_of(self, drug_code: str) -> Tuple[int, ...]:
+        """Ingredient ids for a product or ingredient code"""
+        ingredient_id = self.ingredient_ids.get(drug_code)
+        if ingredient_id is not None:
+            return (ingredient_id,)
+        return self.products.get(drug_code, ())
+
+    def check(self, drug_codes: List[str]) -> List[Dict[str, Any]]:
+        """
+        Screen one medication list
+
+        Args:
+            drug_codes: RxNorm product or ingredient codes
+
+        Returns:
+            Interactions between drugs on the list, most severe first
+        """
+        return self.check_many([drug_codes])[0]
+
+    def check_many(self, medication_lists: List[List[str]]) -> List[List[Dict[str, Any]]]:
+        """
+        Screen many medication lists in one vectorised pass
+
+        Args:
+            medication_lists: One list of RxNorm codes per patient
+
+        Returns:
+            Interactions per list, in input order
+        """
+        members: List[Dict[int, List[str]]] = []
+        patients: List[int] = []
+        ingredients: List[int] = []
+        for patient, drug_codes in enumerate(medication_lists):
+            drugs_by_ingredient: Dict[int, List[str]] = {}
+            for code in dict.fromkeys(drug_codes):
+                for ingredient in self.ingredients_of(code):
+                    drugs_by_ingredient.setdefault(ingredient, []).append(code)
+            members.append(drugs_by_ingredient)
+            patients.extend([patient] * len(drugs_by_ingredient))
+            ingredients.extend(drugs_by_ingredient)
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in medication_lists]
+        if not ingredients:
+            return results
+
+        size = len(self.ingredient_ids)
+        patient_array = np.asarray(patients, dtype=np.int64)
+        ingredient_array = np.asarray(ingredients, dtype=np.int64)
+        present = np.sort(patient_array * size + ingredient_array)
+
+        # Expand every (patient, ingredient) into its neighbour row
+        degrees = self.offsets[ingredient_array + 1] - self.offsets[ingredient_array]
+        total = int(degrees.sum())
+        if not total:
+            return results
+        source = np.repeat(np.arange(len(ingredient_array)), degrees)
+        row_starts = np.cumsum(degrees) - degrees
+        edges = np.repeat(self.offsets[ingredient_array], degrees) + (np.arange(total) - np.repeat(row_starts, degrees))
+        neighbors = self.neighbors[edges].astype(np.int64)
+
+        # Keep each unordered pair once, and only if the neighbour is on the same list
+        keys = patient_array[source] * size + neighbors
+        slots = np.minimum(np.searchsorted(present, keys), len(present) - 1)
+        hits = np.flatnonzero((ingredient_array[source] < neighbors) & (present[slots] == keys))
+
+        for hit in hits.tolist():
+            patient = int(patient_array[source[hit]])
+            first = int(ingredient_array[source[hit]])
+            second = int(neighbors[hit])
+            record = self.records[self.edge_records[edges[hit]]]
+            drugs = members[patient]
+            for drug1 in drugs[first]:
+                for drug2 in drugs[second]:
+                    if drug1 == drug2:
+                        continue
+                    results[patient].append({
+                        "drug1": drug1,
+                        "drug2": drug2,
+                        "ingredients": [self.ingredient_codes[first], self.ingredient_codes[second]],
+                        **record
+                    })
+
+        for interactions in results:
+            interactions.sort(key=lambda item: -SEVERITY_RANK.get(item.get("severity"), 0))
+        return results
+
+    @classmethod
+    def from_directory(cls, directory: Optional[str]) -> Optional["DrugInteractionIndex"]:
+        """Load `drug_interactions.csv` and `rxnorm_ingredients.tsv` if present"""
+        if not directory:
+            return None
+        interactions_path = os.path.join(directory, INTERACTIONS_FILE)
+        if not os.path.exists(interactions_path):
+            return None
+        ingredients_path = os.path.join(directory, INGREDIENTS_FILE)
+        product_ingredients = iter_product_ingredients(ingredients_path) if os.path.exists(ingredients_path) else ()
+        return cls(iter_interactions_csv(interactions_path), product_ingredients)
+
+def iter_interactions_csv(path: str) -> Iterator[InteractionRecord]:
+    """
+    Read ingredient interaction pairs
+
+    Columns: ingredient_1, ingredient_2, severity, description, evidence and
+    references (semicolon separated).
+    """
+    with open(path, encoding="utf-8", newline="") as handle:
+        for row in csv.DictReader(handle):
+            yield row["ingredient_1"], row["ingredient_2"], {
+                "severity": row.get("severity") or "unknown",
+                "description": row.get("description", ""),
+                "evidence": row.get("evidence", ""),
+                "references": [ref.strip() for ref in (row.get("references") or "").split(";") if ref.strip()],
+            }
+
+def iter_product_ingredients(path: str) -> Iterator[Tuple[str, str]]:
+    """Read (product, ingredient) pairs from a two-column TSV"""
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            product, _, ingredient = line.rstrip("\n").partition("\t")
+            if ingredient:
+                yield product, ingredient
+
+def iter_rxnorm_ingredients(rxnrel_file: str, max_depth: int = 3) -> Iterator[Tuple[str, str]]:
+    """
+    Derive (product, reachable concept) pairs from RXNREL.RRF
+
+    A row reads as RXCUI2 <RELA> RXCUI1. Starting from every product, the
+    ingredient, component and tradename relations are followed up to
+    `max_depth` hops; concepts that are not ingredients in the interaction
+    table are dropped when the index is built.
+    """
+    edges: Dict[str, List[str]] = {}
+    with open(rxnrel_file, encoding="utf-8") as handle:
+        for line in handle:
+            fields = line.split("|")
+            if fields[10] == "RXNORM" and fields[7] in _INGREDIENT_RELATIONS:
+                edges.setdefault(fields[4], []).append(fields[0])
+
+    for product in edges:
+        seen = {product}
+        frontier = [product]
+        for _ in range(max_depth):
+            frontier = [target for source in frontier for target in edges.get(source, ()) if target not in seen]
+            seen.update(frontier)
+            if not frontier:
+                break
+        for concept in seen - {product}:
+            yield product, concept
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the RxNorm product to ingredient map")
+    parser.add_argument("rxnrel_file")
+    parser.add_argument("--output-dir", default="data/terminology")
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, INGREDIENTS_FILE)
+    with open(path, "w", encoding="utf-8") as handle:
+        for product, ingredient in iter_rxnorm_ingredients(args.rxnrel_file):
+            handle.write(f"{product}\t{ingredient}\n")
+    print(path)
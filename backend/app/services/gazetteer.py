@@ -0,0 +1,271 @@
+"""
+Gazetteer Matching
+Aho-Corasick dictionary matching for known identifiers in free text
+"""
+
+from typing import Dict, List, Optional, Any, Tuple, Iterable, Iterator, Collection
+from array import array
+from bisect import bisect_left
+from collections import deque
+from itertools import chain
+import logging
+
+logger = logging.getLogger(__name__)
+
+Span = Tuple[int, int, Any]
+
+def _fold(text: str) -> str:
+    """Lowercase text without changing its length so offsets stay valid"""
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return ''.join(ch if len(low) != 1 else low for ch, low in ((ch, ch.lower()) for ch in text))
+
+class AhoCorasickAutomaton:
+    """
+    Case-insensitive multi-pattern matcher that runs in time linear in the text
+
+    The trie is stored in flat arrays rather than one dict per node. Nodes
+    are numbered breadth-first and the children of a node are consecutive,
+    so edge `e` always leads to node `e + 1` and a node's edges are the
+    sorted slice `chars[first[n]:first[n + 1]]`, searched by bisection. A
+    node then costs about 19 bytes instead of a few hundred, and forked
+    workers share the arrays without touching them.
+    """
+
+    def __init__(self, terms: Iterable[Tuple[str, Any]] = ()):
+        """
+        Build the automaton
+
+        Args:
+            terms: (term, label) pairs; duplicates keep the first label
+        """
+        self.first = array('I', [0, 0])
+        self.chars = array('I')
+        self.fail = array('I', [0])
+        self.dict_link = array('I', [0])
+        self.depth = array('H', [0])
+        self.label_codes = array('B', [0])
+        self.labels: List[Any] = [None]
+        self.size = 0
+
+        unique: Dict[str, Any] = {}
+        for term, label in terms:
+            unique.setdefault(_fold(term), label)
+        if unique:
+            self._build_trie(sorted(unique.items()))
+            self._build_links()
+
+    def _label_code(self, label: Any) -> int:
+        try:
+            return self.labels.index(label)
+        except ValueError:
+            self.labels.append(label)
+            return len(self.labels) - 1
+
+    def _build_trie(self, items: List[Tuple[str, Any]]) -> None:
+        """Lay out the trie of sorted (key, label) pairs breadth-first"""
+        keys = [key for key, _ in items]
+        first, chars, depths, codes = self.first, self.chars, self.depth, self.label_codes
+        del first[:]
+        # One entry per unprocessed node: the range of keys sharing its prefix
+        frontier = deque([(0, len(keys), 0)])
+        while frontier:
+            low, high, depth = frontier.popleft()
+            first.append(len(chars))
+            if low < high and len(keys[low]) == depth:
+                # Sorted keys put the one ending here first in its range
+                codes[len(first) - 1] = self._label_code(items[low][1])
+                self.size += 1
+                low += 1
+            while low < high:
+                ch = keys[low][depth]
+                if keys[high - 1][depth] == ch:
+                    # One child only, as along every unshared term tail
+                    group_end = high
+                else:
+                    group_end = bisect_left(keys, keys[low][:depth] + chr(ord(ch) + 1), low, high)
+                chars.append(ord(ch))
+                depths.append(depth + 1)
+                codes.append(0)
+                frontier.append((low, group_end, depth + 1))
+                low = group_end
+        first.append(len(chars))
+
+    def _goto(self, state: int, code: int) -> int:
+        low, high = self.first[state], self.first[state + 1]
+        edge = bisect_left(self.chars, code, low, high)
+        return edge + 1 if edge < high and self.chars[edge] == code else 0
+
+    def _build_links(self) -> None:
+        """Compute failure and dictionary-suffix links in breadth-first order"""
+        nodes = len(self.chars) + 1
+        fail = self.fail = array('I', bytes(4 * nodes))
+        dict_link = self.dict_link = array('I', bytes(4 * nodes))
+        codes, chars, goto = self.label_codes, self.chars, self._goto
+        for parent in range(nodes):
+            for edge in range(self.first[parent], self.first[parent + 1]):
+                child = edge + 1
+                if parent:
+                    code = chars[edge]
+                    state = fail[parent]
+                    while state and not goto(state, code):
+                        state = fail[state]
+                    target = goto(state, code)
+                    fail[child] = target if target != child else 0
+                suffix = fail[child]
+                dict_link[child] = suffix if codes[suffix] else dict_link[suffix]
+
+    def __contains__(self, term: str) -> bool:
+        state = 0
+        for ch in _fold(term):
+            state = self._goto(state, ord(ch))
+            if not state:
+                return False
+        return bool(self.label_codes[state])
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Yield (folded term, label) pairs in sorted order"""
+        stack: List[Tuple[int, str]] = [(0, "")]
+        while stack:
+            node, prefix = stack.pop()
+            if self.label_codes[node]:
+                yield prefix, self.labels[self.label_codes[node]]
+            # Push children in reverse so the smallest is visited first
+            for edge in range(self.first[node + 1] - 1, self.first[node] - 1, -1):
+                stack.append((edge + 1, prefix + chr(self.chars[edge])))
+
+    def scan(self, text: str, pos: int = 0) -> List[Span]:
+        """
+        Find every term occurrence that sits on word boundaries
+
+        Args:
+            text: Text to scan
+            pos: Offset to start scanning from
+
+        Returns:
+            Possibly overlapping (start, end, label) spans
+        """
+        if not self.size:
+            return []
+        fail, dict_link, codes, depths, labels = self.fail, self.dict_link, self.label_codes, self.depth, self.labels
+        goto = self._goto
+        folded = _fold(text)
+        text_length = len(text)
+        spans: List[Span] = []
+        state = 0
+
+        for index in range(pos, text_length):
+            code = ord(folded[index])
+            target = goto(state, code)
+            while state and not target:
+                state = fail[state]
+                target = goto(state, code)
+            state = target
+
+            end = index + 1
+            if end < text_length and text[end].isalnum():
+                continue
+
+            match = state if codes[state] else dict_link[state]
+            while match:
+                start = end - depths[match]
+                if start == 0 or not text[start - 1].isalnum():
+                    spans.append((start, end, labels[codes[match]]))
+                match = dict_link[match]
+
+        return spans
+
+class Gazetteer:
+    """
+    Incrementally updatable dictionary matcher
+
+    Terms live in a large main automaton plus a small delta automaton over
+    the terms added since the last merge. The delta is rebuilt on the next
+    scan after an addition and merged into the main automaton once it grows
+    past `merge_ratio` of the main size, so adding a few terms only rebuilds
+    the delta. Only the delta keeps its terms as Python strings.
+    """
+
+    def __init__(self, min_term_length: int = 3, merge_ratio: float = 0.1, min_merge_size: int = 1000):
+        self.min_term_length = min_term_length
+        self.merge_ratio = merge_ratio
+        self.min_merge_size = min_merge_size
+        self.pending: Dict[str, Any] = {}
+        self.main = AhoCorasickAutomaton()
+        self.delta = AhoCorasickAutomaton()
+        self._delta_stale = False
+        # Bumped whenever terms are added, so copies held elsewhere can tell they are stale
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self.main.size + len(self.pending)
+
+    def add_terms(self, terms: Iterable[Tuple[str, Any]], merge: bool = True) -> int:
+        """
+        Add terms to the gazetteer
+
+        Args:
+            terms: (term, label) pairs
+            merge: Merge the delta into the main automaton once it is large;
+                bulk loads pass False and call rebuild() at the end
+
+        Returns:
+            Number of new terms added
+        """
+        added = 0
+        for term, label in terms:
+            term = term.strip() if term else ""
+            if len(term) < self.min_term_length:
+                continue
+            key = _fold(term)
+            if key in self.pending or key in self.main:
+                continue
+            self.pending[key] = label
+            added += 1
+
+        if added:
+            self._delta_stale = True
+            self.version += 1
+        if merge and len(self.pending) >= max(self.min_merge_size, self.merge_ratio * self.main.size):
+            self.rebuild()
+
+        return added
+
+    def rebuild(self) -> None:
+        """Merge the delta into a freshly built main automaton"""
+        main = AhoCorasickAutomaton(chain(self.main.items(), self.pending.items()))
+        self.main = main
+        self.pending = {}
+        self.delta = AhoCorasickAutomaton()
+        self._delta_stale = False
+        logger.info(f"Gazetteer rebuilt with {main.size} terms")
+
+    def scan(
+        self,
+        text: str,
+        pos: int = 0,
+        labels: Optional[Collection[Any]] = None
+    ) -> List[Span]:
+        """
+        Find known terms in text
+
+        Args:
+            text: Text to scan
+            pos: Offset to start scanning from
+            labels: Restrict results to these labels (all if None)
+
+        Returns:
+            Possibly overlapping (start, end, label) spans
+        """
+        if self._delta_stale:
+            self._delta_stale = False
+            self.delta = AhoCorasickAutomaton(list(self.pending.items()))
+        spans: List[Span] = []
+        if self.main.size:
+            spans.extend(self.main.scan(text, pos))
+        if self.delta.size:
+            spans.extend(self.delta.scan(text, pos))
+        if labels is not None:
+            spans = [span for span in spans if span[2] in labels]
+        return spans
@@ -0,0 +1,201 @@
+"""
+Pediatric Dosing Engine
+Weight-based dose calculation for many patients and drugs at once
+"""
+
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+import csv
+import os
+
+import numpy as np
+
+from app.services.drug_interactions import INGREDIENTS_FILE, iter_product_ingredients, map_products
+
+DOSING_FILE = "pediatric_dosing.csv"
+
+class PediatricDosingEngine:
+    """
+    Dosing rules held as NumPy arrays, one row per (drug, age band)
+
+    Bands for a drug are padded into a (drugs x bands) grid so that the
+    matching band for every (patient, drug) pair is found with one
+    broadcast comparison. Doses are weight x mg/kg, scaled by the renal
+    factor when the patient's eGFR is under the rule's threshold, then
+    capped at the maximum dose.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[Dict[str, Any]],
+        product_ingredients: Iterable[Tuple[str, str]] = ()
+    ):
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for rule in rules:
+            grouped.setdefault(rule["drug"], []).append(rule)
+
+        self.drug_ids: Dict[str, int] = {}
+        self.rules: List[Dict[str, Any]] = []
+        for drug, drug_rules in grouped.items():
+            self.drug_ids[drug] = len(self.drug_ids)
+            self.rules.extend(sorted(drug_rules, key=lambda rule: rule["min_age_years"]))
+        self.products = map_products(product_ingredients, self.drug_ids)
+
+        def column(name: str) -> np.ndarray:
+            # Trailing NaN keeps lookups valid when there are no rules
+            return np.asarray([rule[name] for rule in self.rules] + [np.nan], dtype=np.float64)
+
+        self.min_age = column("min_age_years")
+        self.max_age = column("max_age_years")
+        self.dose_per_kg = column("dose_per_kg")
+        self.max_dose = column("max_dose")
+        self.renal_threshold = column("renal_threshold")
+        self.renal_factor = column("renal_factor")
+
+        # Rule ids per drug, padded with -1 to the widest band count; the
+        # extra last row stands for drugs without rules
+        bands = max((len(drug_rules) for drug_rules in grouped.values()), default=1)
+        self.band_rules = np.full((len(self.drug_ids) + 1, bands), -1, dtype=np.int64)
+        offset = 0
+        for drug, drug_rules in grouped.items():
+            self.band_rules[self.drug_ids[drug], :len(drug_rules)] = np.arange(offset, offset + len(drug_rules))
+            offset += len(drug_rules)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def drug_id(self, drug_code: str) -> int:
+        """Rule set for a drug or, failing that, for its first ingredient with rules"""
+        drug_id = self.drug_ids.get(drug_code)
+        if drug_id is not None:
+            return drug_id
+        ingredients = self.products.get(drug_code)
+        return ingredients[0] if ingredients else -1
+
+    def calculate(
+        self,
+        drug_codes: List[str],
+        ages: np.ndarray,
+        weights: np.ndarray,
+        egfr: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Compute doses for every patient and drug
+
+        Args:
+            drug_codes: M RxNorm drug codes
+            ages: N ages in years
+            weights: N weights in kg
+            egfr: N eGFR values in mL/min/1.73m2 (NaN when unknown)
+
+        Returns:
+            (N, M) arrays: `rule` (-1 where no band applies), `dose`,
+            `renal_adjusted` and `capped`
+        """
+        ages = np.asarray(ages, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        egfr = np.full(len(ages), np.nan) if egfr is None else np.asarray(egfr, dtype=np.float64)
+
+        drug_ids = np.fromiter((self.drug_id(code) for code in drug_codes), dtype=np.int64, count=len(drug_codes))
+        rule_ids = self.band_rules[np.where(drug_ids >= 0, drug_ids, len(self.drug_ids))]
+        valid = rule_ids >= 0
+        safe = np.where(valid, rule_ids, 0)
+
+        # (M, bands, N): does each band of each drug cover each patient's age?
+        ages_grid = ages[None, None, :]
+        in_band = valid[:, :, None] & (self.min_age[safe][:, :, None] <= ages_grid) & (ages_grid < self.max_age[safe][:, :, None])
+        matched = in_band.any(axis=1)
+        first = in_band.argmax(axis=1)
+        rule = np.where(matched, np.take_along_axis(safe, first, axis=1), -1).T
+
+        lookup = np.maximum(rule, 0)
+        dose = weights[:, None] * self.dose_per_kg[lookup]
+        renal_adjusted = (rule >= 0) & (egfr[:, None] < self.renal_threshold[lookup])
+        dose = np.where(renal_adjusted, dose * self.renal_factor[lookup], dose)
+        capped = (rule >= 0) & (dose > self.max_dose[lookup])
+        dose = np.where(capped, self.max_dose[lookup], dose)
+        dose = np.where(rule >= 0, dose, np.nan)
+
+        return {"rule": rule, "dose": dose, "renal_adjusted": renal_adjusted, "capped": capped}
+
+    def recommendations(
+        self,
+        drug_codes: List[str],
+        ages: np.ndarray,
+        weights: np.ndarray,
+        egfr: Optional[np.ndarray] = None
+    ) -> List[List[Optional[Dict[str, Any]]]]:
+        """calculate() results as dosing recommendation dicts, None where no band applies"""
+        result = self.calculate(drug_codes, ages, weights, egfr)
+        rows: List[List[Optional[Dict[str, Any]]]] = []
+        for rules, doses, adjusted, capped in zip(
+            result["rule"].tolist(), result["dose"].tolist(),
+            result["renal_adjusted"].tolist(), result["capped"].tolist()
+        ):
+            rows.append([
+                self._recommendation(drug_code, rule, dose, renal, cap) if rule >= 0 else None
+                for drug_code, rule, dose, renal, cap in zip(drug_codes, rules, doses, adjusted, capped)
+            ])
+        return rows
+
+    def _recommendation(self, drug_code: str, rule_id: int, dose: float, renal_adjusted: bool, capped: bool) -> Dict[str, Any]:
+        rule = self.rules[rule_id]
+        return {
+            "drug": drug_code,
+            "age_range": _age_range(rule["min_age_years"], rule["max_age_years"]),
+            "weight_based": True,
+            "dose_per_kg": rule["dose_per_kg"],
+            "unit": rule["unit"],
+            "frequency": rule["frequency"],
+            "max_dose": None if np.isnan(rule["max_dose"]) else rule["max_dose"],
+            "max_unit": rule["max_unit"],
+            "notes": rule["notes"],
+            "calculated_dose": round(dose, 3),
+            "calculated_unit": rule["max_unit"] or rule["unit"].split("/")[0],
+            "renal_adjusted": renal_adjusted,
+            "dose_capped": capped
+        }
+
+    @classmethod
+    def from_directory(cls, directory: Optional[str]) -> Optional["PediatricDosingEngine"]:
+        """Load `pediatric_dosing.csv` and `rxnorm_ingredients.tsv` if present"""
+        if not directory:
+            return None
+        rules_path = os.path.join(directory, DOSING_FILE)
+        if not os.path.exists(rules_path):
+            return None
+        ingredients_path = os.path.join(directory, INGREDIENTS_FILE)
+        product_ingredients = iter_product_ingredients(ingredients_path) if os.path.exists(ingredients_path) else ()
+        return cls(iter_dosing_csv(rules_path), product_ingredients)
+
+def _age_range(min_age: float, max_age: float) -> str:
+    if np.isinf(max_age):
+        return f"{min_age:g}+ years"
+    return f"{min_age:g}-{max_age:g} years"
+
+def _number(value: Optional[str], default: float = np.nan) -> float:
+    return float(value) if value not in (None, "") else default
+
+def iter_dosing_csv(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read dosing rules
+
+    Columns: drug, min_age_years, max_age_years (exclusive; blank for no
+    upper bound), dose_per_kg, unit, frequency, max_dose, max_unit,
+    renal_threshold (eGFR below which the renal factor applies),
+    renal_factor and notes.
+    """
+    with open(path, encoding="utf-8", newline="") as handle:
+        for row in csv.DictReader(handle):
+            yield {
+                "drug": row["drug"],
+                "min_age_years": _number(row.get("min_age_years"), 0.0),
+                "max_age_years": _number(row.get("max_age_years"), np.inf),
+                "dose_per_kg": float(row["dose_per_kg"]),
+                "unit": row.get("unit") or "mg/kg",
+                "frequency": row.get("frequency", ""),
+                "max_dose": _number(row.get("max_dose")),
+                "max_unit": row.get("max_unit", ""),
+                "renal_threshold": _number(row.get("renal_threshold")),
+                "renal_factor": _number(row.get("renal_factor"), 1.0),
+                "notes": row.get("notes", ""),
+            }
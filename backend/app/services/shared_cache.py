@@ -0,0 +1,380 @@
+"""
+Shared Cache Tier
+Two-tier cache: in-process LRU in front of a store shared by every worker
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+import msgpack
+
+from app.services.cache import MISSING, NamespacedCache
+
+logger = logging.getLogger(__name__)
+
+# Keys per MGET/UNLINK command; larger batches are pipelined in chunks
+_BATCH_SIZE = 1000
+
+class CacheBackendError(Exception):
+    """The shared store could not be reached or rejected a command"""
+
+class MemoryCacheBackend:
+    """
+    In-process stand-in for the shared store
+
+    Caches sharing one instance behave like workers sharing one Redis
+    server, including expiry and pub/sub delivery, which is what tests and
+    single-process development need.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[float, bytes]] = {}
+        self._subscribers: Dict[str, List[Callable[[bytes], None]]] = {}
+        self.commands = 0
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        self.commands += 1
+        now = time.monotonic()
+        values: List[Optional[bytes]] = []
+        for key in keys:
+            item = self._data.get(key)
+            if item is not None and item[0] <= now:
+                del self._data[key]
+                item = None
+            values.append(None if item is None else item[1])
+        return values
+
+    async def set_many(self, items: List[Tuple[str, bytes]], ttl: float) -> None:
+        self.commands += 1
+        expires_at = time.monotonic() + ttl
+        for key, value in items:
+            self._data[key] = (expires_at, value)
+
+    async def delete(self, keys: List[str]) -> int:
+        self.commands += 1
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def delete_prefix(self, prefix: str) -> int:
+        self.commands += 1
+        return await self.delete([key for key in self._data if key.startswith(prefix)])
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        for callback in list(self._subscribers.get(channel, ())):
+            callback(message)
+
+    async def subscribe(self, channel: str, callback: Callable[[bytes], None]) -> None:
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    async def close(self) -> None:
+        self._subscribers.clear()
+
+class RedisCacheBackend:
+    """
+    Shared store on a Redis-protocol server (Redis, Valkey, KeyDB)
+
+    Multi-gets are MGET commands, chunked and sent in one pipeline; writes
+    are SET EX commands pipelined without a transaction. Invalidations are
+    listened for on a pub/sub connection that reconnects after failures.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._errors = (redis.RedisError, OSError)
+        self.client = redis.Redis.from_url(url)
+        self._listeners: List[asyncio.Task] = []
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for low in range(0, len(keys), _BATCH_SIZE):
+                    pipe.mget(keys[low:low + _BATCH_SIZE])
+                chunks = await pipe.execute()
+        except self._errors as e:
+            raise CacheBackendError(str(e)) from e
+        return [value for chunk in chunks for value in chunk]
+
+    async def set_many(self, items: List[Tuple[str, bytes]], ttl: float) -> None:
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, value in items:
+                    pipe.set(key, value, px=max(1, int(ttl * 1000)))
+                await pipe.execute()
+        except self._errors as e:
+            raise CacheBackendError(str(e)) from e
+
+    async def delete(self, keys: List[str]) -> int:
+        if not keys:
+            return 0
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for low in range(0, len(keys), _BATCH_SIZE):
+                    pipe.unlink(*keys[low:low + _BATCH_SIZE])
+                return sum(await pipe.execute())
+        except self._errors as e:
+            raise CacheBackendError(str(e)) from e
+
+    async def delete_prefix(self, prefix: str) -> int:
+        try:
+            keys = [key async for key in self.client.scan_iter(match=f"{prefix}*", count=_BATCH_SIZE)]
+        except self._errors as e:
+            raise CacheBackendError(str(e)) from e
+        return await self.delete(keys)
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        try:
+            await self.client.publish(channel, message)
+        except self._errors as e:
+            raise CacheBackendError(str(e)) from e
+
+    async def subscribe(self, channel: str, callback: Callable[[bytes], None]) -> None:
+        self._listeners.append(asyncio.create_task(self._listen(channel, callback)))
+
+    async def _listen(self, channel: str, callback: Callable[[bytes], None]) -> None:
+        while True:
+            try:
+                async with self.client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            callback(message["data"])
+            except self._errors as e:
+                logger.warning(f"Cache invalidation subscription to {channel} lost, retrying: {e}")
+                await asyncio.sleep(1.0)
+
+    async def close(self) -> None:
+        for task in self._listeners:
+            task.cancel()
+        await asyncio.gather(*self._listeners, return_exceptions=True)
+        self._listeners.clear()
+        await self.client.aclose()
+
+class TwoTierCache(NamespacedCache):
+    """
+    Namespaced LRU caches backed by a shared store
+
+    A local miss is looked up in the shared store before the loader runs,
+    and loaded values are written to both tiers, so a value loaded by one
+    worker is a hit for every other. Values are msgpack-encoded; those
+    msgpack cannot encode stay local. Invalidations delete the shared
+    entries and are published so other workers drop their local copies.
+    If the shared store is unreachable the cache degrades to local only.
+    """
+
+    def __init__(
+        self,
+        capacities: Dict[str, int],
+        ttl: float,
+        backend: Any,
+        prefix: str = "cache"
+    ):
+        super().__init__(capacities, ttl)
+        self.ttl = ttl
+        self.backend = backend
+        self.prefix = prefix
+        self.channel = f"{prefix}:invalidate"
+        # Lets a worker ignore its own invalidation messages
+        self.node_id = uuid.uuid4().hex
+        self.remote: Dict[str, Dict[str, int]] = {
+            namespace: {"hits": 0, "misses": 0, "errors": 0} for namespace in capacities
+        }
+
+    def _remote_key(self, namespace: str, key: Hashable) -> str:
+        # Keys are tuples of strings and numbers; enum members encode as their value
+        return f"{self.prefix}:{namespace}:{json.dumps(key, separators=(',', ':'), default=str)}"
+
+    async def _remote_get(self, namespace: str, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        counters = self.remote[namespace]
+        try:
+            values = await self.backend.get_many([self._remote_key(namespace, key) for key in keys])
+        except CacheBackendError as e:
+            counters["errors"] += 1
+            logger.warning(f"Shared cache read failed for {namespace}: {e}")
+            return {}
+        found = {}
+        for key, value in zip(keys, values):
+            if value is None:
+                counters["misses"] += 1
+                continue
+            counters["hits"] += 1
+            found[key] = msgpack.unpackb(value, raw=False)
+        return found
+
+    async def _remote_set(self, namespace: str, items: List[Tuple[Hashable, Any]]) -> None:
+        encoded = []
+        for key, value in items:
+            try:
+                encoded.append((self._remote_key(namespace, key), msgpack.packb(value, use_bin_type=True)))
+            except (TypeError, ValueError, OverflowError):
+                continue
+        if not encoded:
+            return
+        try:
+            await self.backend.set_many(encoded, self.ttl)
+        except CacheBackendError as e:
+            self.remote[namespace]["errors"] += 1
+            logger.warning(f"Shared cache write failed for {namespace}: {e}")
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        cache_if: Callable[[Any], bool] = lambda value: True
+    ) -> Any:
+        """
+        Return a value from the local tier, the shared tier or the loader
+
+        Concurrent local misses for a key share one shared-store lookup and
+        at most one loader call.
+
+        Args:
+            namespace: Cache namespace
+            key: Cache key within the namespace
+            loader: Coroutine function producing the value on a miss
+            cache_if: Predicate deciding whether a loaded value is cached
+
+        Returns:
+            Cached or freshly loaded value
+        """
+        cache = self.namespaces[namespace]
+        value = cache.get(key)
+        if value is not MISSING:
+            return value
+
+        flight_key = (namespace, key)
+        if self.flights.in_flight(flight_key):
+            cache.coalesced += 1
+
+        async def load() -> Any:
+            shared = await self._remote_get(namespace, [key])
+            if key in shared:
+                cache.set(key, shared[key])
+                return shared[key]
+            loaded = await loader()
+            if cache_if(loaded):
+                cache.set(key, loaded)
+                await self._remote_set(namespace, [(key, loaded)])
+            return loaded
+
+        return await self.flights.do(flight_key, load)
+
+    async def get_many(self, namespace: str, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Look up many keys: local tier first, then one pipelined multi-get
+
+        Args:
+            namespace: Cache namespace
+            keys: Cache keys within the namespace
+
+        Returns:
+            Cached values by key; misses in both tiers are left out
+        """
+        found = await super().get_many(namespace, keys)
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            shared = await self._remote_get(namespace, missing)
+            cache = self.namespaces[namespace]
+            for key, value in shared.items():
+                cache.set(key, value)
+            found.update(shared)
+        return found
+
+    async def set_many(self, namespace: str, items: List[Tuple[Hashable, Any]]) -> None:
+        await super().set_many(namespace, items)
+        await self._remote_set(namespace, items)
+
+    async def invalidate(self, namespace: Optional[str] = None, keys: Optional[List[Hashable]] = None) -> Dict[str, int]:
+        """
+        Drop entries from both tiers and tell the other workers to drop theirs
+
+        Args:
+            namespace: Namespace to invalidate (all if None)
+            keys: Keys to drop within the namespace (whole namespace if None)
+
+        Returns:
+            Number of local entries dropped per namespace
+        """
+        dropped = await super().invalidate(namespace, keys)
+        remote_keys = [self._remote_key(namespace, key) for key in keys] if namespace is not None and keys is not None else None
+        try:
+            if remote_keys is not None:
+                await self.backend.delete(remote_keys)
+            else:
+                await self.backend.delete_prefix(f"{self.prefix}:{namespace}:" if namespace else f"{self.prefix}:")
+            await self.backend.publish(self.channel, msgpack.packb(
+                {"origin": self.node_id, "namespace": namespace, "keys": remote_keys},
+                use_bin_type=True
+            ))
+        except CacheBackendError as e:
+            logger.warning(f"Shared cache invalidation failed: {e}")
+        return dropped
+
+    def _on_invalidate(self, message: bytes) -> None:
+        """Drop local copies of entries another worker invalidated"""
+        event = msgpack.unpackb(message, raw=False)
+        if event["origin"] == self.node_id:
+            return
+        namespace = event["namespace"]
+        if namespace is not None and namespace not in self.namespaces:
+            return
+        if event["keys"] is None:
+            self.clear(namespace)
+            return
+        # Only the encoded keys travel; match them against local entries
+        targets = set(event["keys"])
+        cache = self.namespaces[namespace]
+        for key in cache.keys():
+            if self._remote_key(namespace, key) in targets:
+                cache.delete(key)
+
+    async def start(self) -> None:
+        await self.backend.subscribe(self.channel, self._on_invalidate)
+
+    async def stop(self) -> None:
+        await self.backend.close()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        stats = super().stats()
+        for namespace, counters in self.remote.items():
+            lookups = counters["hits"] + counters["misses"]
+            stats[namespace].update({
+                "shared_hits": counters["hits"],
+                "shared_misses": counters["misses"],
+                "shared_hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+                "shared_errors": counters["errors"],
+            })
+        return stats
+
+def create_cache(
+    capacities: Dict[str, int],
+    ttl: float,
+    backend: str = "local",
+    url: Optional[str] = None,
+    prefix: str = "cache"
+) -> NamespacedCache:
+    """
+    Build a namespaced cache for the configured backend
+
+    Args:
+        capacities: Local entry limit per namespace
+        ttl: Entry lifetime in seconds, in both tiers
+        backend: "local" (in-process only), "memory" (two tiers with the
+            in-process stand-in) or "redis"
+        url: Shared store URL for the redis backend
+        prefix: Key and channel prefix in the shared store
+
+    Returns:
+        NamespacedCache, or a TwoTierCache for the shared backends
+    """
+    if backend == "local":
+        return NamespacedCache(capacities, ttl)
+    if backend == "memory":
+        return TwoTierCache(capacities, ttl, MemoryCacheBackend(), prefix)
+    if backend == "redis":
+        return TwoTierCache(capacities, ttl, RedisCacheBackend(url), prefix)
+    raise ValueError(f"Unknown cache backend: {backend}")
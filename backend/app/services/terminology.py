@@ -3,11 +3,29 @@ Medical Terminology Service
 Integrates with SNOMED CT, RxNorm, LOINC, and ICD-10-CM standards
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from enum import Enum
 import asyncio
 import json
-from datetime import datetime, timedelta
+import logging
+import os
+import re
+from datetime import datetime
+from urllib.parse import unquote
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.shared_cache import create_cache
+from app.services.contraindications import ContraindicationIndex
+from app.services.crosswalk import ICD10CMCrosswalk
+from app.services.drug_interactions import DrugInteractionIndex
+from app.services.pediatric_dosing import PediatricDosingEngine
+from app.services.terminology_index import TerminologyStore
+from app.services.terminology_search import ConceptSearchIndex
+from app.services.terminology_snapshot import TerminologySnapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
 
 class TerminologySystem(str, Enum):
     SNOMED_CT = "snomed_ct"
@@ -15,13 +33,94 @@ class TerminologySystem(str, Enum):
     LOINC = "loinc"
     ICD_10_CM = "icd_10_cm"
 
+SYSTEM_URIS = {
+    TerminologySystem.SNOMED_CT: "http://snomed.info/sct",
+    TerminologySystem.RXNORM: "http://www.nlm.nih.gov/research/umls/rxnorm",
+    TerminologySystem.LOINC: "http://loinc.org",
+    TerminologySystem.ICD_10_CM: "http://hl7.org/fhir/sid/icd-10-cm",
+}
+
+# FHIR implicit SNOMED CT value sets: `isa/<code>`, `ecl/<<<code>` and `ecl/<<code>`
+_IS_A_VALUE_SET = re.compile(r"(?:^|fhir_vs=)(isa/|ecl/\s*<<\s*|ecl/\s*<\s*)(\d+)\s*$")
+
+def _parse_is_a_value_set(value_set_id: str) -> Optional[Tuple[str, bool]]:
+    """Root code and whether the root itself is included, for is-a value sets"""
+    match = _IS_A_VALUE_SET.search(unquote(value_set_id))
+    if match is None:
+        return None
+    operator = match.group(1).replace(" ", "")
+    return match.group(2), operator != "ecl/<"
+
+# Diagnosis.system spellings accepted by the crosswalk
+_DIAGNOSIS_SYSTEMS = {
+    "snomed-ct": TerminologySystem.SNOMED_CT,
+    "snomed ct": TerminologySystem.SNOMED_CT,
+    "icd-10-cm": TerminologySystem.ICD_10_CM,
+    **{system.value: system for system in TerminologySystem},
+    **{uri: system for system, uri in SYSTEM_URIS.items()},
+}
+
+def _diagnosis_system(system: str) -> Optional[TerminologySystem]:
+    return _DIAGNOSIS_SYSTEMS.get(system.strip().lower())
+
+def _field(item: Any, name: str, default: Any = None) -> Any:
+    """Read a field from a dict or a model instance"""
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name, default)
+
+def _json_serializable(value: Any) -> bool:
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+def _group_by_system(items: List[Tuple[str, TerminologySystem]]) -> Dict[TerminologySystem, Dict[str, List[int]]]:
+    """Group (value, system) pairs by system, mapping each distinct value to its input positions"""
+    groups: Dict[TerminologySystem, Dict[str, List[int]]] = {}
+    for position, (value, system) in enumerate(items):
+        groups.setdefault(TerminologySystem(system), {}).setdefault(value, []).append(position)
+    return groups
+
 class TerminologyService:
     """Service for medical terminology integration and value set management"""
     
-    def __init__(self):
-        self.cache: Dict[str, Any] = {}
-        self.cache_ttl = timedelta(hours=24)
+    def __init__(
+        self,
+        index_dir: Optional[str] = None,
+        cache_capacities: Optional[Dict[str, int]] = None,
+        cache_ttl: float = 86400,
+        snapshot_path: Optional[str] = None,
+        snapshot_cache_entries: int = 1000,
+        cache_backend: str = "local",
+        cache_url: Optional[str] = None
+    ):
+        # Shared backends put the per-worker LRUs in front of one store for all workers
+        self.cache = create_cache(
+            cache_capacities or {"search": 10000, "concept": 50000, "valueset": 1000},
+            cache_ttl,
+            backend=cache_backend,
+            url=cache_url,
+            prefix="terminology"
+        )
         self.last_refresh = datetime.now()
+        # Local release indexes; systems without one fall back to the mocks
+        self.indexes = TerminologyStore(index_dir)
+        self.search_indexes: Dict[str, ConceptSearchIndex] = {}
+        self.interactions: Optional[DrugInteractionIndex] = None
+        self._interactions_loaded = False
+        self.contraindications: Optional[ContraindicationIndex] = None
+        self._contraindications_loaded = False
+        self.dosing: Optional[PediatricDosingEngine] = None
+        self._dosing_loaded = False
+        self.crosswalk: Optional[ICD10CMCrosswalk] = None
+        self._crosswalk_loaded = False
+        # Warm start: search structures and hot cache entries from the last run
+        self.snapshot_path = snapshot_path
+        self.snapshot_cache_entries = snapshot_cache_entries
+        self.snapshot: Optional[TerminologySnapshot] = None
+        self.load_snapshot()
         
     async def search_concepts(
         self, 
@@ -40,23 +139,25 @@ class TerminologyService:
         Returns:
             List of matching concepts
         """
-        cache_key = f"search_{system}_{query}_{limit}"
-        
-        if cache_key in self.cache:
-            cached_result = self.cache[cache_key]
-            if datetime.now() - cached_result['timestamp'] < self.cache_ttl:
-                return cached_result['data']
+        search_index = self._search_index(system)
+        if search_index is not None:
+            return [
+                {
+                    "id": match["code"],
+                    "system": SYSTEM_URIS[system],
+                    "version": search_index.version,
+                    **match
+                }
+                for match in search_index.search(query, limit)
+            ]
         
         # TODO: Implement actual terminology API calls
         # This is a placeholder implementation
-        results = await self._mock_search_concepts(query, system, limit)
-        
-        self.cache[cache_key] = {
-            'data': results,
-            'timestamp': datetime.now()
-        }
-        
-        return results
+        return await self.cache.get_or_load(
+            "search",
+            (system, query, limit),
+            lambda: self._mock_search_concepts(query, system, limit)
+        )
     
     async def get_concept_details(
         self, 
@@ -73,23 +174,17 @@ class TerminologyService:
         Returns:
             Concept details or None if not found
         """
-        cache_key = f"concept_{system}_{concept_id}"
-        
-        if cache_key in self.cache:
-            cached_result = self.cache[cache_key]
-            if datetime.now() - cached_result['timestamp'] < self.cache_ttl:
-                return cached_result['data']
+        index = self.indexes.get(system.value)
+        if index is not None:
+            return self._indexed_concept(index, concept_id, system)
         
         # TODO: Implement actual concept lookup
-        result = await self._mock_get_concept_details(concept_id, system)
-        
-        if result:
-            self.cache[cache_key] = {
-                'data': result,
-                'timestamp': datetime.now()
-            }
-        
-        return result
+        return await self.cache.get_or_load(
+            "concept",
+            (system, concept_id),
+            lambda: self._mock_get_concept_details(concept_id, system),
+            cache_if=bool
+        )
     
     async def expand_value_set(
         self, 
@@ -106,22 +201,22 @@ class TerminologyService:
         Returns:
             List of concepts in the value set
         """
-        cache_key = f"valueset_{system}_{value_set_id}"
-        
-        if cache_key in self.cache:
-            cached_result = self.cache[cache_key]
-            if datetime.now() - cached_result['timestamp'] < self.cache_ttl:
-                return cached_result['data']
+        hierarchy = self._hierarchy(system)
+        is_a = _parse_is_a_value_set(value_set_id)
+        if hierarchy is not None and is_a is not None:
+            index, closure = hierarchy
+            
+            async def expand() -> List[Dict[str, Any]]:
+                return self._expand_is_a(index, closure, system, *is_a)
+            
+            return await self.cache.get_or_load("valueset", (system, value_set_id, index.version), expand)
         
         # TODO: Implement actual value set expansion
-        results = await self._mock_expand_value_set(value_set_id, system)
-        
-        self.cache[cache_key] = {
-            'data': results,
-            'timestamp': datetime.now()
-        }
-        
-        return results
+        return await self.cache.get_or_load(
+            "valueset",
+            (system, value_set_id),
+            lambda: self._mock_expand_value_set(value_set_id, system)
+        )
     
     async def validate_code(
         self, 
@@ -140,9 +235,272 @@ class TerminologyService:
         Returns:
             Validation result
         """
-        # TODO: Implement actual code validation
+        index = self.indexes.get(system.value)
+        if index is not None and value_set_id is None:
+            return self._indexed_validation(index, code, system)
+        
+        membership = self._is_a_membership([code], system, value_set_id) if value_set_id else None
+        if membership is not None:
+            return membership[0]
+        
+        # TODO: Implement value set membership checks
         return await self._mock_validate_code(code, system, value_set_id)
     
+    async def validate_codes(
+        self,
+        codings: List[Tuple[str, TerminologySystem]],
+        value_set_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Validate many codes in one call
+        
+        Args:
+            codings: (code, system) pairs
+            value_set_id: Optional value set to check every code against
+            
+        Returns:
+            Validation results in input order
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(codings)
+        for system, members in _group_by_system(codings).items():
+            index = self.indexes.get(system.value)
+            if index is not None and value_set_id is None:
+                for code, positions in members.items():
+                    result = self._indexed_validation(index, code, system)
+                    for position in positions:
+                        results[position] = result
+                continue
+            
+            validated = self._is_a_membership(list(members), system, value_set_id) if value_set_id else None
+            if validated is None:
+                # TODO: Implement value set membership checks
+                validated = await self._mock_validate_codes(list(members), system, value_set_id)
+            for (code, positions), result in zip(members.items(), validated):
+                for position in positions:
+                    results[position] = result
+        
+        return results
+    
+    async def get_concepts_details(
+        self,
+        concepts: List[Tuple[str, TerminologySystem]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Get details for many concepts in one call
+        
+        Args:
+            concepts: (concept_id, system) pairs
+            
+        Returns:
+            Concept details (None where not found) in input order
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(concepts)
+        for system, members in _group_by_system(concepts).items():
+            index = self.indexes.get(system.value)
+            if index is not None:
+                for concept_id, positions in members.items():
+                    result = self._indexed_concept(index, concept_id, system)
+                    for position in positions:
+                        results[position] = result
+                continue
+            
+            # One multi-get covers every concept missing from the local tier
+            cached = await self.cache.get_many("concept", [(system, concept_id) for concept_id in members])
+            missing = []
+            for concept_id, positions in members.items():
+                key = (system, concept_id)
+                if key not in cached:
+                    missing.append(concept_id)
+                    continue
+                for position in positions:
+                    results[position] = cached[key]
+            if not missing:
+                continue
+            
+            # TODO: Implement actual concept lookup
+            loaded = []
+            for concept_id, result in zip(missing, await self._mock_get_concepts_details(missing, system)):
+                if result:
+                    loaded.append(((system, concept_id), result))
+                for position in members[concept_id]:
+                    results[position] = result
+            await self.cache.set_many("concept", loaded)
+        
+        return results
+    
+    async def search_concepts_many(
+        self,
+        queries: List[Tuple[str, TerminologySystem]],
+        limit: int = 10
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Run many concept searches in one call
+        
+        Args:
+            queries: (query, system) pairs
+            limit: Maximum number of results per query
+            
+        Returns:
+            One result list per query, in input order
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        pending = []
+        for system, members in _group_by_system(queries).items():
+            if self._search_index(system) is not None:
+                for query, positions in members.items():
+                    matches = await self.search_concepts(query, system, limit)
+                    for position in positions:
+                        results[position] = matches
+                continue
+            cached = await self.cache.get_many("search", [(system, query, limit) for query in members])
+            for query, positions in members.items():
+                matches = cached.get((system, query, limit))
+                if matches is None:
+                    pending.append((query, system, positions))
+                    continue
+                for position in positions:
+                    results[position] = matches
+        
+        # Remote lookups run concurrently and share the cache with search_concepts
+        searched = await asyncio.gather(
+            *(self.search_concepts(query, system, limit) for query, system, _ in pending)
+        )
+        for (_, _, positions), matches in zip(pending, searched):
+            for position in positions:
+                results[position] = matches
+        
+        return results
+    
+    def subsumes(
+        self,
+        ancestor_code: str,
+        code: str,
+        system: TerminologySystem = TerminologySystem.SNOMED_CT
+    ) -> Optional[bool]:
+        """
+        Test whether a code is the ancestor code or one of its descendants
+        
+        Args:
+            ancestor_code: Candidate ancestor concept
+            code: Candidate descendant concept
+            system: Terminology system
+            
+        Returns:
+            Subsumption result, or None if no hierarchy is loaded for the system
+        """
+        hierarchy = self._hierarchy(system)
+        if hierarchy is None:
+            return None
+        index, closure = hierarchy
+        ancestor = index.find(ancestor_code)
+        position = index.find(code)
+        return ancestor >= 0 and position >= 0 and closure.subsumes(ancestor, position)
+    
+    async def map_code(
+        self,
+        code: str,
+        system: TerminologySystem,
+        age_years: Optional[float] = None,
+        gender: Optional[str] = None,
+        context: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Map a code between SNOMED CT and ICD-10-CM
+        
+        Args:
+            code: SNOMED CT or ICD-10-CM code
+            system: System of the code
+            age_years: Age at onset, for age-dependent map rules
+            gender: "male" or "female", for gender-dependent map rules
+            context: Other SNOMED CT concepts on record, for co-morbidity rules
+            
+        Returns:
+            Mapped codes in the other system
+        """
+        return (await self.map_encounters([{
+            "age_years": age_years,
+            "gender": gender,
+            "context": context or [],
+            "diagnosis": [{"code": code, "system": system.value}]
+        }]))[0][0]["mappings"]
+    
+    async def map_encounter_diagnoses(
+        self,
+        encounter: Any,
+        age_years: Optional[float] = None,
+        gender: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Map every diagnosis in an encounter between SNOMED CT and ICD-10-CM
+        
+        Args:
+            encounter: Encounter model or dict with a `diagnosis` list
+            age_years: Patient age at the encounter
+            gender: Patient gender
+            
+        Returns:
+            One entry per diagnosis with its mappings, in encounter order
+        """
+        return (await self.map_encounters([{
+            "age_years": age_years,
+            "gender": gender,
+            "diagnosis": _field(encounter, "diagnosis") or []
+        }]))[0]
+    
+    async def map_encounters(self, encounters: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Map the diagnoses of many encounters in one crosswalk pass
+        
+        Args:
+            encounters: Dicts with `diagnosis` (Diagnosis models or dicts),
+                optional `age_years`, `gender` and extra SNOMED CT `context`
+            
+        Returns:
+            Per encounter, one entry per diagnosis with its mappings
+        """
+        crosswalk = self._crosswalk()
+        items: List[Tuple[str, bool]] = []
+        ages: List[Optional[float]] = []
+        genders: List[Optional[str]] = []
+        contexts: List[List[str]] = []
+        shapes: List[List[Tuple[str, str, Optional[TerminologySystem]]]] = []
+        for encounter in encounters:
+            diagnoses = [
+                (str(_field(diagnosis, "code")), str(_field(diagnosis, "system")), _diagnosis_system(str(_field(diagnosis, "system"))))
+                for diagnosis in encounter.get("diagnosis") or []
+            ]
+            # Co-morbidity rules look at the encounter's other SNOMED CT diagnoses
+            context = [code for code, _, system in diagnoses if system == TerminologySystem.SNOMED_CT]
+            context.extend(encounter.get("context") or [])
+            gender = encounter.get("gender")
+            for code, _, system in diagnoses:
+                items.append((code, system == TerminologySystem.SNOMED_CT))
+                ages.append(encounter.get("age_years"))
+                genders.append(getattr(gender, "value", gender))
+                contexts.append(context)
+            shapes.append(diagnoses)
+        
+        mapped = crosswalk.map_many(items, ages, genders, contexts) if crosswalk is not None else [[] for _ in items]
+        
+        results: List[List[Dict[str, Any]]] = []
+        position = 0
+        for diagnoses in shapes:
+            entries = []
+            for code, raw_system, system in diagnoses:
+                target = {
+                    TerminologySystem.SNOMED_CT: TerminologySystem.ICD_10_CM,
+                    TerminologySystem.ICD_10_CM: TerminologySystem.SNOMED_CT,
+                }.get(system)
+                entries.append({
+                    "code": code,
+                    "system": raw_system,
+                    "target_system": target.value if target else None,
+                    "mappings": mapped[position] if target else []
+                })
+                position += 1
+            results.append(entries)
+        return results
+    
     async def get_drug_interactions(
         self, 
         drug_codes: List[str]
@@ -156,9 +514,34 @@ class TerminologyService:
         Returns:
             List of drug interactions
         """
+        interactions = self._interaction_index()
+        if interactions is not None:
+            return interactions.check(drug_codes)
+        
         # TODO: Implement actual drug interaction checking
         return await self._mock_get_drug_interactions(drug_codes)
     
+    async def get_drug_interactions_many(
+        self,
+        medication_lists: List[List[str]]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Screen many medication lists, e.g. every patient on a ward
+        
+        Args:
+            medication_lists: One list of RxNorm drug codes per patient
+            
+        Returns:
+            Drug interactions per list, in input order
+        """
+        interactions = self._interaction_index()
+        if interactions is not None:
+            return interactions.check_many(medication_lists)
+        
+        return list(await asyncio.gather(
+            *(self._mock_get_drug_interactions(drug_codes) for drug_codes in medication_lists)
+        ))
+    
     async def get_contraindications(
         self, 
         drug_code: str,
@@ -174,9 +557,38 @@ class TerminologyService:
         Returns:
             List of contraindications
         """
+        contraindications = self._contraindication_index()
+        if contraindications is not None:
+            return contraindications.check([drug_code], [patient_conditions])[0]
+        
         # TODO: Implement actual contraindication checking
         return await self._mock_get_contraindications(drug_code, patient_conditions)
     
+    async def get_contraindications_many(
+        self,
+        drug_codes: List[str],
+        patient_conditions: List[List[str]]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Check drugs against many patients' problem lists in one call
+        
+        Args:
+            drug_codes: RxNorm drug codes
+            patient_conditions: One list of SNOMED CT condition codes per patient
+            
+        Returns:
+            Contraindications per patient, in input order
+        """
+        contraindications = self._contraindication_index()
+        if contraindications is not None:
+            return contraindications.check(drug_codes, patient_conditions)
+        
+        results = await asyncio.gather(*(
+            asyncio.gather(*(self._mock_get_contraindications(drug_code, conditions) for drug_code in drug_codes))
+            for conditions in patient_conditions
+        ))
+        return [[item for per_drug in per_patient for item in per_drug] for per_patient in results]
+    
     async def get_pediatric_dosing(
         self, 
         drug_code: str,
@@ -194,9 +606,283 @@ class TerminologyService:
         Returns:
             Dosing recommendations or None
         """
+        dosing = self._dosing_engine()
+        if dosing is not None:
+            return dosing.recommendations([drug_code], [age_years], [weight_kg])[0][0]
+        
         # TODO: Implement actual pediatric dosing lookup
         return await self._mock_get_pediatric_dosing(drug_code, age_years, weight_kg)
     
+    async def get_pediatric_dosing_many(
+        self,
+        drug_codes: List[str],
+        patients: List[Dict[str, Any]]
+    ) -> List[List[Optional[Dict[str, Any]]]]:
+        """
+        Get dosing recommendations for every patient and drug in one call
+        
+        Args:
+            drug_codes: RxNorm drug codes
+            patients: Dicts with `age_years`, `weight_kg` and optional `egfr`
+            
+        Returns:
+            One row per patient with one recommendation (or None) per drug
+        """
+        dosing = self._dosing_engine()
+        if dosing is not None:
+            return dosing.recommendations(
+                drug_codes,
+                np.asarray([patient["age_years"] for patient in patients], dtype=np.float64),
+                np.asarray([patient["weight_kg"] for patient in patients], dtype=np.float64),
+                np.asarray([
+                    np.nan if patient.get("egfr") is None else patient["egfr"] for patient in patients
+                ], dtype=np.float64)
+            )
+        
+        results = await asyncio.gather(*(
+            asyncio.gather(*(
+                self._mock_get_pediatric_dosing(drug_code, patient["age_years"], patient["weight_kg"])
+                for drug_code in drug_codes
+            ))
+            for patient in patients
+        ))
+        return [list(row) for row in results]
+    
+    def build_search_indexes(self) -> None:
+        """
+        Build search and interaction structures for the loaded releases ahead of first use
+        
+        Search structures come from the snapshot when it matches the releases;
+        otherwise they are built here and a new snapshot is written, so the
+        next worker to start maps them instead.
+        """
+        for system in TerminologySystem:
+            self._search_index(system)
+        if self.snapshot is None:
+            self.save_snapshot()
+        self._interaction_index()
+        self._contraindication_index()
+        self._dosing_engine()
+        self._crosswalk()
+    
+    def load_snapshot(self) -> bool:
+        """
+        Map the warm-start snapshot if it was written for the loaded releases
+        
+        Returns:
+            True if search structures and cache entries were restored
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            snapshot = TerminologySnapshot(self.snapshot_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable terminology snapshot {self.snapshot_path}: {e}")
+            return False
+        if snapshot.versions != self._release_versions():
+            logger.info(f"Terminology snapshot {self.snapshot_path} is for other releases; ignoring it")
+            snapshot.close()
+            return False
+        
+        for system, index in self.indexes.indexes.items():
+            group = f"search/{system}"
+            if group in snapshot:
+                self.search_indexes[system] = ConceptSearchIndex.from_sections(index, snapshot.group(group))
+        
+        # Oldest first, so the hottest entries end up most recently used
+        for namespace, entries in snapshot.cache_entries().items():
+            if namespace not in self.cache.namespaces:
+                continue
+            for key, value, ttl in reversed(entries):
+                self.cache.set(namespace, self._snapshot_key(key), value, ttl)
+        
+        self.snapshot = snapshot
+        return True
+    
+    def save_snapshot(self) -> Optional[str]:
+        """
+        Write search structures and the hottest cache entries to the snapshot
+        
+        Returns:
+            Snapshot path, or None when there is no path or no loaded release
+        """
+        if not self.snapshot_path or not self.indexes.indexes:
+            return None
+        groups = {}
+        for system in TerminologySystem:
+            search_index = self._search_index(system)
+            if search_index is not None:
+                groups[f"search/{system.value}"] = search_index.sections()
+        
+        cache_entries = {}
+        for namespace, entries in self.cache.hottest(self.snapshot_cache_entries).items():
+            cache_entries[namespace] = [
+                ([part.value if isinstance(part, TerminologySystem) else part for part in key], value, ttl)
+                for key, value, ttl in entries
+                if _json_serializable(value)
+            ]
+        
+        try:
+            size = write_snapshot(self.snapshot_path, self._release_versions(), groups, cache_entries)
+        except OSError as e:
+            logger.warning(f"Could not write terminology snapshot {self.snapshot_path}: {e}")
+            return None
+        logger.info(f"Terminology snapshot written to {self.snapshot_path} ({size} bytes)")
+        return self.snapshot_path
+    
+    def _release_versions(self) -> Dict[str, List[Any]]:
+        """Version and concept count of every loaded release; a snapshot is only valid for the same set"""
+        return {system: [index.version, len(index)] for system, index in self.indexes.indexes.items()}
+    
+    @staticmethod
+    def _snapshot_key(key: List[Any]) -> Tuple[Any, ...]:
+        """Cache keys are tuples led by the system; JSON turned them into lists of plain values"""
+        return (TerminologySystem(key[0]), *key[1:])
+    
+    def _search_index(self, system: TerminologySystem) -> Optional[ConceptSearchIndex]:
+        """Search structures for the loaded release, built on first use"""
+        index = self.indexes.get(system.value)
+        if index is None:
+            return None
+        search_index = self.search_indexes.get(system.value)
+        if search_index is None or search_index.index is not index:
+            search_index = ConceptSearchIndex(index)
+            self.search_indexes[system.value] = search_index
+        return search_index
+    
+    def _interaction_index(self) -> Optional[DrugInteractionIndex]:
+        """Drug interaction index from the release directory, loaded on first use"""
+        if not self._interactions_loaded:
+            self.interactions = DrugInteractionIndex.from_directory(self.indexes.directory)
+            self._interactions_loaded = True
+        return self.interactions
+    
+    def _contraindication_index(self) -> Optional[ContraindicationIndex]:
+        """Contraindication rules from the release directory, loaded on first use"""
+        if not self._contraindications_loaded:
+            self.contraindications = ContraindicationIndex.from_directory(
+                self.indexes.directory,
+                self.indexes.get(TerminologySystem.SNOMED_CT.value),
+                self.indexes.closure(TerminologySystem.SNOMED_CT.value)
+            )
+            self._contraindications_loaded = True
+        return self.contraindications
+    
+    def _dosing_engine(self) -> Optional[PediatricDosingEngine]:
+        """Pediatric dosing rules from the release directory, loaded on first use"""
+        if not self._dosing_loaded:
+            self.dosing = PediatricDosingEngine.from_directory(self.indexes.directory)
+            self._dosing_loaded = True
+        return self.dosing
+    
+    def _crosswalk(self) -> Optional[ICD10CMCrosswalk]:
+        """SNOMED CT / ICD-10-CM crosswalk from the release directory, loaded on first use"""
+        if not self._crosswalk_loaded:
+            self.crosswalk = ICD10CMCrosswalk.from_directory(self.indexes.directory)
+            self._crosswalk_loaded = True
+        return self.crosswalk
+    
+    def _hierarchy(self, system: TerminologySystem) -> Optional[Tuple[Any, Any]]:
+        """Index and is-a closure of the loaded release, if both exist"""
+        closure = self.indexes.closure(system.value)
+        if closure is None:
+            return None
+        return self.indexes.get(system.value), closure
+    
+    def _expand_is_a(
+        self,
+        index: Any,
+        closure: Any,
+        system: TerminologySystem,
+        root_code: str,
+        include_self: bool
+    ) -> List[Dict[str, Any]]:
+        """Expand an is-a value set as a range scan over the closure"""
+        root = index.find(root_code)
+        if root < 0:
+            return []
+        return [
+            {
+                "id": code,
+                "code": code,
+                "display": index.display_at(position),
+                "system": SYSTEM_URIS[system]
+            }
+            for position in closure.descendants(root, include_self).tolist()
+            for code in (index.code_at(position),)
+        ]
+    
+    def _is_a_membership(
+        self,
+        codes: List[str],
+        system: TerminologySystem,
+        value_set_id: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Validate codes against an is-a value set, or None if it cannot be answered locally"""
+        hierarchy = self._hierarchy(system)
+        is_a = _parse_is_a_value_set(value_set_id)
+        if hierarchy is None or is_a is None:
+            return None
+        index, closure = hierarchy
+        root_code, include_self = is_a
+        root = index.find(root_code)
+        
+        positions = np.fromiter((index.find(code) for code in codes), dtype=np.int64, count=len(codes))
+        valid = positions >= 0
+        if root >= 0:
+            valid[valid] = closure.subsumed_mask(root, positions[valid])
+            if not include_self:
+                valid &= positions != root
+        else:
+            valid[:] = False
+        
+        return [
+            {
+                "valid": bool(member),
+                "code": code,
+                "system": system.value,
+                "display": index.display_at(int(position)) if member else None,
+                "version": index.version,
+                "value_set": value_set_id
+            }
+            for code, position, member in zip(codes, positions, valid)
+        ]
+    
+    def _indexed_validation(
+        self,
+        index: Any,
+        code: str,
+        system: TerminologySystem
+    ) -> Dict[str, Any]:
+        """Code validation against a local release index"""
+        position = index.find(code)
+        return {
+            "valid": position >= 0,
+            "code": code,
+            "system": system.value,
+            "display": index.display_at(position) if position >= 0 else None,
+            "version": index.version
+        }
+    
+    def _indexed_concept(
+        self,
+        index: Any,
+        concept_id: str,
+        system: TerminologySystem
+    ) -> Optional[Dict[str, Any]]:
+        """Concept details from a local release index"""
+        position = index.find(concept_id)
+        if position < 0:
+            return None
+        return {
+            "id": concept_id,
+            "code": concept_id,
+            "display": index.display_at(position),
+            "system": SYSTEM_URIS[system],
+            "version": index.version,
+            "synonyms": index.synonyms_at(position)
+        }
+    
     # Mock implementations for development
     async def _mock_search_concepts(
         self, 
@@ -324,6 +1010,35 @@ class TerminologyService:
             "version": "2024-01-31"
         }
     
+    async def _mock_validate_codes(
+        self,
+        codes: List[str],
+        system: TerminologySystem,
+        value_set_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Mock implementation for batch code validation"""
+        await asyncio.sleep(0.05)
+        
+        return [
+            {
+                "valid": True,
+                "code": code,
+                "system": system.value,
+                "display": "Valid concept",
+                "version": "2024-01-31"
+            }
+            for code in codes
+        ]
+    
+    async def _mock_get_concepts_details(
+        self,
+        concept_ids: List[str],
+        system: TerminologySystem
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Mock implementation for batch concept details"""
+        details = await self._mock_get_concept_details("", system)
+        return [{**details, "id": concept_id} for concept_id in concept_ids]
+    
     async def _mock_get_drug_interactions(
         self, 
         drug_codes: List[str]
@@ -385,4 +1100,16 @@ class TerminologyService:
         return None
 
 # Global instance
-terminology_service = TerminologyService()
+terminology_service = TerminologyService(
+    settings.TERMINOLOGY_INDEX_DIR,
+    cache_capacities={
+        "search": settings.TERMINOLOGY_CACHE_SEARCH_SIZE,
+        "concept": settings.TERMINOLOGY_CACHE_CONCEPT_SIZE,
+        "valueset": settings.TERMINOLOGY_CACHE_VALUESET_SIZE,
+    },
+    cache_ttl=settings.TERMINOLOGY_CACHE_TTL,
+    snapshot_path=settings.TERMINOLOGY_SNAPSHOT_PATH,
+    snapshot_cache_entries=settings.TERMINOLOGY_SNAPSHOT_CACHE_ENTRIES,
+    cache_backend=settings.TERMINOLOGY_CACHE_BACKEND,
+    cache_url=settings.REDIS_URL
+)
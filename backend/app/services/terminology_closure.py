@@ -0,0 +1,270 @@
+"""
+Terminology Closure
+Precomputed is-a transitive closure for constant-size subsumption tests
+"""
+
+from typing import List, Optional, Any, Iterable, Iterator, Tuple
+from collections import deque
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"TERMCLO1"
+# magic, concept count, interval count, metadata length, then the file
+# offset of each section
+_HEADER = struct.Struct("<8sIIIQQQQQ")
+
+SNOMED_IS_A_TYPE = "116680003"
+
+Interval = Tuple[int, int]
+
+def _merge(intervals: List[Interval]) -> List[Interval]:
+    """Sort and merge overlapping or adjacent inclusive intervals"""
+    intervals.sort()
+    merged = [intervals[0]]
+    for start, end in intervals[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            if end > last_end:
+                merged[-1] = (last_start, end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def _write_array(handle: Any, values: np.ndarray) -> int:
+    padding = -handle.tell() % 8
+    if padding:
+        handle.write(b"\0" * padding)
+    position = handle.tell()
+    handle.write(values.tobytes())
+    return position
+
+def compute_closure(count: int, edges: Iterable[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Interval-label a DAG given as (child, parent) position pairs
+
+    A depth-first spanning tree numbers concepts in pre-order, so each tree
+    subtree is one contiguous range. The descendants of a concept are then
+    its own range merged with the intervals of its children, most of which
+    fall inside that range already.
+
+    Args:
+        count: Number of concepts
+        edges: (child, parent) pairs of concept positions
+
+    Returns:
+        (pre, order, interval_offsets, starts, ends) arrays, where pre maps a
+        concept to its pre-order number, order is the inverse, and each
+        concept's inclusive intervals are starts/ends[offsets[i]:offsets[i+1]]
+    """
+    children: List[List[int]] = [[] for _ in range(count)]
+    in_degree = [0] * count
+    for child, parent in set(edges):
+        if child != parent:
+            children[parent].append(child)
+            in_degree[child] += 1
+    for child_list in children:
+        child_list.sort()
+
+    # Pre-order numbering over a DFS spanning tree
+    pre = [-1] * count
+    end = [0] * count
+    counter = 0
+    roots = [node for node in range(count) if in_degree[node] == 0]
+    for root in roots + list(range(count)):
+        if pre[root] >= 0:
+            continue
+        pre[root] = counter
+        counter += 1
+        stack = [(root, iter(children[root]))]
+        while stack:
+            node, pending = stack[-1]
+            for child in pending:
+                if pre[child] < 0:
+                    pre[child] = counter
+                    counter += 1
+                    stack.append((child, iter(children[child])))
+                    break
+            else:
+                end[node] = counter - 1
+                stack.pop()
+
+    # Children before parents, so every child's intervals are final when merged
+    remaining = in_degree[:]
+    queue = deque(roots)
+    topological: List[int] = []
+    while queue:
+        node = queue.popleft()
+        topological.append(node)
+        for child in children[node]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                queue.append(child)
+    if len(topological) != count:
+        raise ValueError("is-a hierarchy contains a cycle")
+
+    intervals: List[Optional[List[Interval]]] = [None] * count
+    for node in reversed(topological):
+        low, high = pre[node], end[node]
+        own = [(low, high)]
+        for child in children[node]:
+            # A tree child's own range is already inside ours, but not the
+            # ranges it picked up through its non-tree children
+            own.extend((start, finish) for start, finish in intervals[child] if start < low or finish > high)
+        intervals[node] = _merge(own) if len(own) > 1 else own
+
+    offsets = np.zeros(count + 1, dtype=np.uint32)
+    np.cumsum([len(node_intervals) for node_intervals in intervals], out=offsets[1:])
+    flat = [interval for node_intervals in intervals for interval in node_intervals]
+    starts = np.fromiter((start for start, _ in flat), dtype=np.int32, count=len(flat))
+    ends = np.fromiter((finish for _, finish in flat), dtype=np.int32, count=len(flat))
+    pre_array = np.asarray(pre, dtype=np.int32)
+    order = np.empty(count, dtype=np.int32)
+    order[pre_array] = np.arange(count, dtype=np.int32)
+    return pre_array, order, offsets, starts, ends
+
+def build_closure(path: str, index: Any, edges: Iterable[Tuple[str, str]]) -> int:
+    """
+    Write the closure file for a terminology index
+
+    Args:
+        path: Output file path
+        index: TerminologyIndex whose concept positions the closure uses
+        edges: (child_code, parent_code) is-a pairs; codes missing from the
+            index are skipped
+
+    Returns:
+        Number of intervals written
+    """
+    positions = {index.code_at(position): position for position in range(len(index))}
+    pairs = []
+    for child, parent in edges:
+        child_position = positions.get(child)
+        parent_position = positions.get(parent)
+        if child_position is not None and parent_position is not None:
+            pairs.append((child_position, parent_position))
+
+    pre, order, offsets, starts, ends = compute_closure(len(index), pairs)
+    metadata = json.dumps({"system": index.system, "version": index.version}).encode()
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as handle:
+        handle.write(b"\0" * _HEADER.size)
+        handle.write(metadata)
+        sections = [_write_array(handle, array) for array in (pre, order, offsets, starts, ends)]
+        handle.seek(0)
+        handle.write(_HEADER.pack(MAGIC, len(pre), len(starts), len(metadata), *sections))
+    os.replace(tmp_path, path)
+    return len(starts)
+
+class TerminologyClosure:
+    """
+    Read-only, memory-mapped is-a closure for one terminology release
+
+    Positions are those of the matching TerminologyIndex. Subsumption is a
+    binary search over the ancestor's intervals, and the descendants of a
+    concept are contiguous runs of the pre-order permutation. The file is
+    mapped with mmap, so worker processes share its pages.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, interval_count, meta_length, *sections = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a terminology closure: {path}")
+        metadata = json.loads(self._map[_HEADER.size:_HEADER.size + meta_length])
+        self.system: str = metadata["system"]
+        self.version: str = metadata["version"]
+        self.count: int = count
+
+        pre, order, offsets, starts, ends = sections
+        self.pre = np.frombuffer(self._map, dtype=np.int32, count=count, offset=pre)
+        self.order = np.frombuffer(self._map, dtype=np.int32, count=count, offset=order)
+        self.offsets = np.frombuffer(self._map, dtype=np.uint32, count=count + 1, offset=offsets)
+        self.starts = np.frombuffer(self._map, dtype=np.int32, count=interval_count, offset=starts)
+        self.ends = np.frombuffer(self._map, dtype=np.int32, count=interval_count, offset=ends)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def intervals(self, position: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Inclusive pre-order intervals covering a concept and its descendants"""
+        low, high = int(self.offsets[position]), int(self.offsets[position + 1])
+        return self.starts[low:high], self.ends[low:high]
+
+    def subsumes(self, ancestor: int, descendant: int) -> bool:
+        """
+        Test whether one concept is the other or one of its ancestors
+
+        Args:
+            ancestor: Position of the candidate ancestor
+            descendant: Position of the candidate descendant
+
+        Returns:
+            True if descendant is-a ancestor (reflexively)
+        """
+        starts, ends = self.intervals(ancestor)
+        label = self.pre[descendant]
+        slot = int(np.searchsorted(starts, label, side="right")) - 1
+        return slot >= 0 and bool(ends[slot] >= label)
+
+    def subsumed_mask(self, ancestor: int, positions: np.ndarray) -> np.ndarray:
+        """Vectorised subsumes() of one ancestor over many concept positions"""
+        starts, ends = self.intervals(ancestor)
+        labels = self.pre[positions]
+        slots = np.searchsorted(starts, labels, side="right") - 1
+        return (slots >= 0) & (ends[np.maximum(slots, 0)] >= labels)
+
+    def descendants(self, position: int, include_self: bool = True) -> np.ndarray:
+        """
+        Positions of every descendant of a concept
+
+        Args:
+            position: Concept position
+            include_self: Include the concept itself
+
+        Returns:
+            Concept positions in pre-order
+        """
+        starts, ends = self.intervals(position)
+        runs = [self.order[start:finish + 1] for start, finish in zip(starts.tolist(), ends.tolist())]
+        result = np.concatenate(runs) if len(runs) > 1 else runs[0]
+        if not include_self:
+            result = result[result != position]
+        return result
+
+    def close(self) -> None:
+        for attr in ("pre", "order", "offsets", "starts", "ends"):
+            setattr(self, attr, None)
+        self._map.close()
+        self._file.close()
+
+def iter_snomed_isa(relationship_file: str) -> Iterator[Tuple[str, str]]:
+    """Read active is-a (child, parent) pairs from an RF2 Relationship snapshot"""
+    with open(relationship_file, encoding="utf-8") as handle:
+        reader = csv.reader(handle, delimiter="\t", quoting=csv.QUOTE_NONE)
+        next(reader)
+        for row in reader:
+            if row[2] == "1" and row[7] == SNOMED_IS_A_TYPE:
+                yield row[4], row[5]
+
+if __name__ == "__main__":
+    from app.services.terminology_index import TerminologyIndex
+
+    parser = argparse.ArgumentParser(description="Build the SNOMED CT is-a closure for an index")
+    parser.add_argument("relationship_file")
+    parser.add_argument("--index-dir", default="data/terminology")
+    args = parser.parse_args()
+    index = TerminologyIndex(os.path.join(args.index_dir, "snomed_ct.idx"))
+    path = os.path.join(args.index_dir, "snomed_ct.closure")
+    build_closure(path, index, iter_snomed_isa(args.relationship_file))
+    print(path)
@@ -0,0 +1,379 @@
+"""
+Terminology Index
+Compact, memory-mapped concept store built from terminology release files
+"""
+
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b"TERMIDX1"
+# magic, concept count, metadata length, then the file offset of each section
+_HEADER = struct.Struct("<8sIIQQQQQQ")
+_SYNONYM_SEPARATOR = "\x1f"
+
+ConceptRecord = Tuple[str, str, List[str]]
+
+def _align(handle: Any) -> None:
+    padding = -handle.tell() % 8
+    if padding:
+        handle.write(b"\0" * padding)
+
+def _write_pool(handle: Any, values: List[bytes]) -> Tuple[int, int]:
+    """Write a u32 offsets array followed by the concatenated values"""
+    _align(handle)
+    offsets_pos = handle.tell()
+    offset = 0
+    offsets = [0]
+    for value in values:
+        offset += len(value)
+        offsets.append(offset)
+    handle.write(struct.pack(f"<{len(offsets)}I", *offsets))
+    _align(handle)
+    pool_pos = handle.tell()
+    for value in values:
+        handle.write(value)
+    return offsets_pos, pool_pos
+
+def build_index(
+    path: str,
+    system: str,
+    version: str,
+    records: Iterable[ConceptRecord]
+) -> int:
+    """
+    Write a terminology index file
+
+    Records are sorted by code; a later record for the same code replaces an
+    earlier one.
+
+    Args:
+        path: Output file path
+        system: Terminology system identifier
+        version: Release version
+        records: (code, display, synonyms) tuples
+
+    Returns:
+        Number of concepts written
+    """
+    concepts: Dict[str, Tuple[str, List[str]]] = {}
+    for code, display, synonyms in records:
+        concepts[code] = (display, synonyms)
+
+    codes = sorted(concepts, key=lambda c: c.encode())
+    metadata = json.dumps({"system": system, "version": version}).encode()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as handle:
+        handle.write(b"\0" * _HEADER.size)
+        handle.write(metadata)
+        code_sections = _write_pool(handle, [code.encode() for code in codes])
+        display_sections = _write_pool(handle, [concepts[code][0].encode() for code in codes])
+        synonym_sections = _write_pool(
+            handle,
+            [_SYNONYM_SEPARATOR.join(concepts[code][1]).encode() for code in codes]
+        )
+        handle.seek(0)
+        handle.write(_HEADER.pack(MAGIC, len(codes), len(metadata), *code_sections, *display_sections, *synonym_sections))
+    os.replace(tmp_path, path)
+    return len(codes)
+
+class TerminologyIndex:
+    """
+    Read-only view over an index file
+
+    The file is mapped with mmap, so every worker process that opens the same
+    file shares its pages through the OS page cache. Codes are found by binary
+    search over the sorted code pool.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+
+        magic, count, meta_length, *sections = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a terminology index: {path}")
+        metadata = json.loads(bytes(view[_HEADER.size:_HEADER.size + meta_length]))
+        self.system: str = metadata["system"]
+        self.version: str = metadata["version"]
+        self.count: int = count
+
+        code_offsets, code_pool, display_offsets, display_pool, synonym_offsets, synonym_pool = sections
+        self._code_offsets = view[code_offsets:code_offsets + 4 * (count + 1)].cast("I")
+        self._code_pool = code_pool
+        self._display_offsets = view[display_offsets:display_offsets + 4 * (count + 1)].cast("I")
+        self._display_pool = display_pool
+        self._synonym_offsets = view[synonym_offsets:synonym_offsets + 4 * (count + 1)].cast("I")
+        self._synonym_pool = synonym_pool
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, code: str) -> bool:
+        return self.find(code) >= 0
+
+    def _code_bytes(self, index: int) -> bytes:
+        start = self._code_pool + self._code_offsets[index]
+        return self._map[start:self._code_pool + self._code_offsets[index + 1]]
+
+    def find(self, code: str) -> int:
+        """
+        Binary search for a code
+
+        Args:
+            code: Concept code
+
+        Returns:
+            Position of the code, or -1 if absent
+        """
+        key = code.encode()
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._code_bytes(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.count and self._code_bytes(low) == key:
+            return low
+        return -1
+
+    def code_at(self, index: int) -> str:
+        return self._code_bytes(index).decode()
+
+    def display_at(self, index: int) -> str:
+        base = self._display_pool
+        return self._map[base + self._display_offsets[index]:base + self._display_offsets[index + 1]].decode()
+
+    def synonyms_at(self, index: int) -> List[str]:
+        base = self._synonym_pool
+        raw = self._map[base + self._synonym_offsets[index]:base + self._synonym_offsets[index + 1]]
+        return raw.decode().split(_SYNONYM_SEPARATOR) if raw else []
+
+    def lookup(self, code: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a concept by code
+
+        Args:
+            code: Concept code
+
+        Returns:
+            Concept code, display and synonyms, or None if not found
+        """
+        index = self.find(code)
+        if index < 0:
+            return None
+        return {
+            "code": code,
+            "display": self.display_at(index),
+            "synonyms": self.synonyms_at(index),
+        }
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.count))
+
+    def close(self) -> None:
+        for attr in ("_code_offsets", "_display_offsets", "_synonym_offsets"):
+            getattr(self, attr).release()
+        self._map.close()
+        self._file.close()
+
+class TerminologyStore:
+    """
+    Per-system indexes found in a directory as `<system>.idx` files
+
+    A `<system>.closure` file next to an index adds its is-a hierarchy; it is
+    ignored unless it was built from the same release version.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.indexes: Dict[str, TerminologyIndex] = {}
+        self.closures: Dict[str, Any] = {}
+        if directory and os.path.isdir(directory):
+            self.reload()
+
+    def reload(self) -> None:
+        """(Re)open every index and closure file in the directory"""
+        from app.services.terminology_closure import TerminologyClosure
+
+        indexes = {}
+        closures = {}
+        names = sorted(os.listdir(self.directory))
+        for name in names:
+            if name.endswith(".idx"):
+                index = TerminologyIndex(os.path.join(self.directory, name))
+                indexes[index.system] = index
+        for name in names:
+            if name.endswith(".closure"):
+                closure = TerminologyClosure(os.path.join(self.directory, name))
+                index = indexes.get(closure.system)
+                if index is not None and closure.version == index.version and len(closure) == len(index):
+                    closures[closure.system] = closure
+                else:
+                    closure.close()
+        self.indexes = indexes
+        self.closures = closures
+
+    def get(self, system: str) -> Optional[TerminologyIndex]:
+        return self.indexes.get(system)
+
+    def closure(self, system: str) -> Optional[Any]:
+        """Is-a closure for a system's loaded release, if one was built"""
+        return self.closures.get(system)
+
+    def __contains__(self, system: str) -> bool:
+        return system in self.indexes
+
+# Release file readers
+
+SNOMED_FSN_TYPE = "900000000000003001"
+SNOMED_US_ENGLISH_REFSET = "900000000000509007"
+SNOMED_PREFERRED = "900000000000548007"
+SNOMED_ACCEPTABLE = "900000000000549004"
+
+def iter_snomed_rf2(
+    concept_file: str,
+    description_file: str,
+    language_file: Optional[str] = None
+) -> Iterator[ConceptRecord]:
+    """
+    Read active concepts from RF2 snapshot Concept and Description files
+
+    With the language refset snapshot, the synonym preferred in US English
+    becomes the display and the synonyms acceptable in it come first among
+    the other terms. Without it, or for concepts without a preferred
+    synonym, the fully specified name is the display.
+    """
+    active = set()
+    with open(concept_file, encoding="utf-8") as handle:
+        reader = csv.reader(handle, delimiter="\t", quoting=csv.QUOTE_NONE)
+        next(reader)
+        for row in reader:
+            if row[2] == "1":
+                active.add(row[0])
+
+    acceptability: Dict[str, str] = {}
+    if language_file:
+        with open(language_file, encoding="utf-8") as handle:
+            reader = csv.reader(handle, delimiter="\t", quoting=csv.QUOTE_NONE)
+            next(reader)
+            for row in reader:
+                if row[2] == "1" and row[4] == SNOMED_US_ENGLISH_REFSET:
+                    acceptability[row[5]] = row[6]
+
+    # Synonym rank: preferred, acceptable, then not in the US English refset
+    ranks = {SNOMED_PREFERRED: 0, SNOMED_ACCEPTABLE: 1}
+    terms: Dict[str, Tuple[Optional[str], List[Tuple[int, str]]]] = {}
+    with open(description_file, encoding="utf-8") as handle:
+        reader = csv.reader(handle, delimiter="\t", quoting=csv.QUOTE_NONE)
+        next(reader)
+        for row in reader:
+            if row[2] != "1" or row[4] not in active:
+                continue
+            fsn, synonyms = terms.get(row[4], (None, []))
+            if row[6] == SNOMED_FSN_TYPE:
+                fsn = row[7]
+            else:
+                synonyms.append((ranks.get(acceptability.get(row[0]), 2), row[7]))
+            terms[row[4]] = (fsn, synonyms)
+
+    for concept_id in active:
+        fsn, synonyms = terms.get(concept_id, (None, []))
+        # Stable order regardless of file order: by rank, then term
+        names = [term for _, term in sorted(synonyms)]
+        if synonyms and min(synonyms)[0] == 0:
+            display, extra = names[0], names[1:] + ([fsn] if fsn else [])
+        else:
+            display, extra = fsn or (names[0] if names else ""), names if fsn else names[1:]
+        yield concept_id, display, extra
+
+# Term types in the order they are preferred as the display string
+_RXNORM_TTY_RANK = {tty: rank for rank, tty in enumerate(
+    ["SCD", "SBD", "GPCK", "BPCK", "IN", "PIN", "MIN", "BN", "SCDF", "SBDF", "SCDC", "DF", "SY", "TMSY"]
+)}
+
+def iter_rxnorm_rrf(rxnconso_file: str) -> Iterator[ConceptRecord]:
+    """Read RXNORM-sourced, unsuppressed atoms from RXNCONSO.RRF"""
+    concepts: Dict[str, List[Tuple[int, str]]] = {}
+    with open(rxnconso_file, encoding="utf-8") as handle:
+        for line in handle:
+            fields = line.rstrip("\n").split("|")
+            if fields[11] != "RXNORM" or fields[16] not in ("N", ""):
+                continue
+            rank = _RXNORM_TTY_RANK.get(fields[12], len(_RXNORM_TTY_RANK))
+            concepts.setdefault(fields[0], []).append((rank, fields[14]))
+
+    for rxcui, atoms in concepts.items():
+        atoms.sort()
+        names = list(dict.fromkeys(name for _, name in atoms))
+        yield rxcui, names[0], names[1:]
+
+def iter_loinc_csv(loinc_file: str) -> Iterator[ConceptRecord]:
+    """Read non-deprecated terms from Loinc.csv"""
+    with open(loinc_file, encoding="utf-8", newline="") as handle:
+        for row in csv.DictReader(handle):
+            if row.get("STATUS") == "DEPRECATED":
+                continue
+            synonyms = [name for name in (row.get("SHORTNAME"), row.get("CONSUMER_NAME")) if name]
+            yield row["LOINC_NUM"], row.get("LONG_COMMON_NAME") or row.get("COMPONENT", ""), synonyms
+
+def format_icd10cm_code(code: str) -> str:
+    """Insert the decimal point after the category (E119 -> E11.9)"""
+    return f"{code[:3]}.{code[3:]}" if len(code) > 3 else code
+
+def iter_icd10cm_order(order_file: str) -> Iterator[ConceptRecord]:
+    """Read the fixed-width icd10cm_order file (billable and header codes)"""
+    with open(order_file, encoding="utf-8") as handle:
+        for line in handle:
+            if len(line) < 16:
+                continue
+            code = line[6:13].strip()
+            short_description = line[16:76].strip()
+            long_description = line[77:].strip()
+            yield format_icd10cm_code(code), long_description, [short_description] if short_description else []
+
+def build_release(system: str, version: str, output_dir: str, files: List[str]) -> str:
+    """
+    Build the index for one terminology release
+
+    Args:
+        system: "snomed_ct", "rxnorm", "loinc" or "icd_10_cm"
+        version: Release version
+        output_dir: Directory for `<system>.idx`
+        files: Release files; SNOMED CT takes the Concept and Description
+            snapshot files and optionally the language refset snapshot,
+            the others a single file
+
+    Returns:
+        Path of the written index
+    """
+    readers = {
+        "snomed_ct": iter_snomed_rf2,
+        "rxnorm": iter_rxnorm_rrf,
+        "loinc": iter_loinc_csv,
+        "icd_10_cm": iter_icd10cm_order,
+    }
+    if system not in readers:
+        raise ValueError(f"Unsupported terminology system: {system}")
+    path = os.path.join(output_dir, f"{system}.idx")
+    build_index(path, system, version, readers[system](*files))
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a terminology index from release files")
+    parser.add_argument("system", choices=["snomed_ct", "rxnorm", "loinc", "icd_10_cm"])
+    parser.add_argument("version")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--output-dir", default="data/terminology")
+    args = parser.parse_args()
+    print(build_release(args.system, args.version, args.output_dir, args.files))
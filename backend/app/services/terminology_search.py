@@ -0,0 +1,256 @@
+"""
+Terminology Search
+Prefix completion and trigram fuzzy matching over concept descriptions
+"""
+
+from typing import Dict, List, Optional, Any, Tuple
+from bisect import bisect_left
+import re
+
+import numpy as np
+
+from app.services.terminology_index import TerminologyIndex
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse punctuation and whitespace to single spaces"""
+    return " ".join(_WORD.findall(text.lower()))
+
+def trigrams(text: str) -> List[str]:
+    """Distinct padded trigrams of each word (pg_trgm style)"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return list(grams)
+
+def _csr(keys: np.ndarray, values: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Group values by integer key into (offsets, postings) arrays"""
+    order = np.argsort(keys, kind="stable")
+    postings = values[order].astype(np.int32)
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=offsets[1:])
+    return offsets, postings
+
+class ConceptSearchIndex:
+    """
+    In-process search structures for one terminology release
+
+    Every display and synonym is a searchable term. Word prefixes resolve
+    through a sorted vocabulary with per-word posting lists; fuzzy matches
+    come from a trigram inverted index scored with the Dice coefficient.
+    Both are built once per release from a TerminologyIndex.
+    """
+
+    def __init__(self, index: TerminologyIndex):
+        self.index = index
+        self.system = index.system
+        self.version = index.version
+
+        term_concepts: List[int] = []
+        term_lengths: List[int] = []
+        term_preferred: List[bool] = []
+        word_ids: Dict[str, int] = {}
+        word_keys: List[int] = []
+        word_terms: List[int] = []
+        gram_ids: Dict[str, int] = {}
+        gram_keys: List[int] = []
+        gram_terms: List[int] = []
+        gram_counts: List[int] = []
+
+        for position in range(len(index)):
+            names = [index.display_at(position)] + index.synonyms_at(position)
+            for rank, name in enumerate(names):
+                text = normalize(name)
+                if not text:
+                    continue
+                term_id = len(term_concepts)
+                term_concepts.append(position)
+                term_lengths.append(len(text))
+                term_preferred.append(rank == 0)
+                for word in set(text.split()):
+                    word_keys.append(word_ids.setdefault(word, len(word_ids)))
+                    word_terms.append(term_id)
+                grams = trigrams(text)
+                gram_counts.append(len(grams))
+                for gram in grams:
+                    gram_keys.append(gram_ids.setdefault(gram, len(gram_ids)))
+                    gram_terms.append(term_id)
+
+        self.term_concepts = np.asarray(term_concepts, dtype=np.int32)
+        self.term_lengths = np.asarray(term_lengths, dtype=np.int32)
+        self.term_preferred = np.asarray(term_preferred, dtype=bool)
+        self.term_grams = np.asarray(gram_counts, dtype=np.int32)
+
+        # Vocabulary sorted alphabetically so a prefix maps to one contiguous run
+        vocabulary = sorted(word_ids)
+        rank_of = np.empty(len(word_ids), dtype=np.int64)
+        rank_of[[word_ids[word] for word in vocabulary]] = np.arange(len(vocabulary))
+        self.vocabulary = vocabulary
+        self.word_offsets, self.word_postings = _csr(
+            rank_of[np.asarray(word_keys, dtype=np.int64)],
+            np.asarray(word_terms, dtype=np.int32),
+            len(vocabulary)
+        )
+
+        self.gram_ids = gram_ids
+        self.gram_offsets, self.gram_postings = _csr(
+            np.asarray(gram_keys, dtype=np.int64),
+            np.asarray(gram_terms, dtype=np.int32),
+            len(gram_ids)
+        )
+
+    def __len__(self) -> int:
+        return len(self.term_concepts)
+
+    def sections(self) -> Dict[str, Any]:
+        """Arrays and string lists that make up the index, for a snapshot"""
+        return {
+            "term_concepts": self.term_concepts,
+            "term_lengths": self.term_lengths,
+            "term_preferred": self.term_preferred,
+            "term_grams": self.term_grams,
+            "vocabulary": self.vocabulary,
+            "word_offsets": self.word_offsets,
+            "word_postings": self.word_postings,
+            "grams": list(self.gram_ids),
+            "gram_offsets": self.gram_offsets,
+            "gram_postings": self.gram_postings,
+        }
+
+    @classmethod
+    def from_sections(cls, index: TerminologyIndex, sections: Dict[str, Any]) -> "ConceptSearchIndex":
+        """
+        Rebuild the index from sections() output without rescanning the release
+
+        Args:
+            index: The release the sections were built from
+            sections: Arrays (possibly memory-mapped) and string lists
+
+        Returns:
+            Search index over `index`
+        """
+        search_index = cls.__new__(cls)
+        search_index.index = index
+        search_index.system = index.system
+        search_index.version = index.version
+        for name in ("term_concepts", "term_lengths", "term_preferred", "term_grams",
+                     "vocabulary", "word_offsets", "word_postings", "gram_offsets", "gram_postings"):
+            setattr(search_index, name, sections[name])
+        search_index.gram_ids = {gram: gram_id for gram_id, gram in enumerate(sections["grams"])}
+        return search_index
+
+    def _prefix_postings(self, word: str) -> np.ndarray:
+        low = bisect_left(self.vocabulary, word)
+        high = bisect_left(self.vocabulary, word + "\uffff")
+        return self.word_postings[self.word_offsets[low]:self.word_offsets[high]]
+
+    def complete(self, query: str, limit: int = 10) -> List[Tuple[int, int, float]]:
+        """
+        Terms in which every query word is a prefix of some word
+
+        Args:
+            query: Partial search text
+            limit: Maximum number of concepts
+
+        Returns:
+            (concept_position, term_id, score) tuples, best first
+        """
+        words = normalize(query).split()
+        if not words:
+            return []
+
+        # Intersect per-word term masks, starting from the most selective word
+        matched: Optional[np.ndarray] = None
+        for word in sorted(words, key=len, reverse=True):
+            postings = self._prefix_postings(word)
+            if not len(postings):
+                return []
+            mask = np.zeros(len(self.term_concepts), dtype=bool)
+            mask[postings] = True
+            matched = mask if matched is None else matched & mask
+        candidates = np.flatnonzero(matched)
+        if not len(candidates):
+            return []
+
+        # Shorter terms and preferred displays rank higher
+        score = 1.0 + len(" ".join(words)) / self.term_lengths[candidates] + 0.05 * self.term_preferred[candidates]
+        return self._top_concepts(candidates, score, limit)
+
+    def fuzzy(self, query: str, limit: int = 10, threshold: float = 0.3) -> List[Tuple[int, int, float]]:
+        """
+        Trigram-similar terms for misspelled or partial queries
+
+        Args:
+            query: Search text
+            limit: Maximum number of concepts
+            threshold: Minimum Dice similarity
+
+        Returns:
+            (concept_position, term_id, score) tuples, best first
+        """
+        query_grams = trigrams(normalize(query))
+        grams = [self.gram_ids[gram] for gram in query_grams if gram in self.gram_ids]
+        if not grams:
+            return []
+
+        postings = np.concatenate([
+            self.gram_postings[self.gram_offsets[gram]:self.gram_offsets[gram + 1]] for gram in grams
+        ])
+        shared = np.bincount(postings, minlength=len(self.term_concepts))
+        candidates = np.flatnonzero(shared)
+        score = 2.0 * shared[candidates] / (len(query_grams) + self.term_grams[candidates])
+        keep = score >= threshold
+        return self._top_concepts(candidates[keep], score[keep], limit)
+
+    def _top_concepts(self, terms: np.ndarray, score: np.ndarray, limit: int) -> List[Tuple[int, int, float]]:
+        if not len(terms):
+            return []
+        # Over-fetch so concepts with several matching synonyms still fill `limit`
+        k = min(len(terms), limit * 4)
+        top = np.argpartition(-score, k - 1)[:k] if k < len(terms) else np.arange(len(terms))
+        top = top[np.lexsort((terms[top], -score[top]))]
+
+        results: List[Tuple[int, int, float]] = []
+        seen = set()
+        for i in top:
+            concept = int(self.term_concepts[terms[i]])
+            if concept in seen:
+                continue
+            seen.add(concept)
+            results.append((concept, int(terms[i]), float(score[i])))
+            if len(results) == limit:
+                break
+        return results
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Ranked prefix completions, topped up with fuzzy matches
+
+        Args:
+            query: Search text
+            limit: Maximum number of concepts
+
+        Returns:
+            Matching concepts with code, display and score
+        """
+        hits = self.complete(query, limit)
+        if len(hits) < limit:
+            seen = {concept for concept, _, _ in hits}
+            for hit in self.fuzzy(query, limit):
+                if hit[0] not in seen:
+                    hits.append(hit)
+                    seen.add(hit[0])
+                if len(hits) == limit:
+                    break
+
+        return [
+            {
+                "code": self.index.code_at(concept),
+                "display": self.index.display_at(concept),
+                "score": round(score, 4),
+            }
+            for concept, _, score in hits
+        ]
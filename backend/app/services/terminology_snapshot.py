@@ -0,0 +1,152 @@
+"""
+Terminology Snapshot
+Versioned, memory-mapped warm-start file for search structures and hot cache entries
+"""
+
+from typing import Dict, List, Optional, Any, Tuple, Union
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"TERMSNP1"
+SNAPSHOT_FILE = "terminology.snapshot"
+# magic, metadata offset, metadata length; the metadata is written last
+_HEADER = struct.Struct("<8sQQ")
+# Search vocabularies are normalised to [a-z0-9 ], so a newline never occurs in a value
+_STRING_SEPARATOR = b"\n"
+
+Section = Union[np.ndarray, List[str]]
+
+def _write_bytes(handle: Any, data: bytes) -> int:
+    padding = -handle.tell() % 8
+    if padding:
+        handle.write(b"\0" * padding)
+    position = handle.tell()
+    handle.write(data)
+    return position
+
+def write_snapshot(
+    path: str,
+    versions: Dict[str, Any],
+    groups: Dict[str, Dict[str, Section]],
+    cache_entries: Optional[Dict[str, List[Tuple[Any, Any, float]]]] = None
+) -> int:
+    """
+    Write a snapshot file
+
+    Args:
+        path: Output file path
+        versions: Release identity per system; a reader only trusts the
+            snapshot while its own releases match exactly
+        groups: Named groups of sections (e.g. search structures per system);
+            a section is a NumPy array or a list of strings
+        cache_entries: (key, value, remaining ttl) tuples per cache
+            namespace; keys and values must be JSON serialisable
+
+    Returns:
+        Size of the written file in bytes
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Several workers may write at once; each renames its own file into place
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    metadata: Dict[str, Any] = {"versions": versions, "created": time.time(), "groups": {}}
+    with open(tmp_path, "wb") as handle:
+        handle.write(b"\0" * _HEADER.size)
+        for group, sections in groups.items():
+            layout = metadata["groups"][group] = {}
+            for name, section in sections.items():
+                if isinstance(section, np.ndarray):
+                    array = np.ascontiguousarray(section)
+                    layout[name] = {"offset": _write_bytes(handle, array.tobytes()), "dtype": array.dtype.str, "count": len(array)}
+                else:
+                    data = _STRING_SEPARATOR.join(value.encode() for value in section)
+                    layout[name] = {"offset": _write_bytes(handle, data), "length": len(data), "count": len(section)}
+
+        entries = {
+            namespace: [[key, value, ttl] for key, value, ttl in items]
+            for namespace, items in (cache_entries or {}).items()
+        }
+        data = json.dumps(entries, separators=(",", ":")).encode()
+        metadata["cache"] = {"offset": _write_bytes(handle, data), "length": len(data)}
+
+        metadata_bytes = json.dumps(metadata).encode()
+        metadata_offset = _write_bytes(handle, metadata_bytes)
+        size = handle.tell()
+        handle.seek(0)
+        handle.write(_HEADER.pack(MAGIC, metadata_offset, len(metadata_bytes)))
+    os.replace(tmp_path, path)
+    return size
+
+class TerminologySnapshot:
+    """
+    Read-only view over a snapshot file
+
+    Array sections are NumPy views straight onto the mapping, so opening a
+    snapshot costs a few page faults rather than a rebuild, and worker
+    processes share the pages through the OS page cache. Arrays handed out
+    keep the mapping alive; only close a snapshot nothing was read from.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, metadata_offset, metadata_length = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a terminology snapshot: {path}")
+        metadata = json.loads(self._map[metadata_offset:metadata_offset + metadata_length])
+        self.versions: Dict[str, Any] = metadata["versions"]
+        self.created: float = metadata["created"]
+        self._groups: Dict[str, Dict[str, Dict[str, Any]]] = metadata["groups"]
+        self._cache: Dict[str, int] = metadata["cache"]
+
+    def __contains__(self, group: str) -> bool:
+        return group in self._groups
+
+    def group(self, group: str) -> Dict[str, Section]:
+        """
+        Sections of one group
+
+        Args:
+            group: Group name
+
+        Returns:
+            Arrays mapped in place, and string lists decoded from the file
+        """
+        sections: Dict[str, Section] = {}
+        for name, layout in self._groups[group].items():
+            offset = layout["offset"]
+            if "dtype" in layout:
+                sections[name] = np.frombuffer(self._map, dtype=np.dtype(layout["dtype"]), count=layout["count"], offset=offset)
+            elif layout["count"]:
+                data = self._map[offset:offset + layout["length"]]
+                sections[name] = data.decode().split(_STRING_SEPARATOR.decode())
+            else:
+                sections[name] = []
+        return sections
+
+    def cache_entries(self) -> Dict[str, List[Tuple[Any, Any, float]]]:
+        """
+        Cache entries saved with the snapshot
+
+        Returns:
+            (key, value, remaining ttl) tuples per namespace, most recently
+            used first; the time since the snapshot was written is already
+            taken off the ttl and expired entries are dropped
+        """
+        offset, length = self._cache["offset"], self._cache["length"]
+        elapsed = max(0.0, time.time() - self.created)
+        entries = json.loads(self._map[offset:offset + length])
+        return {
+            namespace: [(key, value, ttl - elapsed) for key, value, ttl in items if ttl > elapsed]
+            for namespace, items in entries.items()
+        }
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
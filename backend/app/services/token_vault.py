@@ -0,0 +1,182 @@
+"""
+PHI Token Vault
+Persistent token-to-value store with a bounded in-process LRU cache
+"""
+
+from typing import Dict, List, Optional, Tuple, Iterable, Union
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import hmac
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits bound parameters per statement; stay well under the default
+_MAX_PARAMS = 900
+_NONCE_BYTES = 12
+
+class TokenCollisionError(ValueError):
+    """A token is already stored for a different value"""
+
+class TokenVault:
+    """
+    SQLite-backed vault for reversible PHI tokens
+
+    The database file can be shared by every worker process on a host (WAL
+    mode), so tokens survive restarts and resolve in any worker. Recently used
+    tokens are kept in a size-bounded LRU cache in front of the database.
+
+    With a `key`, values are encrypted at rest with AES-GCM under a key
+    derived from it, bound to their token. Without one they are stored in
+    plaintext, which is only meant for in-memory vaults and tests.
+    """
+
+    def __init__(self, path: str = ":memory:", cache_size: int = 100000, key: Optional[Union[str, bytes]] = None):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._cipher = None
+        if key:
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+            if isinstance(key, str):
+                key = key.encode()
+            # Separate the encryption key from the token HMAC key
+            self._cipher = AESGCM(hmac.new(key, b"phi-token-vault-encryption", hashlib.sha256).digest())
+        elif path != ":memory:":
+            logger.warning(f"PHI token vault {path} stores values unencrypted; configure PHI_TOKEN_KEY")
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS phi_tokens ("
+                "token TEXT PRIMARY KEY, "
+                "phi_type TEXT NOT NULL, "
+                "value TEXT NOT NULL, "
+                "created_at TEXT NOT NULL"
+                ")"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def put_many(self, entries: Iterable[Tuple[str, str, str]]) -> None:
+        """
+        Store token mappings in one transaction
+
+        Tokens that are already stored for the same value are left as they
+        are. Values are cached only once the transaction has committed.
+
+        Args:
+            entries: (token, phi_type, value) triples
+
+        Raises:
+            TokenCollisionError: A token is already stored for a different
+                value; nothing from the batch is stored
+        """
+        created_at = datetime.now().isoformat()
+        with self._lock:
+            stored: Dict[str, str] = {}
+            try:
+                for token, phi_type, value in entries:
+                    known = stored.get(token, self._cache.get(token))
+                    if known is None:
+                        cursor = self.conn.execute(
+                            "INSERT OR IGNORE INTO phi_tokens (token, phi_type, value, created_at) VALUES (?, ?, ?, ?)",
+                            (token, phi_type, self._encrypt(token, value), created_at)
+                        )
+                        if not cursor.rowcount:
+                            row = self.conn.execute("SELECT value FROM phi_tokens WHERE token = ?", (token,)).fetchone()
+                            known = self._decrypt(token, row[0])
+                    if known is not None and known != value:
+                        raise TokenCollisionError(f"Token {token} is already stored for a different value")
+                    stored[token] = value
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+            for token, value in stored.items():
+                self._remember(token, value)
+
+    def put(self, token: str, phi_type: str, value: str) -> None:
+        """Store a single token mapping"""
+        self.put_many([(token, phi_type, value)])
+
+    def get_many(self, tokens: List[str]) -> List[Optional[str]]:
+        """
+        Resolve tokens, hitting the database once for all cache misses
+
+        Args:
+            tokens: Tokens to resolve
+
+        Returns:
+            Original values in input order, None for unknown tokens
+        """
+        found: Dict[str, str] = {}
+        with self._lock:
+            missing = []
+            for token in tokens:
+                value = self._cache.get(token)
+                if value is not None:
+                    self._cache.move_to_end(token)
+                    found[token] = value
+                elif token not in found:
+                    missing.append(token)
+
+            missing = list(dict.fromkeys(missing))
+            for offset in range(0, len(missing), _MAX_PARAMS):
+                batch = missing[offset:offset + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT token, value FROM phi_tokens WHERE token IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for token, value in rows:
+                    found[token] = self._decrypt(token, value)
+                    self._remember(token, found[token])
+
+        return [found.get(token) for token in tokens]
+
+    def get(self, token: str) -> Optional[str]:
+        """Resolve a single token"""
+        return self.get_many([token])[0]
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _encrypt(self, token: str, value: str) -> Union[str, bytes]:
+        if self._cipher is None:
+            return value
+        nonce = os.urandom(_NONCE_BYTES)
+        return nonce + self._cipher.encrypt(nonce, value.encode(), token.encode())
+
+    def _decrypt(self, token: str, stored: Union[str, bytes]) -> str:
+        # Rows written without a key hold plaintext TEXT
+        if isinstance(stored, str):
+            return stored
+        if self._cipher is None:
+            raise ValueError(f"Token {token} is encrypted and the vault has no key")
+        return self._cipher.decrypt(stored[:_NONCE_BYTES], stored[_NONCE_BYTES:], token.encode()).decode()
+
+    def _remember(self, token: str, value: str) -> None:
+        self._cache[token] = value
+        self._cache.move_to_end(token)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
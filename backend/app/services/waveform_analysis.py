@@ -0,0 +1,527 @@
+"""
+Waveform Analysis
+QRS detection, heart rate, HRV and rhythm flags over stored ECG records
+"""
+
+from typing import Dict, List, Optional, Any, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import ndimage, signal
+
+from app.models.domain import AIAnalysisResult, Finding, Recommendation
+from app.services.waveform_store import WaveformRecord
+
+# Detection runs on a decimated copy; the QRS band sits well below its Nyquist
+ANALYSIS_FS = 125.0
+QRS_BAND = (5.0, 15.0)
+INTEGRATION_SECONDS = 0.15
+# Shortest RR accepted by the detector (240 bpm)
+REFRACTORY_SECONDS = 0.25
+# Peak search around the integrated energy peak
+REFINE_SECONDS = 0.075
+# Adaptive threshold: fraction of the running median of local energy maxima
+THRESHOLD_WINDOW_SECONDS = 2.0
+THRESHOLD_WINDOWS = 5
+THRESHOLD_FRACTION = 0.3
+# Blocks are filtered with this much signal on each side and only beats in
+# the block core are kept, so filter edges never reach a reported beat
+BLOCK_SECONDS = 300.0
+OVERLAP_SECONDS = 2.0
+
+BRADYCARDIA_BPM = 50.0
+TACHYCARDIA_BPM = 100.0
+PAUSE_SECONDS = 2.0
+# Minimum valid RR time in a minute or 5-minute segment for its rate to count
+MINUTE_COVERAGE_SECONDS = 30.0
+SEGMENT_SECONDS = 300.0
+# RR intervals further than this from the local median are not NN intervals
+NN_TOLERANCE = 0.2
+# Irregular rhythm: median successive RR difference relative to the median
+# RR, and turning point ratio, over sliding windows of RR intervals. Medians
+# keep an isolated premature beat from flagging its windows
+IRREGULAR_WINDOW_BEATS = 32
+IRREGULAR_SPREAD = 0.08
+IRREGULAR_TPR = (0.54, 0.77)
+IRREGULAR_MIN_SECONDS = 30.0
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end (exclusive) positions of the True runs of a boolean array"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+def _scale(values: np.ndarray) -> np.ndarray:
+    """Per-lead 99th percentile of (leads, samples) values, from every fourth sample"""
+    return np.percentile(values[:, ::4], 99, axis=1, keepdims=True)
+
+def _span(seconds: float) -> str:
+    return f"{seconds / 3600:.1f} h" if seconds >= 3600 else f"{seconds / 60:.1f} min"
+
+def _round(value: float, digits: int = 1) -> float:
+    return round(float(value), digits)
+
+class WaveformAnalyzer:
+    """
+    Rhythm analysis of long ECG recordings
+
+    The record is read in overlapping blocks straight from its memory-mapped
+    chunks and decimated to ANALYSIS_FS. Each block is band-pass filtered,
+    differentiated, squared and integrated for all selected leads at once;
+    the per-lead energies are normalized and summed into one detection
+    signal, so a beat missed on a noisy lead is still found on the others.
+    RR intervals, per-minute rates, HRV and arrhythmia flags are then
+    computed over the whole recording with array operations.
+    """
+
+    def __init__(self, analysis_fs: float = ANALYSIS_FS, block_seconds: float = BLOCK_SECONDS):
+        self.analysis_fs = analysis_fs
+        self.block_seconds = block_seconds
+
+    def detect_beats(
+        self,
+        record: WaveformRecord,
+        lead_ids: List[int],
+        start_sample: int,
+        end_sample: int
+    ) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Detect QRS complexes in a sample range
+
+        Args:
+            record: Stored record
+            lead_ids: Lead positions to combine
+            start_sample: First sample
+            end_sample: Sample after the last one
+
+        Returns:
+            (beat times in seconds from the start of the record, missing-data
+            mask at the analysis rate, analysis rate)
+        """
+        factor = max(1, int(round(record.fs / self.analysis_fs)))
+        fs = record.fs / factor
+        total = (end_sample - start_sample) // factor
+        missing = np.zeros(total, dtype=bool)
+        invalid = record.invalid[lead_ids][:, None] if record.invalid is not None else None
+
+        sos = signal.butter(2, QRS_BAND, btype="band", fs=fs, output="sos")
+        integration = max(1, int(round(INTEGRATION_SECONDS * fs)))
+        refine = max(1, int(round(REFINE_SECONDS * fs)))
+        threshold_window = max(1, int(round(THRESHOLD_WINDOW_SECONDS * fs)))
+        block = max(threshold_window, int(self.block_seconds * fs))
+        overlap = int(OVERLAP_SECONDS * fs)
+
+        beats = []
+        for core_start in range(0, total, block):
+            core_end = min(total, core_start + block)
+            first = max(0, core_start - overlap)
+            last = min(total, core_end + overlap)
+            if last - first <= 3 * (2 * len(sos) + 1):
+                continue
+
+            digital = record.read_digital(start_sample + first * factor, start_sample + last * factor, lead_ids)
+            digital = digital.reshape(len(lead_ids), last - first, factor)
+            # Gains and baselines drop out: the band-pass removes offsets and
+            # every lead is normalized to its own energy below. Summing the
+            # strided phases is much faster than a reduction over a short axis
+            samples = digital[:, :, 0].astype(np.float32)
+            for phase in range(1, factor):
+                samples += digital[:, :, phase]
+            samples /= factor
+            if invalid is not None and (digital == invalid[:, :, None]).any():
+                gaps = digital[:, :, 0] == invalid
+                for phase in range(1, factor):
+                    gaps |= digital[:, :, phase] == invalid
+                # Fill with the lead's level so gaps do not add steps
+                present = np.where(gaps, 0.0, samples).sum(axis=1) / np.maximum((~gaps).sum(axis=1), 1)
+                samples = np.where(gaps, present[:, None].astype(np.float32), samples)
+                missing[core_start:core_end] = gaps.any(axis=0)[core_start - first:core_end - first]
+
+            filtered = signal.sosfiltfilt(sos, samples, axis=1)
+            slope = np.diff(filtered, axis=1, prepend=filtered[:, :1]) ** 2
+            slope_scale = _scale(slope)
+            amplitude = np.abs(filtered)
+            amplitude_scale = _scale(amplitude)
+            # Flat leads have no scale and are left out of the sum
+            active = slope_scale[:, 0] > 0
+            if not active.any():
+                continue
+            energy = (slope[active] / slope_scale[active]).sum(axis=0)
+            energy = ndimage.uniform_filter1d(energy, integration)
+            combined = (amplitude[active] / amplitude_scale[active]).sum(axis=0)
+
+            threshold = self._threshold(energy, threshold_window)
+            peaks, _ = signal.find_peaks(energy, distance=int(REFRACTORY_SECONDS * fs))
+            peaks = peaks[energy[peaks] >= threshold[peaks]]
+            if not len(peaks):
+                continue
+
+            # R peak: largest band-passed deflection near the energy peak,
+            # with parabolic interpolation between samples
+            offsets = np.arange(-refine, refine + 1)
+            window = np.clip(peaks[:, None] + offsets, 0, len(combined) - 1)
+            peaks = window[np.arange(len(peaks)), combined[window].argmax(axis=1)]
+            left = combined[np.maximum(peaks - 1, 0)]
+            center = combined[peaks]
+            right = combined[np.minimum(peaks + 1, len(combined) - 1)]
+            curvature = left - 2 * center + right
+            shift = np.divide(0.5 * (left - right), curvature, out=np.zeros_like(center), where=curvature < 0)
+            positions = first + peaks + np.clip(shift, -0.5, 0.5)
+
+            beats.append(positions[(positions >= core_start) & (positions < core_end)])
+
+        positions = np.concatenate(beats) if beats else np.zeros(0)
+        positions = np.unique(positions)
+        if len(positions) > 1:
+            # Refinement can pull two neighbouring energy peaks onto one beat
+            keep = np.concatenate([[True], np.diff(positions) >= REFRACTORY_SECONDS * fs * 0.8])
+            positions = positions[keep]
+        # Decimated samples sit at the centre of the samples they average
+        times = (start_sample + positions * factor + (factor - 1) / 2) / record.fs
+        return times, missing, fs
+
+    def _threshold(self, energy: np.ndarray, window: int) -> np.ndarray:
+        """Per-sample detection threshold following the local beat energy"""
+        count = -(-len(energy) // window)
+        padded = np.zeros(count * window, dtype=energy.dtype)
+        padded[:len(energy)] = energy
+        maxima = padded.reshape(count, window).max(axis=1)
+        local = ndimage.median_filter(maxima, size=THRESHOLD_WINDOWS, mode="nearest")
+        # Floor keeps noise in pauses and flat segments below the threshold
+        local = np.maximum(local, 0.1 * np.median(maxima))
+        return np.repeat(THRESHOLD_FRACTION * local, window)[:len(energy)]
+
+    def rhythm_features(self, times: np.ndarray, rr_valid: np.ndarray, duration: float) -> Dict[str, Any]:
+        """
+        RR interval statistics and arrhythmia flags
+
+        Args:
+            times: Beat times in seconds
+            rr_valid: Per-interval mask; False for RR spanning missing data
+            duration: Analyzed duration in seconds
+
+        Returns:
+            Rate, HRV and rhythm measurements
+        """
+        rr = np.diff(times)
+        valid = rr_valid
+        median = ndimage.median_filter(rr, size=9, mode="nearest")
+        nn = valid & (np.abs(rr - median) <= NN_TOLERANCE * median)
+        analyzed = float(rr[valid].sum())
+
+        features: Dict[str, Any] = {
+            "beats": len(times),
+            "analyzed_seconds": analyzed,
+            "coverage": analyzed / duration if duration else 0.0,
+            "nn_intervals": int(nn.sum()),
+        }
+        if not nn.any():
+            return features
+
+        # Per-minute rates from all valid intervals, by the minute each ends in
+        minute = (times[1:] // 60).astype(np.int64)
+        counts = np.bincount(minute[valid], minlength=int(minute[-1]) + 1)
+        seconds = np.bincount(minute[valid], weights=rr[valid], minlength=int(minute[-1]) + 1)
+        covered = seconds >= MINUTE_COVERAGE_SECONDS
+        rates = np.full(len(counts), np.nan)
+        rates[covered] = 60.0 * counts[covered] / seconds[covered]
+
+        nn_rr = rr[nn]
+        pairs = nn[:-1] & nn[1:]
+        successive = np.diff(rr)[pairs]
+        features.update({
+            "mean_hr": 60.0 / nn_rr.mean(),
+            "min_hr": float(np.nanmin(rates)) if covered.any() else np.nan,
+            "max_hr": float(np.nanmax(rates)) if covered.any() else np.nan,
+            "mean_nn_ms": nn_rr.mean() * 1000,
+            "sdnn_ms": nn_rr.std() * 1000,
+            "rmssd_ms": np.sqrt(np.mean(successive ** 2)) * 1000 if len(successive) else np.nan,
+            "pnn50": np.mean(np.abs(successive) > 0.05) * 100 if len(successive) else np.nan,
+        })
+
+        segment = (times[1:][nn] // SEGMENT_SECONDS).astype(np.int64)
+        segment_seconds = np.bincount(segment, weights=nn_rr)
+        segment_counts = np.bincount(segment)
+        segment_squares = np.bincount(segment, weights=nn_rr ** 2)
+        full = segment_seconds >= SEGMENT_SECONDS / 2
+        if full.sum() >= 2:
+            means = segment_seconds[full] / segment_counts[full]
+            spreads = np.sqrt(np.maximum(segment_squares[full] / segment_counts[full] - means ** 2, 0))
+            features["sdann_ms"] = means.std() * 1000
+            features["sdnn_index_ms"] = spreads.mean() * 1000
+
+        features["bradycardia"] = self._rate_episodes(covered & (rates < BRADYCARDIA_BPM), rates, np.min)
+        features["tachycardia"] = self._rate_episodes(covered & (rates > TACHYCARDIA_BPM), rates, np.max)
+
+        pauses = valid & (rr > PAUSE_SECONDS)
+        features["pauses"] = {
+            "count": int(pauses.sum()),
+            "longest_seconds": float(rr[pauses].max()) if pauses.any() else 0.0,
+            "times": times[:-1][pauses],
+        }
+
+        irregular = self._irregular_intervals(rr, valid)
+        starts, ends = _runs(irregular)
+        elapsed = np.concatenate([[0.0], np.cumsum(rr)])
+        episode_seconds = elapsed[ends] - elapsed[starts]
+        sustained = episode_seconds >= IRREGULAR_MIN_SECONDS
+        features["irregular"] = {
+            "episodes": int(sustained.sum()),
+            "seconds": float(episode_seconds[sustained].sum()),
+            "longest_seconds": float(episode_seconds.max()) if len(episode_seconds) else 0.0,
+            "burden": float(episode_seconds[sustained].sum()) / analyzed if analyzed else 0.0,
+        }
+
+        # Premature beat: short interval followed by a compensatory long one,
+        # outside irregular stretches where every interval varies
+        early = valid[:-1] & valid[1:] & (rr[:-1] < 0.8 * median[:-1]) & (rr[1:] > 1.1 * median[1:])
+        early &= ~irregular[:-1]
+        features["premature"] = {
+            "count": int(early.sum()),
+            "per_hour": early.sum() / (analyzed / 3600) if analyzed else 0.0,
+        }
+        return features
+
+    def _rate_episodes(self, minutes: np.ndarray, rates: np.ndarray, extreme: Any) -> Dict[str, Any]:
+        """Runs of flagged minutes and the most extreme minute rate among them"""
+        starts, ends = _runs(minutes)
+        return {
+            "minutes": int(minutes.sum()),
+            "episodes": len(starts),
+            "longest_minutes": int((ends - starts).max()) if len(starts) else 0,
+            "extreme_hr": float(extreme(rates[minutes])) if minutes.any() else np.nan,
+            "first_minute": int(starts[0]) if len(starts) else 0,
+        }
+
+    def _irregular_intervals(self, rr: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        """RR intervals inside windows with an irregularly irregular pattern"""
+        flagged = np.zeros(len(rr), dtype=bool)
+        if len(rr) < IRREGULAR_WINDOW_BEATS:
+            return flagged
+        windows = sliding_window_view(rr, IRREGULAR_WINDOW_BEATS)
+        complete = sliding_window_view(valid, IRREGULAR_WINDOW_BEATS).all(axis=1)
+        steps = np.diff(windows, axis=1)
+        spread = np.median(np.abs(steps), axis=1) / np.median(windows, axis=1)
+        turning = (steps[:, :-1] * steps[:, 1:] < 0).sum(axis=1) / (IRREGULAR_WINDOW_BEATS - 2)
+        irregular = complete & (spread > IRREGULAR_SPREAD) & (turning > IRREGULAR_TPR[0]) & (turning < IRREGULAR_TPR[1])
+
+        # Mark every interval covered by a flagged window
+        cover = np.zeros(len(rr) + 1, dtype=np.int64)
+        starts = np.flatnonzero(irregular)
+        np.add.at(cover, starts, 1)
+        np.add.at(cover, starts + IRREGULAR_WINDOW_BEATS, -1)
+        return np.cumsum(cover[:-1]) > 0
+
+    def analyze(
+        self,
+        record: WaveformRecord,
+        leads: Optional[List[str]] = None,
+        start: float = 0.0,
+        end: Optional[float] = None
+    ) -> AIAnalysisResult:
+        """
+        Analyze the rhythm of a record
+
+        Args:
+            record: Stored record
+            leads: Lead names to combine (all leads if None)
+            start: Start in seconds from the start of the record
+            end: End in seconds (end of record if None)
+
+        Returns:
+            Rate, HRV and arrhythmia findings
+        """
+        lead_ids = record.lead_ids(leads)
+        start_sample, end_sample = record.sample_range(start, record.duration if end is None else end)
+        duration = (end_sample - start_sample) / record.fs
+        location = f"Leads {', '.join(record.leads[lead] for lead in lead_ids)}"[:100]
+
+        times, missing, fs = self.detect_beats(record, lead_ids, start_sample, end_sample)
+        warnings = ["Automated rhythm analysis; findings require review by a clinician"]
+        if missing.any():
+            warnings.append(f"{missing.mean() * 100:.2f}% of the analyzed samples are missing")
+        if len(times) < 3:
+            return AIAnalysisResult(
+                summary=f"No QRS complexes detected in {_span(duration)} of {location}",
+                confidence=0.0,
+                warnings=warnings + ["No rhythm measurements: too few beats detected"]
+            )
+
+        # RR intervals spanning missing data are not intervals
+        decimated = np.clip(np.round((times * record.fs - start_sample) / (record.fs / fs)).astype(np.int64), 0, len(missing) - 1)
+        gaps = np.add.reduceat(missing.astype(np.int32), decimated)[:-1] if missing.any() else np.zeros(len(times) - 1)
+        features = self.rhythm_features(times, gaps == 0, duration)
+        quality = min(1.0, features["coverage"])
+        if quality < 0.8:
+            warnings.append(f"Only {quality * 100:.0f}% of the recording yielded valid RR intervals")
+
+        findings = self._findings(features, location, quality)
+        recommendations = self._recommendations(findings)
+        abnormal = [finding for finding in findings if finding.severity != "low"]
+        summary = (
+            f"{features['beats']} beats over {_span(duration)}"
+            + (f", mean heart rate {features['mean_hr']:.0f} bpm" if "mean_hr" in features else "")
+            + (f"; {', '.join(finding.type.replace('_', ' ') for finding in abnormal)}" if abnormal else "; no rhythm abnormalities flagged")
+        )
+        return AIAnalysisResult(
+            summary=summary,
+            findings=findings,
+            recommendations=recommendations,
+            confidence=round(0.9 * quality, 3),
+            warnings=warnings
+        )
+
+    def _findings(self, features: Dict[str, Any], location: str, quality: float) -> List[Finding]:
+        findings: List[Finding] = []
+        if "mean_hr" not in features:
+            return findings
+
+        findings.append(Finding(
+            type="heart_rate",
+            description=(
+                f"Mean heart rate {features['mean_hr']:.0f} bpm"
+                + (f", minute rates {features['min_hr']:.0f}-{features['max_hr']:.0f} bpm" if not np.isnan(features["min_hr"]) else "")
+            ),
+            severity="low",
+            confidence=round(0.95 * quality, 3),
+            location=location,
+            measurements={
+                "beats": float(features["beats"]),
+                **{key: _round(features[key]) for key in ("mean_hr", "min_hr", "max_hr") if not np.isnan(features[key])}
+            }
+        ))
+
+        hrv = {
+            key: _round(features[key])
+            for key in ("mean_nn_ms", "sdnn_ms", "rmssd_ms", "pnn50", "sdann_ms", "sdnn_index_ms")
+            if key in features and not np.isnan(features[key])
+        }
+        # SDNN below 50 ms over a near-24 h recording marks depressed HRV
+        reduced = features["analyzed_seconds"] >= 18 * 3600 and features["sdnn_ms"] < 50
+        findings.append(Finding(
+            type="heart_rate_variability",
+            description=(
+                f"SDNN {features['sdnn_ms']:.0f} ms, RMSSD {features.get('rmssd_ms', np.nan):.0f} ms"
+                + (" (reduced heart rate variability)" if reduced else "")
+            ),
+            severity="medium" if reduced else "low",
+            confidence=round(0.85 * quality, 3),
+            location=location,
+            measurements=hrv
+        ))
+
+        brady = features["bradycardia"]
+        if brady["minutes"]:
+            findings.append(Finding(
+                type="bradycardia",
+                description=(
+                    f"Heart rate below {BRADYCARDIA_BPM:.0f} bpm for {brady['minutes']} min "
+                    f"in {brady['episodes']} episode(s), lowest {brady['extreme_hr']:.0f} bpm"
+                ),
+                severity="medium" if brady["extreme_hr"] < 40 else "low",
+                confidence=round(0.85 * quality, 3),
+                location=location,
+                measurements={
+                    "minutes": float(brady["minutes"]),
+                    "episodes": float(brady["episodes"]),
+                    "longest_minutes": float(brady["longest_minutes"]),
+                    "min_hr": _round(brady["extreme_hr"]),
+                    "onset_seconds": float(brady["first_minute"] * 60),
+                }
+            ))
+
+        tachy = features["tachycardia"]
+        if tachy["minutes"]:
+            findings.append(Finding(
+                type="tachycardia",
+                description=(
+                    f"Heart rate above {TACHYCARDIA_BPM:.0f} bpm for {tachy['minutes']} min "
+                    f"in {tachy['episodes']} episode(s), highest {tachy['extreme_hr']:.0f} bpm"
+                ),
+                severity="medium" if tachy["extreme_hr"] >= 150 else "low",
+                confidence=round(0.85 * quality, 3),
+                location=location,
+                measurements={
+                    "minutes": float(tachy["minutes"]),
+                    "episodes": float(tachy["episodes"]),
+                    "longest_minutes": float(tachy["longest_minutes"]),
+                    "max_hr": _round(tachy["extreme_hr"]),
+                    "onset_seconds": float(tachy["first_minute"] * 60),
+                }
+            ))
+
+        pauses = features["pauses"]
+        if pauses["count"]:
+            findings.append(Finding(
+                type="pause",
+                description=(
+                    f"{pauses['count']} pause(s) longer than {PAUSE_SECONDS:.1f} s, "
+                    f"longest {pauses['longest_seconds']:.1f} s"
+                ),
+                severity="high" if pauses["longest_seconds"] >= 3.0 else "medium",
+                confidence=round(0.85 * quality, 3),
+                location=location,
+                measurements={
+                    "count": float(pauses["count"]),
+                    "longest_seconds": _round(pauses["longest_seconds"], 2),
+                    "first_seconds": _round(pauses["times"][0]),
+                }
+            ))
+
+        irregular = features["irregular"]
+        if irregular["episodes"]:
+            findings.append(Finding(
+                type="irregular_rhythm",
+                description=(
+                    f"Irregularly irregular RR intervals suggestive of atrial fibrillation: "
+                    f"{irregular['episodes']} episode(s), {irregular['burden'] * 100:.1f}% burden"
+                ),
+                severity="high" if irregular["burden"] >= 0.3 else "medium",
+                confidence=round(0.7 * quality, 3),
+                location=location,
+                measurements={
+                    "episodes": float(irregular["episodes"]),
+                    "seconds": _round(irregular["seconds"]),
+                    "longest_seconds": _round(irregular["longest_seconds"]),
+                    "burden_percent": _round(irregular["burden"] * 100, 2),
+                }
+            ))
+
+        premature = features["premature"]
+        if premature["count"]:
+            frequent = premature["per_hour"] > 30
+            findings.append(Finding(
+                type="premature_beats",
+                description=(
+                    f"{premature['count']} premature beat(s) with compensatory pause, "
+                    f"{premature['per_hour']:.1f} per hour" + (" (frequent)" if frequent else "")
+                ),
+                severity="medium" if frequent else "low",
+                confidence=round(0.7 * quality, 3),
+                location=location,
+                measurements={
+                    "count": float(premature["count"]),
+                    "per_hour": _round(premature["per_hour"], 2),
+                }
+            ))
+        return findings
+
+    def _recommendations(self, findings: List[Finding]) -> List[Recommendation]:
+        urgent = [finding for finding in findings if finding.severity in ("high", "critical")]
+        if urgent:
+            return [Recommendation(
+                type="consultation",
+                description="Cardiology review of the flagged rhythm episodes",
+                priority="high",
+                rationale=f"Automated analysis flagged {', '.join(finding.description for finding in urgent)}"[:1000]
+            )]
+        if any(finding.severity == "medium" for finding in findings):
+            return [Recommendation(
+                type="monitoring",
+                description="Review flagged episodes and consider repeat ambulatory monitoring",
+                priority="medium",
+                rationale="Automated analysis flagged rhythm findings of moderate severity"
+            )]
+        return []
+
+# Global instance
+waveform_analyzer = WaveformAnalyzer()
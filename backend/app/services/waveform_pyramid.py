@@ -0,0 +1,205 @@
+"""
+Waveform Pyramid
+Multi-resolution min/max envelopes for drawing long records at screen resolution
+"""
+
+from typing import Dict, List, Optional, Any, Tuple
+import os
+
+import numpy as np
+
+# Samples per bucket at the finest level, and the reduction between levels
+BASE_BUCKET = 16
+FACTOR = 4
+
+_INT16_MIN, _INT16_MAX = np.iinfo(np.int16).min, np.iinfo(np.int16).max
+# Stands in for leads without an invalid value; no int16 sample equals it
+_NO_SENTINEL = _INT16_MAX + 1
+
+def sentinels(invalid_values: Optional[List[Optional[int]]]) -> Optional[np.ndarray]:
+    """
+    Per-lead invalid values as an array to compare samples against
+
+    Args:
+        invalid_values: ADC value marking missing samples, per lead (None
+            for leads without one)
+
+    Returns:
+        (leads,) int32 array, or None if no lead has an invalid value
+    """
+    if not invalid_values or all(value is None for value in invalid_values):
+        return None
+    return np.array([_NO_SENTINEL if value is None else value for value in invalid_values], dtype=np.int32)
+
+def level_file(level: int) -> str:
+    return f"envelope_{level}.i16"
+
+def _reduce(values: np.ndarray, group: int) -> np.ndarray:
+    """Fold (n * group, leads, 2) envelopes into (n, leads, 2)"""
+    grouped = values.reshape(-1, group, *values.shape[1:])
+    return np.stack([grouped[..., 0].min(axis=1), grouped[..., 1].max(axis=1)], axis=-1)
+
+def envelope(samples: np.ndarray, invalid: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Per-sample envelope of raw samples
+
+    Args:
+        samples: (samples, leads) int16 array
+        invalid: Per-lead invalid values from sentinels()
+
+    Returns:
+        (samples, leads, 2) min/max array; missing samples get an empty
+        envelope (min > max) that any real sample overrides when reduced
+    """
+    mins = samples
+    maxs = samples
+    if invalid is not None:
+        missing = samples == invalid
+        mins = np.where(missing, _INT16_MAX, samples).astype(np.int16)
+        maxs = np.where(missing, _INT16_MIN, samples).astype(np.int16)
+    return np.stack([mins, maxs], axis=-1)
+
+class EnvelopeBuilder:
+    """
+    Streams samples into a min/max pyramid, one file per level
+
+    Level 0 buckets hold BASE_BUCKET samples and each further level FACTOR
+    buckets of the one below, so the pyramid adds about a sixth of the raw
+    size. Levels are appended as samples arrive; only a partial bucket per
+    level is held in memory. Buckets are stored as (bucket, lead, min/max)
+    int16 in ADC units.
+    """
+
+    def __init__(self, directory: str, lead_count: int, invalid_values: Optional[List[Optional[int]]] = None):
+        self.directory = directory
+        self.lead_count = lead_count
+        self.invalid = sentinels(invalid_values)
+        self._raw = np.zeros((0, lead_count), dtype=np.int16)
+        self._handles: List[Any] = []
+        self._pending: List[np.ndarray] = []
+        self.counts: List[int] = []
+
+    def add(self, samples: np.ndarray) -> None:
+        """
+        Add samples in record order
+
+        Args:
+            samples: (samples, leads) int16 array
+        """
+        raw = np.concatenate([self._raw, samples]) if len(self._raw) else samples
+        whole = len(raw) - len(raw) % BASE_BUCKET
+        if whole:
+            self._append(0, _reduce(envelope(raw[:whole], self.invalid), BASE_BUCKET))
+        self._raw = raw[whole:].copy()
+
+    def _append(self, level: int, buckets: np.ndarray) -> None:
+        if level == len(self._handles):
+            self._handles.append(open(os.path.join(self.directory, level_file(level)), "wb"))
+            self._pending.append(np.zeros((0, self.lead_count, 2), dtype=np.int16))
+            self.counts.append(0)
+        self._handles[level].write(np.ascontiguousarray(buckets, dtype=np.int16).tobytes())
+        self.counts[level] += len(buckets)
+
+        pending = np.concatenate([self._pending[level], buckets])
+        whole = len(pending) - len(pending) % FACTOR
+        self._pending[level] = pending[whole:]
+        if whole:
+            self._append(level + 1, _reduce(pending[:whole], FACTOR))
+
+    def close(self) -> List[Dict[str, int]]:
+        """
+        Flush partial buckets and close the level files
+
+        Returns:
+            Bucket size in samples and bucket count per level
+        """
+        if len(self._raw):
+            self._append(0, _reduce(envelope(self._raw, self.invalid), len(self._raw)))
+            self._raw = self._raw[:0]
+        level = 0
+        # Partial buckets roll up until one level holds a single bucket
+        while level < len(self._handles):
+            pending = self._pending[level]
+            if len(pending) and (level + 1 < len(self._handles) or self.counts[level] > 1):
+                self._pending[level] = pending[:0]
+                self._append(level + 1, _reduce(pending, len(pending)))
+            level += 1
+        for handle in self._handles:
+            handle.close()
+        return [
+            {"bucket": BASE_BUCKET * FACTOR ** level, "buckets": count}
+            for level, count in enumerate(self.counts)
+        ]
+
+class EnvelopePyramid:
+    """
+    Memory-mapped pyramid levels of one record
+
+    A window drawn at `pixels` columns reads the coarsest level whose
+    buckets are no wider than a pixel, so at most about FACTOR * pixels
+    buckets per lead are touched whatever the window length.
+    """
+
+    def __init__(self, path: str, levels: List[Dict[str, int]], lead_count: int):
+        self.levels = levels
+        self.buckets = [level["bucket"] for level in levels]
+        self._maps = [
+            np.memmap(os.path.join(path, level_file(index)), dtype=np.int16, mode="r", shape=(level["buckets"], lead_count, 2))
+            if level["buckets"] else np.zeros((0, lead_count, 2), dtype=np.int16)
+            for index, level in enumerate(levels)
+        ]
+
+    def level_for(self, samples_per_pixel: float) -> int:
+        """Coarsest level with buckets no wider than a pixel, or -1 for raw samples"""
+        return int(np.searchsorted(self.buckets, samples_per_pixel, side="right")) - 1
+
+    def read(self, level: int, first: int, last: int, lead_ids: List[int]) -> np.ndarray:
+        """(buckets, leads, 2) envelopes of buckets [first, last) of a level"""
+        return np.asarray(self._maps[level][first:last, lead_ids])
+
+def render(
+    record: Any,
+    start: int,
+    end: int,
+    lead_ids: List[int],
+    pixels: int,
+    pyramid: Optional[EnvelopePyramid] = None
+) -> Tuple[np.ndarray, int]:
+    """
+    Min/max envelope of a sample range folded to a fixed number of columns
+
+    Args:
+        record: WaveformRecord to read raw samples from
+        start: First sample
+        end: Sample after the last one
+        lead_ids: Lead positions
+        pixels: Number of columns
+        pyramid: The record's pyramid (raw samples only if None)
+
+    Returns:
+        ((leads, pixels, 2) int16 envelopes, samples per source bucket);
+        columns without samples have min > max
+    """
+    samples_per_pixel = (end - start) / pixels
+    level = pyramid.level_for(samples_per_pixel) if pyramid is not None else -1
+    bucket = pyramid.buckets[level] if level >= 0 else 1
+
+    # Column p starts in the bucket holding sample start + p * samples_per_pixel
+    first = start // bucket
+    last = max(first + 1, -(-end // bucket))
+    column_starts = (start + np.arange(pixels) * samples_per_pixel) // bucket - first
+    column_starts = np.minimum(column_starts.astype(np.int64), last - first - 1)
+
+    if level >= 0:
+        source = pyramid.read(level, first, last, lead_ids)
+    else:
+        digital = record.read_digital(first, last, lead_ids)
+        source = envelope(digital.T, record.invalid[lead_ids] if record.invalid is not None else None)
+    if not len(source):
+        empty = np.empty((len(lead_ids), pixels, 2), dtype=np.int16)
+        empty[..., 0], empty[..., 1] = _INT16_MAX, _INT16_MIN
+        return empty, bucket
+
+    mins = np.minimum.reduceat(source[..., 0], column_starts, axis=0)
+    maxs = np.maximum.reduceat(source[..., 1], column_starts, axis=0)
+    return np.stack([mins, maxs], axis=-1).transpose(1, 0, 2), bucket
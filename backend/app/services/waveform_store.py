@@ -0,0 +1,604 @@
+"""
+Waveform Store
+Chunked int16 signal storage converted from WFDB and EDF, with memory-mapped range reads
+"""
+
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple
+from collections import OrderedDict
+from datetime import datetime
+import argparse
+import json
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.waveform_pyramid import BASE_BUCKET, FACTOR, EnvelopeBuilder, EnvelopePyramid, render, sentinels
+
+META_FILE = "meta.json"
+SIGNALS_FILE = "signals.i16"
+CHUNKS_FILE = "chunks.npy"
+
+# One row per chunk: first sample, sample count, start time in seconds from
+# the start of the record and byte offset of the chunk in SIGNALS_FILE
+CHUNK_INDEX_DTYPE = np.dtype([("start", "<i8"), ("length", "<i4"), ("time", "<f8"), ("offset", "<i8")])
+
+# Digital value WFDB uses for missing samples, by signal format. Format 8
+# has none, and the 24- and 32-bit formats do not fit the int16 store
+WFDB_INVALID_SAMPLES = {
+    "80": -128,
+    "508": -128,
+    "310": -512,
+    "311": -512,
+    "212": -2048,
+    "16": -32768,
+    "61": -32768,
+    "160": -32768,
+    "516": -32768,
+}
+
+_INT16_MIN, _INT16_MAX = np.iinfo(np.int16).min, np.iinfo(np.int16).max
+_WAVEFORM_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,127}")
+EDF_ANNOTATIONS_LABEL = "EDF Annotations"
+
+def _check_waveform_id(waveform_id: str) -> str:
+    if not _WAVEFORM_ID.fullmatch(waveform_id):
+        raise ValueError(f"Invalid waveform id: {waveform_id!r}")
+    return waveform_id
+
+class WaveformWriter:
+    """
+    Writes one record as fixed-length chunks of int16 samples
+
+    Within a chunk samples are stored lead by lead, so reading some leads of
+    a window touches one contiguous run per lead. The min/max envelope
+    pyramid is built from the same chunks as they are written. The record is
+    assembled in a temporary directory and renamed into place by close().
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        waveform_id: str,
+        fs: float,
+        leads: List[str],
+        gains: List[float],
+        baselines: List[float],
+        units: List[str],
+        chunk_samples: int,
+        invalid_values: Optional[List[Optional[int]]] = None,
+        **metadata: Any
+    ):
+        if not leads:
+            raise ValueError("A waveform needs at least one lead")
+        self.path = os.path.join(directory, _check_waveform_id(waveform_id))
+        self.tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.meta = {
+            "id": waveform_id,
+            "fs": float(fs),
+            "leads": list(leads),
+            "gains": [float(gain) for gain in gains],
+            "baselines": [float(baseline) for baseline in baselines],
+            "units": list(units),
+            "chunk_samples": int(chunk_samples),
+            "invalid_values": list(invalid_values) if invalid_values else [None] * len(leads),
+            **metadata
+        }
+        self.chunk_samples = int(chunk_samples)
+        self._handle = open(os.path.join(self.tmp_path, SIGNALS_FILE), "wb")
+        self._pending: List[np.ndarray] = []
+        self._pending_samples = 0
+        self._chunks: List[Tuple[int, int, float, int]] = []
+        self._envelopes = EnvelopeBuilder(self.tmp_path, len(leads), invalid_values)
+        self.samples = 0
+
+    def append(self, block: np.ndarray) -> None:
+        """
+        Append digital samples
+
+        Args:
+            block: (samples, leads) integer array in the record's ADC units
+        """
+        block = np.asarray(block)
+        if block.ndim != 2 or block.shape[1] != len(self.meta["leads"]):
+            raise ValueError(f"Expected (samples, {len(self.meta['leads'])}) block, got {block.shape}")
+        if len(block) and (block.min() < _INT16_MIN or block.max() > _INT16_MAX):
+            raise ValueError("Samples do not fit in int16")
+        self._pending.append(block.astype(np.int16, copy=False))
+        self._pending_samples += len(block)
+        if self._pending_samples >= self.chunk_samples:
+            pending = np.concatenate(self._pending)
+            whole = len(pending) - len(pending) % self.chunk_samples
+            for low in range(0, whole, self.chunk_samples):
+                self._write_chunk(pending[low:low + self.chunk_samples])
+            self._pending = [pending[whole:]]
+            self._pending_samples = len(pending) - whole
+
+    def _write_chunk(self, chunk: np.ndarray) -> None:
+        offset = self._handle.tell()
+        self._handle.write(np.ascontiguousarray(chunk.T).tobytes())
+        self._chunks.append((self.samples, len(chunk), self.samples / self.meta["fs"], offset))
+        self._envelopes.add(chunk)
+        self.samples += len(chunk)
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Flush the last partial chunk and publish the record
+
+        Returns:
+            Record metadata
+        """
+        if self._pending_samples:
+            self._write_chunk(np.concatenate(self._pending))
+        self._pending = []
+        self._handle.close()
+
+        np.save(os.path.join(self.tmp_path, CHUNKS_FILE), np.asarray(self._chunks, dtype=CHUNK_INDEX_DTYPE))
+        self.meta["samples"] = self.samples
+        self.meta["duration"] = self.samples / self.meta["fs"]
+        self.meta["envelopes"] = _envelope_meta(self._envelopes.close())
+        with open(os.path.join(self.tmp_path, META_FILE), "w", encoding="utf-8") as handle:
+            json.dump(self.meta, handle)
+
+        if os.path.exists(self.path):
+            retired = f"{self.path}.old-{os.getpid()}"
+            os.rename(self.path, retired)
+            os.rename(self.tmp_path, self.path)
+            shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.rename(self.tmp_path, self.path)
+        return self.meta
+
+    def abort(self) -> None:
+        self._handle.close()
+        self._envelopes.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+def _envelope_meta(levels: List[Dict[str, int]]) -> Dict[str, Any]:
+    return {"base_bucket": BASE_BUCKET, "factor": FACTOR, "levels": levels}
+
+class WaveformRecord:
+    """
+    Read-only view over a stored record
+
+    Samples are memory-mapped, so a range read copies only the requested
+    leads of the chunks the window overlaps, found by binary search over
+    the chunk index.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as handle:
+            self.meta: Dict[str, Any] = json.load(handle)
+        self.id: str = self.meta["id"]
+        self.fs: float = self.meta["fs"]
+        self.leads: List[str] = self.meta["leads"]
+        self.samples: int = self.meta["samples"]
+        self.gains = np.asarray(self.meta["gains"], dtype=np.float32)
+        self.baselines = np.asarray(self.meta["baselines"], dtype=np.float32)
+        self.chunks = np.load(os.path.join(path, CHUNKS_FILE))
+        # Records stored before per-lead values kept one for all leads
+        self.invalid_values: List[Optional[int]] = self.meta.get("invalid_values") or [self.meta.get("invalid_value")] * len(self.leads)
+        self.invalid = sentinels(self.invalid_values)
+        self._lead_ids = {name: lead for lead, name in enumerate(self.leads)}
+        self._signals = (
+            np.memmap(os.path.join(path, SIGNALS_FILE), dtype=np.int16, mode="r")
+            if self.samples else np.zeros(0, dtype=np.int16)
+        )
+        # Records stored before envelopes existed render from raw samples
+        envelopes = self.meta.get("envelopes")
+        self.pyramid = EnvelopePyramid(path, envelopes["levels"], len(self.leads)) if envelopes else None
+
+    @property
+    def duration(self) -> float:
+        return self.samples / self.fs
+
+    def lead_ids(self, leads: Optional[Iterable[str]] = None) -> List[int]:
+        """Positions of lead names (all leads if None)"""
+        if leads is None:
+            return list(range(len(self.leads)))
+        unknown = [lead for lead in leads if lead not in self._lead_ids]
+        if unknown:
+            raise ValueError(f"Unknown leads: {', '.join(unknown)}")
+        return [self._lead_ids[lead] for lead in leads]
+
+    def read_digital(self, start: int, end: int, lead_ids: Optional[List[int]] = None) -> np.ndarray:
+        """
+        Read raw samples of a sample range
+
+        Args:
+            start: First sample
+            end: Sample after the last one; clipped to the record
+            lead_ids: Lead positions (all leads if None)
+
+        Returns:
+            (leads, samples) int16 array
+        """
+        lead_ids = list(range(len(self.leads))) if lead_ids is None else lead_ids
+        start = max(0, int(start))
+        end = min(self.samples, int(end))
+        out = np.empty((len(lead_ids), max(0, end - start)), dtype=np.int16)
+        if end <= start:
+            return out
+
+        chunk_starts = self.chunks["start"]
+        first = int(np.searchsorted(chunk_starts, start, side="right")) - 1
+        last = int(np.searchsorted(chunk_starts, end - 1, side="right")) - 1
+        rows = np.asarray(lead_ids)
+        for chunk in self.chunks[first:last + 1]:
+            chunk_start, length, offset = int(chunk["start"]), int(chunk["length"]), int(chunk["offset"]) // 2
+            block = self._signals[offset:offset + length * len(self.leads)].reshape(len(self.leads), length)
+            low = max(start, chunk_start) - chunk_start
+            high = min(end, chunk_start + length) - chunk_start
+            out[:, chunk_start + low - start:chunk_start + high - start] = block[rows, low:high]
+        return out
+
+    def to_physical(self, digital: np.ndarray, lead_ids: List[int]) -> np.ndarray:
+        """Convert (leads, samples) ADC values to physical units; missing samples become NaN"""
+        gains = self.gains[lead_ids][:, None]
+        baselines = self.baselines[lead_ids][:, None]
+        physical = (digital.astype(np.float32) - baselines) / gains
+        if self.invalid is not None:
+            physical[digital == self.invalid[lead_ids][:, None]] = np.nan
+        return physical
+
+    def sample_range(self, start: float, end: float) -> Tuple[int, int]:
+        """Sample range covering a time window in seconds, clipped to the record"""
+        if not len(self.chunks):
+            return 0, 0
+        first = max(0, int(np.searchsorted(self.chunks["time"], start, side="right")) - 1)
+        base = self.chunks[first]
+        start_sample = int(base["start"]) + int(round((start - float(base["time"])) * self.fs))
+        end_sample = start_sample + int(round((end - start) * self.fs))
+        return max(0, min(start_sample, self.samples)), max(0, min(end_sample, self.samples))
+
+    def read(self, start: float, end: float, leads: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Read a time window in physical units
+
+        Args:
+            start: Window start in seconds from the start of the record
+            end: Window end in seconds
+            leads: Lead names (all leads if None)
+
+        Returns:
+            Aligned start/end times, lead names and units, and a
+            (leads, samples) float32 `signals` array
+        """
+        lead_ids = self.lead_ids(leads)
+        start_sample, end_sample = self.sample_range(start, end)
+        signals = self.to_physical(self.read_digital(start_sample, end_sample, lead_ids), lead_ids)
+        return {
+            "start": start_sample / self.fs,
+            "end": end_sample / self.fs,
+            "start_sample": start_sample,
+            "fs": self.fs,
+            "leads": [self.leads[lead] for lead in lead_ids],
+            "units": [self.meta["units"][lead] for lead in lead_ids],
+            "signals": signals,
+        }
+
+    def render(self, start: float, end: float, pixels: int, leads: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Min/max envelope of a time window at a fixed number of columns
+
+        Args:
+            start: Window start in seconds from the start of the record
+            end: Window end in seconds
+            pixels: Number of columns
+            leads: Lead names (all leads if None)
+
+        Returns:
+            Aligned start/end times, lead names and units, the pyramid bucket
+            size used, and (leads, pixels) float32 `mins` and `maxs` in
+            physical units (NaN for columns without samples)
+        """
+        lead_ids = self.lead_ids(leads)
+        start_sample, end_sample = self.sample_range(start, end)
+        envelopes, bucket = render(self, start_sample, max(end_sample, start_sample + 1), lead_ids, pixels, self.pyramid)
+        empty = envelopes[..., 0] > envelopes[..., 1]
+        lows = self.to_physical(envelopes[..., 0], lead_ids)
+        highs = self.to_physical(envelopes[..., 1], lead_ids)
+        # A negative gain flips the order of physical values
+        mins, maxs = np.fmin(lows, highs), np.fmax(lows, highs)
+        mins[empty] = np.nan
+        maxs[empty] = np.nan
+        return {
+            "start": start_sample / self.fs,
+            "end": end_sample / self.fs,
+            "fs": self.fs,
+            "bucket": bucket,
+            "leads": [self.leads[lead] for lead in lead_ids],
+            "units": [self.meta["units"][lead] for lead in lead_ids],
+            "mins": mins,
+            "maxs": maxs,
+        }
+
+    def describe(self) -> Dict[str, Any]:
+        """Record metadata without per-lead calibration"""
+        return {
+            "id": self.id,
+            "fs": self.fs,
+            "leads": self.leads,
+            "units": self.meta["units"],
+            "samples": self.samples,
+            "duration": self.duration,
+            "start_time": self.meta.get("start_time"),
+            "source_format": self.meta.get("source_format"),
+        }
+
+class WaveformStore:
+    """
+    Directory of stored records, one subdirectory per waveform id
+
+    Opened records are kept in a small LRU; their memory maps share pages
+    between worker processes through the OS page cache.
+    """
+
+    def __init__(self, directory: Optional[str] = None, chunk_seconds: float = 10.0, max_open: int = 64):
+        self.directory = directory
+        self.chunk_seconds = chunk_seconds
+        self.max_open = max_open
+        self._open: "OrderedDict[str, Tuple[float, WaveformRecord]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Metadata of every stored record"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        records = []
+        for name in sorted(os.listdir(self.directory)):
+            if _WAVEFORM_ID.fullmatch(name) and os.path.exists(os.path.join(self.directory, name, META_FILE)):
+                record = self.get(name)
+                if record is not None:
+                    records.append(record.describe())
+        return records
+
+    def get(self, waveform_id: str) -> Optional[WaveformRecord]:
+        """
+        Open a stored record
+
+        Args:
+            waveform_id: Waveform id
+
+        Returns:
+            The record, or None if it does not exist
+        """
+        if not self.directory or not _WAVEFORM_ID.fullmatch(waveform_id):
+            return None
+        path = os.path.join(self.directory, waveform_id)
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        # A re-import replaces the directory; reopen when the metadata changed
+        version = os.stat(meta_path).st_mtime_ns
+        with self._lock:
+            cached = self._open.get(waveform_id)
+            if cached is not None and cached[0] == version:
+                self._open.move_to_end(waveform_id)
+                return cached[1]
+        record = WaveformRecord(path)
+        with self._lock:
+            self._open[waveform_id] = (version, record)
+            self._open.move_to_end(waveform_id)
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return record
+
+    def build_envelopes(self, waveform_id: str) -> Dict[str, Any]:
+        """
+        (Re)build the envelope pyramid of a stored record from its chunks
+
+        Args:
+            waveform_id: Waveform id
+
+        Returns:
+            Updated record metadata
+        """
+        record = self.get(waveform_id)
+        if record is None:
+            raise ValueError(f"Unknown waveform: {waveform_id}")
+        # Built aside and renamed in, so open maps of the old levels stay valid
+        tmp_path = os.path.join(record.path, f"envelopes.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        builder = EnvelopeBuilder(tmp_path, len(record.leads), record.invalid_values)
+        for chunk in record.chunks:
+            builder.add(record.read_digital(int(chunk["start"]), int(chunk["start"]) + int(chunk["length"])).T)
+        levels = builder.close()
+        for name in os.listdir(tmp_path):
+            os.replace(os.path.join(tmp_path, name), os.path.join(record.path, name))
+        os.rmdir(tmp_path)
+        meta = {**record.meta, "envelopes": _envelope_meta(levels)}
+        meta_path = os.path.join(record.path, META_FILE)
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as handle:
+            json.dump(meta, handle)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        return meta
+
+    def writer(self, waveform_id: str, fs: float, **fields: Any) -> WaveformWriter:
+        """Writer for a new record with chunks of `chunk_seconds`"""
+        os.makedirs(self.directory, exist_ok=True)
+        chunk_samples = max(1, int(round(self.chunk_seconds * fs)))
+        return WaveformWriter(self.directory, waveform_id, fs, chunk_samples=chunk_samples, **fields)
+
+    def _import(self, waveform_id: str, header: Dict[str, Any], blocks: Iterator[np.ndarray]) -> Dict[str, Any]:
+        writer = self.writer(waveform_id, **header)
+        try:
+            for block in blocks:
+                writer.append(block)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close()
+
+    def import_wfdb(self, record_name: str, waveform_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Convert a WFDB record
+
+        Args:
+            record_name: Record path without extension
+            waveform_id: Id to store it under (the record name if None)
+
+        Returns:
+            Stored record metadata
+        """
+        header, blocks = read_wfdb(record_name)
+        return self._import(waveform_id or os.path.basename(record_name), header, blocks)
+
+    def import_edf(self, path: str, waveform_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Convert an EDF or EDF+C file
+
+        Args:
+            path: EDF file path
+            waveform_id: Id to store it under (the file name without extension if None)
+
+        Returns:
+            Stored record metadata
+        """
+        header, blocks = read_edf(path)
+        return self._import(waveform_id or os.path.splitext(os.path.basename(path))[0], header, blocks)
+
+# Source readers; each returns writer fields and an iterator of (samples, leads) blocks
+
+def read_wfdb(record_name: str, block_seconds: float = 60.0) -> Tuple[Dict[str, Any], Iterator[np.ndarray]]:
+    """
+    Read a single-segment WFDB record in blocks of digital samples
+
+    Args:
+        record_name: Record path without extension
+        block_seconds: Seconds of samples read per block
+
+    Returns:
+        (writer fields, block iterator)
+    """
+    import wfdb
+
+    header = wfdb.rdheader(record_name)
+    if getattr(header, "n_seg", None):
+        raise ValueError("Multi-segment WFDB records are not supported")
+    block = max(1, int(block_seconds * header.fs))
+    start_time = header.base_datetime.isoformat() if getattr(header, "base_datetime", None) else None
+
+    def blocks() -> Iterator[np.ndarray]:
+        for low in range(0, header.sig_len, block):
+            record = wfdb.rdrecord(record_name, sampfrom=low, sampto=min(header.sig_len, low + block), physical=False)
+            yield record.d_signal
+
+    fields = {
+        "fs": float(header.fs),
+        "leads": list(header.sig_name),
+        "gains": [gain or 200.0 for gain in header.adc_gain],
+        "baselines": list(header.baseline),
+        "units": list(header.units),
+        "invalid_values": [WFDB_INVALID_SAMPLES.get(str(fmt)) for fmt in header.fmt],
+        "start_time": start_time,
+        "source_format": "wfdb",
+    }
+    return fields, blocks()
+
+def _edf_fields(raw: bytes, count: int, width: int) -> List[str]:
+    return [raw[i * width:(i + 1) * width].decode("ascii", "replace").strip() for i in range(count)]
+
+def read_edf(path: str, records_per_block: int = 60) -> Tuple[Dict[str, Any], Iterator[np.ndarray]]:
+    """
+    Read the highest-rate signals of an EDF/EDF+C file in blocks
+
+    Signals sampled at a lower rate and EDF+ annotation signals are skipped,
+    so every stored lead shares one sampling rate.
+
+    Args:
+        path: EDF file path
+        records_per_block: Data records read per block
+
+    Returns:
+        (writer fields, block iterator)
+    """
+    with open(path, "rb") as handle:
+        fixed = handle.read(256)
+        header_bytes = int(fixed[184:192])
+        signal_count = int(fixed[252:256])
+        signal_header = handle.read(header_bytes - 256)
+    if fixed[192:197] == b"EDF+D":
+        raise ValueError("Discontinuous EDF+D files are not supported")
+
+    widths = [16, 80, 8, 8, 8, 8, 8, 80, 8, 32]
+    names = ["label", "transducer", "units", "physical_min", "physical_max",
+             "digital_min", "digital_max", "prefilter", "samples_per_record", "reserved"]
+    signals: Dict[str, List[str]] = {}
+    position = 0
+    for name, width in zip(names, widths):
+        signals[name] = _edf_fields(signal_header[position:], signal_count, width)
+        position += width * signal_count
+
+    per_record = [int(value) for value in signals["samples_per_record"]]
+    record_duration = float(fixed[244:252]) or 1.0
+    data_signals = [i for i in range(signal_count) if signals["label"][i] != EDF_ANNOTATIONS_LABEL]
+    if not data_signals:
+        raise ValueError("EDF file has no data signals")
+    rate = max(per_record[i] for i in data_signals)
+    selected = [i for i in data_signals if per_record[i] == rate]
+
+    record_samples = sum(per_record)
+    available = (os.path.getsize(path) - header_bytes) // (2 * record_samples)
+    record_count = int(fixed[236:244])
+    record_count = available if record_count < 0 else min(record_count, available)
+    offsets = np.cumsum([0] + per_record[:-1])
+
+    gains, baselines = [], []
+    for i in selected:
+        physical_min, physical_max = float(signals["physical_min"][i]), float(signals["physical_max"][i])
+        digital_min, digital_max = float(signals["digital_min"][i]), float(signals["digital_max"][i])
+        gain = (digital_max - digital_min) / ((physical_max - physical_min) or 1.0)
+        gains.append(gain)
+        baselines.append(digital_min - physical_min * gain)
+
+    day, month, year = (int(part) for part in fixed[168:176].decode("ascii").split("."))
+    hour, minute, second = (int(part) for part in fixed[176:184].decode("ascii").split("."))
+    start_time = datetime(year + (2000 if year < 85 else 1900), month, day, hour, minute, second).isoformat()
+
+    def blocks() -> Iterator[np.ndarray]:
+        if not record_count:
+            return
+        data = np.memmap(path, dtype="<i2", mode="r", offset=header_bytes, shape=(record_count, record_samples))
+        for low in range(0, record_count, records_per_block):
+            rows = data[low:low + records_per_block]
+            yield np.stack([rows[:, offsets[i]:offsets[i] + rate].reshape(-1) for i in selected], axis=1)
+
+    fields = {
+        "fs": rate / record_duration,
+        "leads": [signals["label"][i] for i in selected],
+        "gains": gains,
+        "baselines": baselines,
+        "units": [signals["units"][i] for i in selected],
+        "invalid_values": None,
+        "start_time": start_time,
+        "source_format": "edf",
+    }
+    return fields, blocks()
+
+# Global instance
+waveform_store = WaveformStore(settings.WAVEFORM_STORE_DIR, settings.WAVEFORM_CHUNK_SECONDS)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a WFDB record or EDF file into the waveform store")
+    parser.add_argument("source", help="WFDB record path without extension, or an .edf file (a waveform id with --envelopes)")
+    parser.add_argument("--envelopes", action="store_true", help="Rebuild the envelope pyramid of a stored record")
+    parser.add_argument("--id", dest="waveform_id")
+    parser.add_argument("--store-dir", default="data/waveforms")
+    parser.add_argument("--chunk-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+    store = WaveformStore(args.store_dir, args.chunk_seconds)
+    if args.envelopes:
+        meta = store.build_envelopes(args.source)
+    elif args.source.lower().endswith(".edf"):
+        meta = store.import_edf(args.source, args.waveform_id)
+    else:
+        meta = store.import_wfdb(args.source, args.waveform_id)
+    print(f"{meta['id']}: {len(meta['leads'])} leads, {meta['samples']} samples at {meta['fs']:g} Hz")
@@ -3,13 +3,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, List, Any
 
+from app.core.audit import audit_sink, write_audit_rows
 from app.core.config import settings
 from app.core.logging import setup_logging
 from app.api.v1.api import api_router
-from app.core.database import init_db
+from app.core.database import init_db, AsyncSessionLocal
+from app.services.deidentification import deidentification_service
+from app.services.terminology import terminology_service
 
 # Setup logging
 setup_logging()
@@ -18,6 +22,10 @@ logger = logging.getLogger(__name__)
 # Security
 security = HTTPBearer()
 
+async def write_local_audit(batch: List[Dict[str, Any]]) -> None:
+    """Append a sink batch to the local audit store off the event loop"""
+    await asyncio.to_thread(deidentification_service.audit_log.append_many, batch)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
@@ -26,10 +34,27 @@ async def lifespan(app: FastAPI):
     await init_db()
     logger.info("Database initialized successfully")
     
+    audit_sink.add_writer(write_audit_rows)
+    audit_sink.add_writer(write_local_audit)
+    await audit_sink.start()
+    
+    await asyncio.to_thread(terminology_service.build_search_indexes)
+    await terminology_service.cache.start()
+    
+    if settings.PHI_GAZETTEER_PRELOAD:
+        async with AsyncSessionLocal() as session:
+            added = await deidentification_service.load_known_identifiers(session)
+        logger.info(f"PHI gazetteer loaded with {added} identifiers")
+    
     yield
     
     # Shutdown
     logger.info("Shutting down AI Medical Assistant API...")
+    await audit_sink.stop()
+    logger.info("Audit sink flushed")
+    await asyncio.to_thread(deidentification_service.shutdown_redaction_pool)
+    await asyncio.to_thread(terminology_service.save_snapshot)
+    await terminology_service.cache.stop()
 
 # Create FastAPI app
 app = FastAPI(
@@ -85,7 +110,8 @@ async def detailed_health_check() -> Dict[str, Any]:
                 "database": "healthy",
                 "ai_services": "healthy",
                 "storage": "healthy"
-            }
+            },
+            "audit_sink": audit_sink.metrics()
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
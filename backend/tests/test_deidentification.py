@@ -0,0 +1,31 @@
+"""
+Tests for PHI redaction
+"""
+
+import pytest
+
+from app.services import deidentification
+from app.services.deidentification import deidentification_service
+from app.services.gazetteer import Gazetteer
+
+SENTENCE = "Patient John Smith seen today."
+
+@pytest.fixture
+def gazetteer(monkeypatch):
+    """Empty gazetteer in place of the global one"""
+    gazetteer = Gazetteer()
+    monkeypatch.setattr(deidentification, "phi_gazetteer", gazetteer)
+    return gazetteer
+
+def test_title_word_does_not_hide_name(gazetteer):
+    result = deidentification_service.redact_phi(SENTENCE)
+    assert "John" not in result["redacted_text"]
+    assert "Smith" not in result["redacted_text"]
+    assert result["redacted_text"].endswith(" seen today.")
+
+def test_title_word_does_not_hide_known_name(gazetteer):
+    deidentification_service.add_known_identifiers(first_name="John", last_name="Smith")
+    result = deidentification_service.redact_phi(SENTENCE)
+    assert "John" not in result["redacted_text"]
+    assert "Smith" not in result["redacted_text"]
+    assert result["redacted_text"].endswith(" seen today.")